@@ -1,6 +1,7 @@
 import enum
 import uuid
 from pathlib import Path
+from typing import Literal
 
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -14,6 +15,13 @@ class Environment(str, enum.Enum):
     PROD = "prod"
 
 
+class QueueBackend(str, enum.Enum):
+    """Message queue backend enum."""
+
+    LIST = "list"
+    STREAM = "stream"
+
+
 class Ollama(BaseSettings):
     """Ollama settings."""
 
@@ -21,6 +29,31 @@ class Ollama(BaseSettings):
     model: str = "llama2"
     temperature: float = 0.8
     prompts_dir_path: str = str(Path(__file__).parent.parent / "prompts")
+    prompts_reload_interval: float | None = 10.0
+    embedding_model: str = "all-minilm"
+    hosts: dict[str, int] = {}
+    max_host_concurrency: int | None = None
+    host_failure_threshold: int = 3
+    host_ejection_time: float = 30.0
+    host_probe_interval: float = 30.0
+    keep_alive: float | str | None = None
+    keep_alive_interval: float | None = 240.0
+    models: list[str] = []
+    tier_queue_size: int = 3
+    breaker_enabled: bool = True
+    breaker_failure_rate: float = 0.5
+    breaker_min_calls: int = 5
+    breaker_window: int = 20
+    breaker_slow_call_duration: float = 60.0
+    breaker_open_time: float = 30.0
+    max_connections: int = 10
+    max_keepalive_connections: int = 10
+    keepalive_expiry: float = 300.0
+    connect_timeout: float = 5.0
+    read_timeout: float | None = 300.0
+    request_timeout: float | None = None
+    affinity_slack: float | None = None
+    cold_load_cost: float = 1.0
 
 
 class Redis(BaseSettings):
@@ -54,6 +87,59 @@ class MDuckSettings(BaseSettings):
     response_probability_group: float = 0.3
     response_probability_supergroup: float = 0.3
     max_queue_size: int = 10
+    max_queue_size_direct: int | None = None
+    max_queue_size_private: int | None = None
+    max_queue_size_group: int | None = None
+    lane_weight_direct: int = 6
+    lane_weight_private: int = 3
+    lane_weight_group: int = 1
+    coalesce_size: int = 5
+    coalesce_ttl: float = 300.0
+    max_message_age: float | None = 300.0
+    reply_deadline: float | None = 600.0
+    admission_target_wait: float | None = 60.0
+    admission_shed_ratio: float = 2.0
+    admission_concurrency: int | None = None
+    admission_window: int = 50
+    admission_refresh_interval: float = 5.0
+    retry_max_attempts: int = 3
+    retry_base_delay: float = 5.0
+    retry_max_delay: float = 300.0
+    dead_letter_size: int = 1000
+    update_dedup_ttl: float = 3600.0
+    update_dedup_cache_size: int = 10000
+    stream_edit_interval: float | None = None
+    response_cache_policy: Literal["off", "always", "load"] = "load"
+    response_cache_ttl: float = 86400.0
+    response_cache_variants: int = 3
+    response_cache_max_keys: int = 10000
+    response_cache_max_text_length: int = 100
+    semantic_cache_enabled: bool = False
+    semantic_cache_threshold: float = 0.92
+    semantic_cache_size: int = 1000
+    semantic_cache_sync_interval: float = 60.0
+    max_predict: int = 512
+    min_predict: int = 64
+    max_prompt_tokens: int = 1024
+    min_prompt_tokens: int = 256
+    max_history_tokens: int = 1024
+    min_history_tokens: int = 0
+    conversation_enabled: bool = True
+    conversation_max_turns: int = 10
+    conversation_max_size: int = 4096
+    conversation_ttl: float = 3600.0
+    template_stats_window: int = 100
+    template_stats_refresh_interval: float = 30.0
+    template_selection_mix: float = 0.5
+    template_batch_size: int = 1
+    queue_backend: QueueBackend = QueueBackend.LIST
+    embedded_worker: bool = True
+    workers: int = 1
+    max_in_flight: int | None = None
+    visibility_timeout: float = 60.0
+    dequeue_timeout: int = 5
+    reaper_interval: float = 60.0
+    shutdown_grace_period: float = 30.0
 
 
 class Settings(BaseSettings):
@@ -7,7 +7,12 @@ from config.settings import settings
 from mduck.containers.gateways import GatewaysContainer
 from mduck.dp import init_dispatcher
 from mduck.log import init_logging
+from mduck.services.admission import AdmissionController
+from mduck.services.budget import TokenBudget
 from mduck.services.mduck import MDuckService
+from mduck.services.retry import RetryPolicy
+from mduck.services.templates import TemplateSelector
+from mduck.services.worker_pool import WorkerPool
 
 
 class ApplicationContainer(containers.DeclarativeContainer):
@@ -17,6 +22,7 @@ class ApplicationContainer(containers.DeclarativeContainer):
         modules=[
             "mduck.handlers.chat_member",
             "mduck.handlers.message",
+            "mduck.routers.stats",
             "mduck.routers.webhook",
         ]
     )
@@ -29,15 +35,91 @@ class ApplicationContainer(containers.DeclarativeContainer):
         config=config,
     )
 
+    admission: providers.Provider[AdmissionController] = providers.Singleton(
+        AdmissionController,
+        queue=gateways.queue,
+        latency=gateways.latency,
+        target_wait=config.mduck.admission_target_wait,
+        shed_ratio=config.mduck.admission_shed_ratio,
+        concurrency=providers.Callable(
+            lambda *values: next(value for value in values if value),
+            config.mduck.admission_concurrency,
+            config.mduck.max_in_flight,
+            config.mduck.workers,
+        ),
+        refresh_interval=config.mduck.admission_refresh_interval,
+    )
+
+    retry_policy: providers.Provider[RetryPolicy] = providers.Singleton(
+        RetryPolicy,
+        max_attempts=config.mduck.retry_max_attempts,
+        base_delay=config.mduck.retry_base_delay,
+        max_delay=config.mduck.retry_max_delay,
+    )
+
+    token_budget: providers.Provider[TokenBudget] = providers.Singleton(
+        TokenBudget,
+        max_predict=config.mduck.max_predict,
+        min_predict=config.mduck.min_predict,
+        max_prompt_tokens=config.mduck.max_prompt_tokens,
+        min_prompt_tokens=config.mduck.min_prompt_tokens,
+        max_history_tokens=config.mduck.max_history_tokens,
+        min_history_tokens=config.mduck.min_history_tokens,
+    )
+
+    template_selector: providers.Provider[TemplateSelector] = providers.Singleton(
+        TemplateSelector,
+        stats=gateways.template_stats,
+        mix=config.mduck.template_selection_mix,
+        refresh_interval=config.mduck.template_stats_refresh_interval,
+    )
+
     mduck: providers.Provider[MDuckService] = providers.Singleton(
         MDuckService,
         bot=gateways.bot,
         ollama_repository=gateways.ollama,
-        redis=gateways.redis,
+        queue=gateways.queue,
         response_probability_private=config.mduck.response_probability_private,
         response_probability_group=config.mduck.response_probability_group,
         response_probability_supergroup=config.mduck.response_probability_supergroup,
         max_queue_size=config.mduck.max_queue_size,
+        lane_max_queue_sizes=providers.Dict(
+            direct=config.mduck.max_queue_size_direct,
+            private=config.mduck.max_queue_size_private,
+            group=config.mduck.max_queue_size_group,
+        ),
+        max_message_age=config.mduck.max_message_age,
+        reply_deadline=config.mduck.reply_deadline,
+        admission=admission,
+        retry_policy=retry_policy,
+        stream_edit_interval=config.mduck.stream_edit_interval,
+        response_cache=gateways.response_cache,
+        response_cache_policy=config.mduck.response_cache_policy,
+        semantic_cache=providers.Callable(
+            lambda is_enabled, cache: cache if is_enabled else None,
+            config.mduck.semantic_cache_enabled,
+            gateways.semantic_cache,
+        ),
+        token_budget=token_budget,
+        template_selector=template_selector,
+        conversation=providers.Callable(
+            lambda is_enabled, conversation: conversation if is_enabled else None,
+            config.mduck.conversation_enabled,
+            gateways.conversation,
+        ),
+        template_batch_size=config.mduck.template_batch_size,
+    )
+
+    worker_pool: providers.Provider[WorkerPool] = providers.Singleton(
+        WorkerPool,
+        mduck=mduck,
+        queue=gateways.queue,
+        workers=config.mduck.workers,
+        max_in_flight=config.mduck.max_in_flight,
+        reaper_interval=config.mduck.reaper_interval,
+        grace_period=config.mduck.shutdown_grace_period,
+        ollama=gateways.ollama,
+        prompts=gateways.prompts,
     )
 
     dispatcher: providers.Provider[Dispatcher] = providers.Singleton(init_dispatcher)
@@ -1,10 +1,22 @@
+import httpx
 from aiogram import Bot
 from dependency_injector import containers, providers
 from redis.asyncio import Redis
 
 from config.settings import Settings
-from mduck.repositories.ollama import OllamaRepository
+from mduck.repositories.circuit_breaker import CircuitBreaker
+from mduck.repositories.conversation import ConversationRepository
+from mduck.repositories.latency import LatencyRepository
+from mduck.repositories.ollama import OllamaRepository, OllamaResource
+from mduck.repositories.ollama_pool import OllamaHostPool
+from mduck.repositories.prompts import PromptRegistry
+from mduck.repositories.queue import MessageQueueRepository, QueueRepository
 from mduck.repositories.redis import RedisResource
+from mduck.repositories.response_cache import ResponseCacheRepository
+from mduck.repositories.semantic_cache import SemanticCacheRepository
+from mduck.repositories.stream_queue import StreamQueueRepository
+from mduck.repositories.template_stats import TemplateStatsRepository
+from mduck.repositories.updates import UpdateDedupRepository
 
 
 class GatewaysContainer(containers.DeclarativeContainer):
@@ -17,12 +29,37 @@ class GatewaysContainer(containers.DeclarativeContainer):
         token=config.tg.token,  # type: ignore
     )
 
-    ollama: providers.Factory[OllamaRepository] = providers.Factory(
-        OllamaRepository,
-        host=config.ollama.host,  # type: ignore
-        model=config.ollama.model,  # type: ignore
-        temperature=config.ollama.temperature,  # type: ignore
-        prompts_dir_path=config.ollama.prompts_dir_path,  # type: ignore
+    ollama_pool: providers.Singleton[OllamaHostPool] = providers.Singleton(
+        OllamaHostPool,
+        hosts=providers.Callable(
+            lambda hosts, host: hosts or {host: 1},
+            hosts=config.ollama.hosts,  # type: ignore
+            host=config.ollama.host,  # type: ignore
+        ),
+        max_concurrency=config.ollama.max_host_concurrency,  # type: ignore
+        failure_threshold=config.ollama.host_failure_threshold,  # type: ignore
+        ejection_time=config.ollama.host_ejection_time,  # type: ignore
+        probe_interval=config.ollama.host_probe_interval,  # type: ignore
+        timeout=providers.Factory(
+            httpx.Timeout,
+            config.ollama.connect_timeout,  # type: ignore
+            read=config.ollama.read_timeout,  # type: ignore
+            pool=None,
+        ),
+        limits=providers.Factory(
+            httpx.Limits,
+            max_connections=config.ollama.max_connections,  # type: ignore
+            max_keepalive_connections=config.ollama.max_keepalive_connections,  # type: ignore
+            keepalive_expiry=config.ollama.keepalive_expiry,  # type: ignore
+        ),
+        affinity_slack=config.ollama.affinity_slack,  # type: ignore
+        cold_load_cost=config.ollama.cold_load_cost,  # type: ignore
+    )
+
+    prompts: providers.Singleton[PromptRegistry] = providers.Singleton(
+        PromptRegistry,
+        path=config.ollama.prompts_dir_path,  # type: ignore
+        reload_interval=config.ollama.prompts_reload_interval,  # type: ignore
     )
 
     redis: providers.Resource[Redis] = providers.Resource(
@@ -32,3 +69,108 @@ class GatewaysContainer(containers.DeclarativeContainer):
         db=config.redis.db,  # type: ignore
         password=config.redis.password,  # type: ignore
     )
+
+    circuit_breaker: providers.Singleton[CircuitBreaker] = providers.Singleton(
+        CircuitBreaker,
+        redis=redis,
+        failure_rate=config.ollama.breaker_failure_rate,  # type: ignore
+        min_calls=config.ollama.breaker_min_calls,  # type: ignore
+        window=config.ollama.breaker_window,  # type: ignore
+        slow_call_duration=config.ollama.breaker_slow_call_duration,  # type: ignore
+        open_time=config.ollama.breaker_open_time,  # type: ignore
+    )
+
+    ollama: providers.Resource[OllamaRepository] = providers.Resource(
+        OllamaResource,  # type: ignore[arg-type]
+        host=config.ollama.host,  # type: ignore
+        model=config.ollama.model,  # type: ignore
+        temperature=config.ollama.temperature,  # type: ignore
+        prompts_dir_path=config.ollama.prompts_dir_path,  # type: ignore
+        embedding_model=config.ollama.embedding_model,  # type: ignore
+        pool=ollama_pool,
+        keep_alive=config.ollama.keep_alive,  # type: ignore
+        keep_alive_interval=config.ollama.keep_alive_interval,  # type: ignore
+        models=config.ollama.models,  # type: ignore
+        tier_queue_size=config.ollama.tier_queue_size,  # type: ignore
+        breaker=providers.Callable(
+            lambda is_enabled, breaker: breaker if is_enabled else None,
+            config.ollama.breaker_enabled,  # type: ignore
+            circuit_breaker,
+        ),
+        request_timeout=config.ollama.request_timeout,  # type: ignore
+        prompts=prompts,
+    )
+
+    latency: providers.Singleton[LatencyRepository] = providers.Singleton(
+        LatencyRepository,
+        redis=redis,
+        window=config.mduck.admission_window,  # type: ignore
+    )
+
+    update_dedup: providers.Singleton[UpdateDedupRepository] = providers.Singleton(
+        UpdateDedupRepository,
+        redis=redis,
+        ttl=config.mduck.update_dedup_ttl,  # type: ignore
+        cache_size=config.mduck.update_dedup_cache_size,  # type: ignore
+    )
+
+    response_cache: providers.Singleton[ResponseCacheRepository] = providers.Singleton(
+        ResponseCacheRepository,
+        redis=redis,
+        ttl=config.mduck.response_cache_ttl,  # type: ignore
+        variants=config.mduck.response_cache_variants,  # type: ignore
+        max_keys=config.mduck.response_cache_max_keys,  # type: ignore
+        max_text_length=config.mduck.response_cache_max_text_length,  # type: ignore
+    )
+
+    semantic_cache: providers.Singleton[SemanticCacheRepository] = providers.Singleton(
+        SemanticCacheRepository,
+        redis=redis,
+        threshold=config.mduck.semantic_cache_threshold,  # type: ignore
+        size=config.mduck.semantic_cache_size,  # type: ignore
+        sync_interval=config.mduck.semantic_cache_sync_interval,  # type: ignore
+    )
+
+    template_stats: providers.Singleton[TemplateStatsRepository] = providers.Singleton(
+        TemplateStatsRepository,
+        redis=redis,
+        window=config.mduck.template_stats_window,  # type: ignore
+    )
+
+    conversation: providers.Singleton[ConversationRepository] = providers.Singleton(
+        ConversationRepository,
+        redis=redis,
+        max_turns=config.mduck.conversation_max_turns,  # type: ignore
+        max_size=config.mduck.conversation_max_size,  # type: ignore
+        ttl=config.mduck.conversation_ttl,  # type: ignore
+    )
+
+    lane_weights: providers.Dict = providers.Dict(
+        direct=config.mduck.lane_weight_direct,  # type: ignore
+        private=config.mduck.lane_weight_private,  # type: ignore
+        group=config.mduck.lane_weight_group,  # type: ignore
+    )
+
+    queue: providers.Selector[QueueRepository] = providers.Selector(
+        config.mduck.queue_backend,  # type: ignore
+        list=providers.Singleton(
+            MessageQueueRepository,
+            redis=redis,
+            visibility_timeout=config.mduck.visibility_timeout,  # type: ignore
+            dequeue_timeout=config.mduck.dequeue_timeout,  # type: ignore
+            lane_weights=lane_weights,
+            coalesce_size=config.mduck.coalesce_size,  # type: ignore
+            coalesce_ttl=config.mduck.coalesce_ttl,  # type: ignore
+            dead_letter_size=config.mduck.dead_letter_size,  # type: ignore
+        ),
+        stream=providers.Singleton(
+            StreamQueueRepository,
+            redis=redis,
+            visibility_timeout=config.mduck.visibility_timeout,  # type: ignore
+            dequeue_timeout=config.mduck.dequeue_timeout,  # type: ignore
+            lane_weights=lane_weights,
+            coalesce_size=config.mduck.coalesce_size,  # type: ignore
+            coalesce_ttl=config.mduck.coalesce_ttl,  # type: ignore
+            dead_letter_size=config.mduck.dead_letter_size,  # type: ignore
+        ),
+    )
@@ -0,0 +1,132 @@
+import argparse
+import asyncio
+import logging
+
+from mduck.containers.application import ApplicationContainer
+from mduck.repositories.queue import QueueRepository
+from mduck.repositories.template_stats import TemplateStatsRepository
+
+logger = logging.getLogger(__name__)
+
+
+async def _shutdown_resources(container: ApplicationContainer) -> None:
+    """Close the connections opened by the command, if any."""
+    shutdown = container.shutdown_resources()
+    if shutdown is not None:
+        await shutdown
+
+
+async def list_dead_letters(
+    container: ApplicationContainer, count: int | None = None
+) -> None:
+    """
+    Print the dead letters as JSON lines, newest first.
+
+    Args:
+        container: The application container.
+        count: The maximum number of dead letters, all by default.
+
+    """
+    queue: QueueRepository = await container.gateways.queue()
+    try:
+        for dead_letter in await queue.get_dead_letters(count):
+            print(dead_letter.model_dump_json())
+    finally:
+        await _shutdown_resources(container)
+
+
+async def replay_dead_letters(
+    container: ApplicationContainer, count: int | None = None
+) -> None:
+    """
+    Return the oldest dead letters back to the queue.
+
+    Args:
+        container: The application container.
+        count: The maximum number of replayed messages, all by default.
+
+    """
+    queue: QueueRepository = await container.gateways.queue()
+    try:
+        replayed = await queue.replay_dead_letters(count)
+        print(f"Replayed {replayed} dead letters.")
+    finally:
+        await _shutdown_resources(container)
+
+
+async def print_template_stats(container: ApplicationContainer) -> None:
+    """
+    Print the rolling generation statistics of the prompt templates as a table.
+
+    Args:
+        container: The application container.
+
+    """
+    template_stats: TemplateStatsRepository = await container.gateways.template_stats()
+    try:
+        stats = await template_stats.get_all()
+    finally:
+        await _shutdown_resources(container)
+    print(
+        f"{'template':<30} {'samples':>7} {'failures':>8} {'prompt':>8} "
+        f"{'output':>8} {'duration':>9}"
+    )
+    for row in stats.values():
+        print(
+            f"{row.template:<30} {row.samples:>7} {row.failure_rate:>8.1%} "
+            f"{row.prompt_tokens or 0:>8.1f} {row.eval_count or 0:>8.1f} "
+            f"{row.duration or 0:>8.2f}s"
+        )
+
+
+def main() -> None:
+    """Run an administrative command."""
+    parser = argparse.ArgumentParser(
+        description="Manage the message queue and inspect the statistics."
+    )
+    parser.add_argument(
+        "--log-level",
+        type=str,
+        default="warning",
+        help="Log level.",
+        choices=["critical", "error", "warning", "info", "debug", "trace"],
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    dlq = commands.add_parser("dlq", help="Inspect and replay dead letters.")
+    dlq_commands = dlq.add_subparsers(dest="dlq_command", required=True)
+    for name, help_text in (
+        ("list", "Print the dead letters, newest first."),
+        ("replay", "Return the oldest dead letters back to the queue."),
+    ):
+        dlq_command = dlq_commands.add_parser(name, help=help_text)
+        dlq_command.add_argument(
+            "--count", type=int, help="Maximum number of dead letters."
+        )
+
+    commands.add_parser(
+        "templates", help="Print the generation statistics of the prompt templates."
+    )
+
+    args = parser.parse_args()
+
+    container = ApplicationContainer()
+    container.config.from_dict(
+        {
+            "log_level": args.log_level,
+            "log_format": "human",
+            "log_file": None,
+            "service_name": "admin",
+        }
+    )
+    container.logging()
+
+    if args.command == "templates":
+        asyncio.run(print_template_stats(container))
+    elif args.dlq_command == "list":
+        asyncio.run(list_dead_letters(container, count=args.count))
+    else:
+        asyncio.run(replay_dead_letters(container, count=args.count))
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
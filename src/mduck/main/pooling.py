@@ -12,7 +12,7 @@ from watchdog.events import FileSystemEvent, FileSystemEventHandler
 from watchdog.observers import Observer
 
 from mduck.containers.application import ApplicationContainer
-from mduck.services.mduck import MDuckService
+from mduck.services.worker_pool import WorkerPool
 
 logger = logging.getLogger(__name__)
 
@@ -66,24 +66,29 @@ def run_reloader() -> NoReturn:  # pragma: no cover
     sys.exit(0)
 
 
-async def run_mduck_processor(mduck: MDuckService) -> None:
-    """Run mduck processor."""
-    while True:
-        await mduck.process_message_from_queue()
-
-
 async def start_pooling(container: ApplicationContainer | None = None) -> None:
     """Run pooling."""
     container = container or ApplicationContainer()
     dp: Dispatcher = container.dispatcher()
     bot: Bot = container.gateways.bot()
 
-    mduck: MDuckService = await container.mduck()  # type: ignore[misc]
-    asyncio.create_task(run_mduck_processor(mduck))
-    logger.info("MDuckService background processor started.")
+    worker_pool: WorkerPool | None = None
+    if container.config.mduck.embedded_worker():
+        worker_pool = await container.worker_pool()  # type: ignore[misc]
+        worker_pool.start()
+        logger.info("MDuckService background processor started.")
+    else:
+        logger.info("MDuckService background processor is disabled.")
 
-    await bot.delete_webhook()
-    await dp.start_polling(bot)
+    try:
+        await bot.delete_webhook()
+        await dp.start_polling(bot)
+    finally:
+        if worker_pool is not None:
+            await worker_pool.stop()
+        shutdown = container.shutdown_resources()
+        if shutdown is not None:
+            await shutdown
 
 
 def main() -> None:
@@ -109,6 +114,11 @@ def main() -> None:
         action="store_true",
         help="Enable auto-reloading.",
     )
+    parser.add_argument(
+        "--no-worker",
+        action="store_true",
+        help="Disable the embedded queue worker, run it with run-worker instead.",
+    )
 
     args = parser.parse_args()
 
@@ -121,6 +131,8 @@ def main() -> None:
             "service_name": "pooling",
         }
     )
+    if args.no_worker:
+        container.config.mduck.embedded_worker.from_value(False)
     container.logging()
 
     if args.reload:
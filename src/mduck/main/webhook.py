@@ -10,19 +10,13 @@ import uvicorn
 from fastapi import FastAPI
 
 from mduck.containers.application import ApplicationContainer
-from mduck.routers import healthcheck, webhook, whoami
-from mduck.services.mduck import MDuckService
+from mduck.routers import healthcheck, stats, webhook, whoami
+from mduck.services.worker_pool import WorkerPool
 from mduck.version import __version__
 
 logger = logging.getLogger(__name__)
 
 
-async def run_mduck_processor(mduck: MDuckService) -> None:
-    """Run mduck processor."""
-    while True:
-        await mduck.process_message_from_queue()
-
-
 def create_app(
     container: ApplicationContainer | None = None,
     set_webhook_retries: int = 12,
@@ -39,6 +33,8 @@ def create_app(
                 "service_name": "webhook",
             }
         )
+        if os.environ.get("NO_WORKER"):
+            container.config.mduck.embedded_worker.from_value(False)
         container.logging()
 
     @contextlib.asynccontextmanager
@@ -46,9 +42,13 @@ def create_app(
         logger.info("On startup event...")
 
         # Start background task
-        mduck: MDuckService = await container.mduck()  # type: ignore[misc]
-        asyncio.create_task(run_mduck_processor(mduck))
-        logger.info("MDuckService background processor started.")
+        worker_pool: WorkerPool | None = None
+        if container.config.mduck.embedded_worker():
+            worker_pool = await container.worker_pool()  # type: ignore[misc]
+            worker_pool.start()
+            logger.info("MDuckService background processor started.")
+        else:
+            logger.info("MDuckService background processor is disabled.")
 
         # Setup webhook
         host: str = container.config.tg.webhook.host()
@@ -90,9 +90,18 @@ def create_app(
         await bot.delete_webhook()
         logger.info("Webhook removed.")
 
+        if worker_pool is not None:
+            await worker_pool.stop()
+
+        # Close the Redis and Ollama connections
+        shutdown = container.shutdown_resources()
+        if shutdown is not None:
+            await shutdown
+
     app = FastAPI(version=__version__, lifespan=lifespan)
     app.state.container = container
     app.include_router(healthcheck.router)
+    app.include_router(stats.router)
     app.include_router(webhook.router)
     app.include_router(whoami.router)
 
@@ -122,6 +131,11 @@ def main() -> None:
         choices=["human", "json"],
     )
     parser.add_argument("--log-file", type=str, help="Log file path.")
+    parser.add_argument(
+        "--no-worker",
+        action="store_true",
+        help="Disable the embedded queue worker, run it with run-worker instead.",
+    )
     parser.add_argument(
         "--forwarded-allow-ips",
         type=str,
@@ -134,6 +148,8 @@ def main() -> None:
     os.environ["LOG_FORMAT"] = args.log_format
     if args.log_file:
         os.environ["LOG_FILE"] = args.log_file
+    if args.no_worker:
+        os.environ["NO_WORKER"] = "1"
 
     uvicorn_params = {
         "app": "mduck.main.webhook:create_app",
@@ -0,0 +1,92 @@
+import argparse
+import asyncio
+import logging
+import signal
+
+from mduck.containers.application import ApplicationContainer
+from mduck.services.worker_pool import WorkerPool
+
+logger = logging.getLogger(__name__)
+
+
+async def start_worker(
+    container: ApplicationContainer | None = None,
+    stop_event: asyncio.Event | None = None,
+) -> None:
+    """
+    Run the queue consumers until stopped.
+
+    The worker only consumes the message queue, so it can be scaled
+    independently of the webhook and pooling processes receiving updates.
+
+    Args:
+        container: The application container.
+        stop_event: The event stopping the worker, SIGINT and SIGTERM
+            set it by default.
+
+    """
+    container = container or ApplicationContainer()
+    if stop_event is None:
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop_event.set)
+
+    worker_pool: WorkerPool = await container.worker_pool()  # type: ignore[misc]
+    worker_pool.start()
+    logger.info("MDuckService worker started.")
+
+    try:
+        await stop_event.wait()
+        logger.info("Stopping MDuckService worker...")
+    finally:
+        await worker_pool.stop()
+        shutdown = container.shutdown_resources()
+        if shutdown is not None:
+            await shutdown
+
+
+def main() -> None:
+    """Start the queue worker."""
+    parser = argparse.ArgumentParser(description="Run the queue worker.")
+    parser.add_argument(
+        "--log-level",
+        type=str,
+        default="info",
+        help="Log level.",
+        choices=["critical", "error", "warning", "info", "debug", "trace"],
+    )
+    parser.add_argument(
+        "--log-format",
+        type=str,
+        default="human",
+        help="Log format.",
+        choices=["human", "json"],
+    )
+    parser.add_argument("--log-file", type=str, help="Log file path.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Number of concurrent queue consumers, overrides MDUCK__WORKERS.",
+    )
+
+    args = parser.parse_args()
+
+    container = ApplicationContainer()
+    container.config.from_dict(
+        {
+            "log_level": args.log_level,
+            "log_format": args.log_format,
+            "log_file": args.log_file,
+            "service_name": "worker",
+        }
+    )
+    if args.workers:
+        container.config.mduck.workers.from_value(args.workers)
+    container.logging()
+
+    asyncio.run(start_worker(container=container))
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -0,0 +1,209 @@
+import logging
+import time
+
+from redis.asyncio import Redis
+
+from mduck.schemas.ollama import CircuitState
+
+logger = logging.getLogger(__name__)
+
+# Admits a request, returning the state it was admitted in, or "open"
+ALLOW_SCRIPT = """
+local state_key, probe_key = KEYS[1], KEYS[2]
+local now, probe_ttl = tonumber(ARGV[1]), tonumber(ARGV[2])
+local state = redis.call("HGET", state_key, "state")
+if not state or state == "closed" then
+    return "closed"
+end
+local opened_until = tonumber(redis.call("HGET", state_key, "opened_until"))
+if state == "open" and now < opened_until then
+    return "open"
+end
+redis.call("HSET", state_key, "state", "half_open")
+if redis.call("SET", probe_key, "1", "NX", "PX", probe_ttl) then
+    return "half_open"
+end
+return "open"
+"""
+
+# Records a request outcome, returning the new state, or "ignored" if open
+RECORD_SCRIPT = """
+local state_key, outcomes_key, probe_key = KEYS[1], KEYS[2], KEYS[3]
+local failed, window, min_calls = ARGV[1], tonumber(ARGV[2]), tonumber(ARGV[3])
+local failure_rate, now = tonumber(ARGV[4]), tonumber(ARGV[5])
+local open_time = tonumber(ARGV[6])
+local state = redis.call("HGET", state_key, "state") or "closed"
+local function open()
+    redis.call("HSET", state_key, "state", "open", "opened_until", now + open_time)
+    redis.call("DEL", outcomes_key, probe_key)
+    return "open"
+end
+if state == "half_open" then
+    if failed == "1" then
+        return open()
+    end
+    redis.call("HSET", state_key, "state", "closed")
+    redis.call("DEL", outcomes_key, probe_key)
+    return "closed"
+end
+if state == "open" then
+    -- A late outcome of a request admitted before the circuit opened
+    return "ignored"
+end
+redis.call("LPUSH", outcomes_key, failed)
+redis.call("LTRIM", outcomes_key, 0, window - 1)
+local outcomes = redis.call("LRANGE", outcomes_key, 0, -1)
+local failures = 0
+for _, outcome in ipairs(outcomes) do
+    if outcome == "1" then
+        failures = failures + 1
+    end
+end
+if #outcomes >= min_calls and failures / #outcomes >= failure_rate then
+    return open()
+end
+return "closed"
+"""
+
+
+class CircuitOpenError(Exception):
+    """A request is rejected, as the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    A circuit breaker around the Ollama API shared via Redis.
+
+    The breaker starts closed, recording the outcome of every request. A
+    request failed by the server being down or overloaded, or slower than
+    the slow call duration, counts as a failure. Once the failure rate of the
+    latest requests reaches the threshold, the breaker opens, and requests
+    are rejected right away instead of waiting for the timeouts. After the
+    open time the breaker is half-open, letting a single probe request
+    through: its success closes the breaker, its failure opens it again.
+
+    The state lives in Redis, so every replica opens at once, and Redis
+    errors keep the breaker closed, so Redis is not a single point of
+    failure for the replies.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        failure_rate: float = 0.5,
+        min_calls: int = 5,
+        window: int = 20,
+        slow_call_duration: float = 60.0,
+        open_time: float = 30.0,
+        probe_timeout: float = 120.0,
+        key_prefix: str = "mduck",
+    ) -> None:
+        """
+        Initialize the CircuitBreaker.
+
+        Args:
+            redis: The Redis client.
+            failure_rate: The share of failed latest requests opening the
+                breaker.
+            min_calls: The number of latest requests needed to open it.
+            window: The number of latest requests the rate is computed over.
+            slow_call_duration: Seconds after which a request counts as a
+                failure, even if it succeeds.
+            open_time: Seconds to reject requests for before probing.
+            probe_timeout: Seconds after which another probe is let through
+                if the outcome of the last one is never recorded.
+            key_prefix: The prefix for the breaker keys.
+
+        """
+        if not 0 < failure_rate <= 1:
+            raise ValueError(f"Failure rate must be within (0, 1], got {failure_rate}")
+        if not 0 < min_calls <= window:
+            raise ValueError(
+                f"Breaker must have 0 < min calls <= window, got {min_calls}, {window}"
+            )
+        self._failure_rate = failure_rate
+        self._min_calls = min_calls
+        self._window = window
+        self._slow_call_duration = slow_call_duration
+        self._open_time = open_time
+        self._probe_timeout = probe_timeout
+        self._redis = redis
+        self._state_key = f"{key_prefix}:circuit"
+        self._outcomes_key = f"{key_prefix}:circuit_outcomes"
+        self._probe_key = f"{key_prefix}:circuit_probe"
+        self._allow_script = redis.register_script(ALLOW_SCRIPT)
+        self._record_script = redis.register_script(RECORD_SCRIPT)
+
+    @property
+    def slow_call_duration(self) -> float:
+        """Return the seconds after which a request counts as a failure."""
+        return self._slow_call_duration
+
+    async def get_state(self) -> CircuitState:
+        """Return the breaker state, closed if Redis is unavailable."""
+        try:
+            state, opened_until = await self._redis.hmget(  # type: ignore[misc]
+                self._state_key, ["state", "opened_until"]
+            )
+        except Exception as e:
+            logger.warning("Failed to get circuit breaker state: %s", e)
+            return CircuitState.CLOSED
+        if state == CircuitState.OPEN and time.time() * 1000 >= float(opened_until):
+            return CircuitState.HALF_OPEN
+        return CircuitState(state or CircuitState.CLOSED)
+
+    async def is_open(self) -> bool:
+        """Return True if requests are being rejected."""
+        return await self.get_state() == CircuitState.OPEN
+
+    async def allow(self) -> None:
+        """
+        Admit a request.
+
+        Raises:
+            CircuitOpenError: If the breaker is open, or half-open with a
+                probe already running.
+
+        """
+        try:
+            state = await self._allow_script(
+                keys=[self._state_key, self._probe_key],
+                args=[int(time.time() * 1000), int(self._probe_timeout * 1000)],
+            )
+        except Exception as e:
+            logger.warning("Failed to check circuit breaker: %s", e)
+            return
+        if state == CircuitState.OPEN:
+            raise CircuitOpenError("Ollama circuit breaker is open")
+        if state == CircuitState.HALF_OPEN:
+            logger.info("Ollama circuit breaker is half-open, probing.")
+
+    async def record(self, duration: float, is_failure: bool) -> None:
+        """
+        Record the outcome of an admitted request.
+
+        Args:
+            duration: Seconds the request took.
+            is_failure: True if the request failed by the server.
+
+        """
+        is_failure = is_failure or duration >= self._slow_call_duration
+        try:
+            state = await self._record_script(
+                keys=[self._state_key, self._outcomes_key, self._probe_key],
+                args=[
+                    "1" if is_failure else "0",
+                    self._window,
+                    self._min_calls,
+                    self._failure_rate,
+                    int(time.time() * 1000),
+                    int(self._open_time * 1000),
+                ],
+            )
+        except Exception as e:
+            logger.warning("Failed to record circuit breaker outcome: %s", e)
+            return
+        if state == CircuitState.OPEN:
+            logger.warning(
+                "Ollama circuit breaker is open for %.1f sec.", self._open_time
+            )
@@ -0,0 +1,133 @@
+import logging
+
+from redis.asyncio import Redis
+
+from mduck.schemas.ollama import Turn
+
+logger = logging.getLogger(__name__)
+
+# Turns are stored as the role letter followed by the text
+ROLE_CODES = {"user": "u", "assistant": "a"}
+ROLES = {code: role for role, code in ROLE_CODES.items()}
+
+APPEND_SCRIPT = """
+local key = KEYS[1]
+local max_turns, max_size = tonumber(ARGV[1]), tonumber(ARGV[2])
+local ttl = tonumber(ARGV[3])
+for i = 4, #ARGV do
+    redis.call("RPUSH", key, ARGV[i])
+end
+local turns = redis.call("LRANGE", key, 0, -1)
+local size = 0
+for _, turn in ipairs(turns) do
+    size = size + string.len(turn)
+end
+local dropped = 0
+if #turns > max_turns or size > max_size then
+    local kept, kept_size = 0, 0
+    for i = #turns, 1, -1 do
+        kept_size = kept_size + string.len(turns[i])
+        if kept >= max_turns / 2 or kept_size > max_size / 2 then
+            break
+        end
+        kept = kept + 1
+    end
+    dropped = #turns - kept
+    if kept == 0 then
+        redis.call("DEL", key)
+        return dropped
+    end
+    redis.call("LTRIM", key, -kept, -1)
+end
+redis.call("PEXPIRE", key, ttl)
+return dropped
+"""
+
+
+class ConversationRepository:
+    """
+    The recent turns of every chat conversation with the model in Redis.
+
+    A turn is stored as the role letter followed by the text. Once the turns
+    of a chat grow over the turns or the size limit, the oldest ones are
+    dropped down to half of the limits at once rather than one by one, so
+    consecutive prompts of a chat start with the same history, and Ollama
+    reuses the cache of the shared prefix. A conversation expires after the
+    TTL since its last turn.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        max_turns: int = 10,
+        max_size: int = 4096,
+        ttl: float = 3600.0,
+        key_prefix: str = "mduck",
+    ) -> None:
+        """
+        Initialize the ConversationRepository.
+
+        Args:
+            redis: The Redis client.
+            max_turns: The maximum number of turns kept per chat.
+            max_size: The maximum total size of the turns kept per chat, in
+                bytes of UTF-8 text, about 4 bytes per token of English.
+            ttl: Seconds to keep a conversation since its last turn.
+            key_prefix: The prefix for the conversation keys.
+
+        """
+        if max_turns < 2:
+            raise ValueError(f"Conversation must keep 2+ turns, got {max_turns}")
+        self._redis = redis
+        self._max_turns = max_turns
+        self._max_size = max_size
+        self._ttl = ttl
+        self._key_prefix = f"{key_prefix}:conversation"
+        self._append_script = redis.register_script(APPEND_SCRIPT)
+
+    def _key(self, chat_id: int) -> str:
+        return f"{self._key_prefix}:{chat_id}"
+
+    async def get(self, chat_id: int) -> list[Turn]:
+        """
+        Return the recent turns of the chat, from the oldest.
+
+        Args:
+            chat_id: The chat ID.
+
+        Returns:
+            The conversation turns.
+
+        """
+        raw_turns: list[str] = await self._redis.lrange(self._key(chat_id), 0, -1)  # type: ignore[misc]
+        turns = []
+        for raw in raw_turns:
+            role = ROLES.get(raw[:1])
+            if role is None:
+                logger.warning("Skipping malformed turn %r of chat %s", raw, chat_id)
+                continue
+            turns.append(Turn(role=role, content=raw[1:]))  # type: ignore[arg-type]
+        return turns
+
+    async def append(self, chat_id: int, *turns: Turn) -> None:
+        """
+        Add the turns to the chat conversation.
+
+        Args:
+            chat_id: The chat ID.
+            turns: The new turns, from the oldest.
+
+        """
+        if not turns:
+            return
+        dropped = await self._append_script(
+            keys=[self._key(chat_id)],
+            args=[
+                self._max_turns,
+                self._max_size,
+                int(self._ttl * 1000),
+                *(f"{ROLE_CODES[turn.role]}{turn.content}" for turn in turns),
+            ],
+        )
+        if int(dropped) > 0:
+            logger.debug("Dropped %s old turns of chat %s.", dropped, chat_id)
@@ -0,0 +1,44 @@
+import logging
+
+from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyRepository:
+    """
+    A rolling window of generation latencies shared via Redis.
+
+    Latencies are recorded by the workers and read by the processes admitting
+    new messages, so every replica sees the same model speed.
+    """
+
+    def __init__(
+        self, redis: Redis, window: int = 50, key_prefix: str = "mduck"
+    ) -> None:
+        """
+        Initialize the LatencyRepository.
+
+        Args:
+            redis: The Redis client.
+            window: The number of latest latencies to keep.
+            key_prefix: The prefix for the latency key.
+
+        """
+        if window < 1:
+            raise ValueError(f"Latency window must be positive, got {window}")
+        self._redis = redis
+        self._window = window
+        self._key = f"{key_prefix}:latency"
+
+    async def record(self, seconds: float) -> None:
+        """Add a generation latency to the window."""
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.lpush(self._key, seconds)
+            pipe.ltrim(self._key, 0, self._window - 1)
+            await pipe.execute()
+
+    async def get_latest(self) -> list[float]:
+        """Return the latencies in the window, newest first."""
+        values: list[str] = await self._redis.lrange(self._key, 0, -1)  # type: ignore[misc]
+        return [float(value) for value in values]
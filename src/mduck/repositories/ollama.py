@@ -1,15 +1,41 @@
+import asyncio
 import logging
 import random
-from pathlib import Path
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Sequence
 
 import ollama
+from dependency_injector import resources
 from ollama import ChatResponse
 
+from mduck.repositories.circuit_breaker import CircuitBreaker
+from mduck.repositories.ollama_pool import (
+    OllamaHost,
+    OllamaHostPool,
+    get_model_tag,
+    is_host_failure,
+)
+from mduck.repositories.prompts import PromptRegistry
+from mduck.schemas.ollama import ModelStats, PrefixStats, Turn
+
 logger = logging.getLogger(__name__)
 
+# Load durations over a second mean the model was not in memory
+COLD_LOAD_DURATION = 1.0
+MODEL_STATS_SMOOTHING = 0.2
+
 
 class OllamaRepository:
-    """A repository for interacting with the Ollama API."""
+    """
+    A repository for interacting with the Ollama API.
+
+    The repository may be configured with several models from the fastest to
+    the best one. Every reply goes to the best model the current load
+    allows: each queue size step over the tier queue size moves the reply one
+    model down, and a model is skipped if its typical reply, estimated from
+    the recent speed and length of its replies, would miss the deadline.
+    """
 
     def __init__(
         self,
@@ -17,6 +43,15 @@ class OllamaRepository:
         model: str,
         temperature: float,
         prompts_dir_path: str,
+        embedding_model: str = "all-minilm",
+        pool: OllamaHostPool | None = None,
+        keep_alive: float | str | None = None,
+        keep_alive_interval: float | None = None,
+        models: list[str] | None = None,
+        tier_queue_size: int = 3,
+        breaker: CircuitBreaker | None = None,
+        request_timeout: float | None = None,
+        prompts: PromptRegistry | None = None,
     ) -> None:
         """
         Initialize the OllamaRepository.
@@ -24,60 +59,385 @@ class OllamaRepository:
         Args:
         ----
             host: The Ollama API host.
-            model: The model to use for generating responses.
+            model: The model to use for generating responses, if no models
+                are set.
             temperature: The temperature to use for generating responses.
-            prompts_dir_path: A path to a directory with .txt prompt files.
+            prompts_dir_path: A path to a directory with .txt prompt files,
+                if no prompt registry is set.
+            embedding_model: The model to use for text embeddings.
+            pool: The Ollama hosts to balance the requests over, only the
+                host by default.
+            keep_alive: How long the model stays loaded after a request, in
+                seconds or as a duration like "5m", the server default if
+                not set.
+            keep_alive_interval: Seconds without requests after which a host
+                gets a load-only request keeping the model in memory,
+                disables the keep-alive task if not set.
+            models: The models to choose from, from the fastest to the best.
+            tier_queue_size: The number of queued messages moving a reply
+                to the next faster model.
+            breaker: The circuit breaker rejecting the generations while
+                Ollama is down or overloaded.
+            request_timeout: The maximum seconds a whole request may take,
+                including a streamed response, unlimited if not set.
+            prompts: The system prompt templates, read once from the prompts
+                directory by default.
 
         """
-        self._client = ollama.AsyncClient(host=host)
-        self._model = model
+        if tier_queue_size < 1:
+            raise ValueError(f"Tier queue size must be positive, got {tier_queue_size}")
+        self._pool = pool or OllamaHostPool({host: 1})
+        self._keep_alive = keep_alive
+        self._keep_alive_interval = keep_alive_interval
+        self._keep_alive_task: asyncio.Task[None] | None = None
+        self._models = list(models or [model])
+        # The best model is used when idle, so it is the one kept warm
+        self._model = self._models[-1]
+        self._tier_queue_size = tier_queue_size
+        self._model_stats = {model: ModelStats() for model in self._models}
+        self._prefix_stats: dict[str, PrefixStats] = {}
+        self._breaker = breaker
+        self._request_timeout = request_timeout
         self._temperature = temperature
-        self._system_prompts: dict[str, str] = self._load_prompts(prompts_dir_path)
-        self._system_prompts_keys = list(self._system_prompts.keys())
+        self._embedding_model = embedding_model
+        self._prompts = prompts or PromptRegistry(prompts_dir_path)
         logger.info(
-            "Ollama repo inited with host: %s, %s sys prompts",
-            host,
-            len(self._system_prompts),
+            "Ollama repo inited with hosts: %s, %s sys prompts",
+            ", ".join(host.url for host in self._pool.hosts),
+            len(self._prompts.templates),
+        )
+
+    @property
+    def model(self) -> str:
+        """Return the best model generating responses."""
+        return self._model
+
+    def model_stats(self) -> dict[str, ModelStats]:
+        """Return the recent speed and the number of replies of every model."""
+        return {model: stats.model_copy() for model, stats in self._model_stats.items()}
+
+    def choose_model(self, queue_size: int = 0, timeout: float | None = None) -> str:
+        """
+        Return the best model for a reply under the current load.
+
+        Args:
+            queue_size: The number of queued messages.
+            timeout: Seconds left until the reply deadline, if any.
+
+        Returns:
+            The model name.
+
+        """
+        steps_down = queue_size // self._tier_queue_size
+        allowed = self._models[: max(len(self._models) - steps_down, 1)]
+        for model in reversed(allowed):
+            expected_duration = self._model_stats[model].expected_duration
+            if timeout is None or expected_duration is None:
+                return model
+            if expected_duration <= timeout:
+                return model
+        return self._models[0]
+
+    def _record_model_stats(self, model: str, response: ChatResponse) -> None:
+        """Update the recent speed and reply length of the model."""
+        stats = self._model_stats.setdefault(model, ModelStats())
+        stats.requests += 1
+        if not response.eval_count or not response.eval_duration:
+            return
+        tps = response.eval_count / response.eval_duration * 1e9
+        if stats.tps is None or stats.eval_count is None:
+            stats.tps, stats.eval_count = tps, float(response.eval_count)
+            return
+        stats.tps += MODEL_STATS_SMOOTHING * (tps - stats.tps)
+        stats.eval_count += MODEL_STATS_SMOOTHING * (
+            response.eval_count - stats.eval_count
         )
 
-    def _load_prompts(self, path: str) -> dict[str, str]:
-        prompts = {}
-        for filepath in Path(path).glob("*.txt"):
-            with open(filepath, "r", encoding="utf-8") as fp:
-                prompts[filepath.name] = fp.read().strip()
-        if not prompts:
-            raise ValueError(f"No prompts found in {path}")
-        return prompts
+    def prefix_stats(self) -> dict[str, PrefixStats]:
+        """Return the prompt evaluation savings of the cached prefixes by template."""
+        return {
+            template: stats.model_copy()
+            for template, stats in self._prefix_stats.items()
+        }
 
-    async def generate_response(self, prompt: str) -> tuple[str, ChatResponse]:
+    def _record_prefix_stats(
+        self, template: str, host: OllamaHost, response: ChatResponse
+    ) -> None:
+        """Update the prompt evaluation of the template by the prefix state."""
+        stats = self._prefix_stats.setdefault(template, PrefixStats())
+        prompt_tokens = response.prompt_eval_count or 0
+        prompt_eval_duration = (response.prompt_eval_duration or 0) / 1e9
+        if host.last_template == template:
+            stats.warm_requests += 1
+            stats.warm_prompt_tokens += prompt_tokens
+            stats.warm_prompt_eval_duration += prompt_eval_duration
+        else:
+            stats.cold_requests += 1
+            stats.cold_prompt_tokens += prompt_tokens
+            stats.cold_prompt_eval_duration += prompt_eval_duration
+        host.last_template = template
+
+    async def embed(self, text: str) -> list[float]:
+        """
+        Return the embedding of the text.
+
+        Args:
+        ----
+            text: The text to embed.
+
+        Returns:
+        -------
+            The embedding vector.
+
+        """
+        async with (
+            self._pool.acquire(self._embedding_model) as host,
+            asyncio.timeout(self._request_timeout),
+        ):
+            response = await host.client.embed(
+                model=self._embedding_model, input=text, keep_alive=self._keep_alive
+            )
+        return list(response.embeddings[0])
+
+    async def is_circuit_open(self) -> bool:
+        """Return True if the generations are rejected by the circuit breaker."""
+        return self._breaker is not None and await self._breaker.is_open()
+
+    @asynccontextmanager
+    async def _circuit(self) -> AsyncIterator[None]:
+        """Admit a generation through the circuit breaker and record its outcome."""
+        if self._breaker is None:
+            yield
+            return
+        await self._breaker.allow()
+        started_at = time.monotonic()
+        try:
+            yield
+        except asyncio.CancelledError:
+            # A generation cancelled by the reply deadline is only a slow one
+            duration = time.monotonic() - started_at
+            if duration >= self._breaker.slow_call_duration:
+                await self._breaker.record(duration, is_failure=True)
+            raise
+        except Exception as e:
+            await self._breaker.record(
+                time.monotonic() - started_at, is_failure=is_host_failure(e)
+            )
+            raise
+        await self._breaker.record(time.monotonic() - started_at, is_failure=False)
+
+    @property
+    def templates(self) -> list[str]:
+        """Return the versioned system prompt template names."""
+        return self._prompts.templates
+
+    def choose_template(self) -> str:
+        """Return a random versioned system prompt template name."""
+        return random.choice(self._prompts.templates)
+
+    def _log_load_duration(
+        self, model: str, host: OllamaHost, response: ChatResponse
+    ) -> None:
+        """Log the model load time of the response, warning on cold starts."""
+        load_duration = (response.load_duration or 0) / 1e9
+        if load_duration >= COLD_LOAD_DURATION:
+            logger.warning(
+                "Cold start: model %s loaded on %s in %.2f sec.",
+                model,
+                host.url,
+                load_duration,
+            )
+        else:
+            logger.debug(
+                "Model %s load on %s took %.2f sec.",
+                model,
+                host.url,
+                load_duration,
+            )
+
+    async def _warm_up_host(self, host: OllamaHost) -> None:
+        """Load the model on the host with an empty prompt generating nothing."""
+        try:
+            response = await host.client.generate(
+                model=self._model, keep_alive=self._keep_alive
+            )
+        except Exception as e:
+            logger.warning("Failed to warm up model on %s: %s", host.url, e)
+        else:
+            host.loaded_models.add(get_model_tag(self._model))
+            logger.info(
+                "Model %s warmed up on %s, load took %.2f sec.",
+                self._model,
+                host.url,
+                (response.load_duration or 0) / 1e9,
+            )
+        finally:
+            # A failed host is retried after the interval, not in a busy loop
+            host.last_request_at = time.monotonic()
+
+    async def warm_up(self) -> None:
+        """Load the model on every host, so the first reply skips the load."""
+        await asyncio.gather(*(self._warm_up_host(host) for host in self._pool.hosts))
+
+    async def _keep_alive_loop(self, interval: float) -> None:
+        """Warm up the model on startup and on every host idle for the interval."""
+        await self.warm_up()
+        while True:
+            now = time.monotonic()
+            due_at = min(
+                (host.last_request_at or 0) + interval for host in self._pool.hosts
+            )
+            await asyncio.sleep(max(due_at - now, 0))
+            now = time.monotonic()
+            idle_hosts = [
+                host
+                for host in self._pool.hosts
+                if now - (host.last_request_at or 0) >= interval
+            ]
+            if idle_hosts:
+                logger.info("Keeping model %s loaded on idle hosts.", self._model)
+                await asyncio.gather(*(self._warm_up_host(host) for host in idle_hosts))
+
+    def start_keep_alive(self) -> None:
+        """Start warming up the model in the background, if configured."""
+        if self._keep_alive_interval is None:
+            return
+        if self._keep_alive_task is None or self._keep_alive_task.done():
+            self._keep_alive_task = asyncio.create_task(
+                self._keep_alive_loop(self._keep_alive_interval),
+                name="mduck-keep-alive",
+            )
+
+    async def stop_keep_alive(self) -> None:
+        """Stop the background model warm-up."""
+        if self._keep_alive_task is None:
+            return
+        self._keep_alive_task.cancel()
+        await asyncio.gather(self._keep_alive_task, return_exceptions=True)
+        self._keep_alive_task = None
+
+    async def close(self) -> None:
+        """Stop the background tasks and close the host connections."""
+        await self.stop_keep_alive()
+        await self._prompts.stop()
+        await self._pool.close()
+
+    async def generate_response(
+        self,
+        prompt: str,
+        on_chunk: Callable[[str], Awaitable[None]] | None = None,
+        template: str | None = None,
+        model: str | None = None,
+        num_predict: int | None = None,
+        history: Sequence[Turn] | None = None,
+    ) -> tuple[str, ChatResponse]:
         """
         Generate a response from the Ollama API.
 
         Args:
         ----
             prompt: The user prompt.
+            on_chunk: If set, the response is streamed and the callback is
+                called with the text generated so far after every chunk.
+            template: The versioned system prompt template name, a random one
+                by default. An outdated version is replaced with the current one.
+            model: The model to generate with, the best one by default.
+            num_predict: The maximum number of reply tokens, unlimited by
+                default.
+            history: The previous turns of the conversation, from the oldest.
 
         Returns:
         -------
-            Template name and response from the Ollama API.
+            Versioned template name and response from the Ollama API.
+
+        Raises:
+        ------
+            CircuitOpenError: If the circuit breaker rejects the generation.
 
         """
-        random_key = random.choice(self._system_prompts_keys)
-        system_prompt = self._system_prompts[random_key]
-
-        # num_predict = random.randint(100, 200) if random.random() < 0.5 else None
-        # logger.info("System prompt: %s, num_predict=%s", random_key, num_predict)
-
-        response = await self._client.chat(
-            model=self._model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt},
-            ],
-            options=ollama.Options(
-                temperature=self._temperature,
-                top_p=0.9,
-                num_predict=None,
-            ),
+        model = model or self._model
+        prompt_template = self._prompts.get(template)
+
+        # The history goes right after the system prompt and only grows at the
+        # end, so Ollama reuses the cached prefix of the previous turn
+        messages = [
+            {"role": "system", "content": prompt_template.text},
+            *({"role": turn.role, "content": turn.content} for turn in history or ()),
+            {"role": "user", "content": prompt},
+        ]
+        options = ollama.Options(
+            temperature=self._temperature,
+            top_p=0.9,
+            num_predict=num_predict,
         )
-        return random_key, response
+        if on_chunk is None:
+            async with (
+                self._circuit(),
+                self._pool.acquire(model, affinity=prompt_template.key) as host,
+                asyncio.timeout(self._request_timeout),
+            ):
+                response = await host.client.chat(
+                    model=model,
+                    messages=messages,
+                    options=options,
+                    keep_alive=self._keep_alive,
+                )
+            self._log_load_duration(model, host, response)
+            self._record_model_stats(model, response)
+            self._record_prefix_stats(prompt_template.key, host, response)
+            return prompt_template.key, response
+
+        content = ""
+        chunk: ChatResponse | None = None
+        # The host slot is held until the whole response is streamed
+        async with (
+            self._circuit(),
+            self._pool.acquire(model, affinity=prompt_template.key) as host,
+            asyncio.timeout(self._request_timeout),
+        ):
+            async for chunk in await host.client.chat(
+                model=model,
+                messages=messages,
+                options=options,
+                stream=True,
+                keep_alive=self._keep_alive,
+            ):
+                if chunk.message.content:
+                    content += chunk.message.content
+                    await on_chunk(content)
+        if chunk is None:
+            raise RuntimeError("Empty response stream")
+        self._log_load_duration(model, host, chunk)
+        self._record_model_stats(model, chunk)
+        self._record_prefix_stats(prompt_template.key, host, chunk)
+        # The last chunk carries the generation stats, but only its own text
+        chunk.message.content = content
+        return prompt_template.key, chunk
+
+
+class OllamaResource(resources.AsyncResource[OllamaRepository]):
+    """A resource for interacting with the Ollama API."""
+
+    async def init(self, **kwargs: Any) -> OllamaRepository:
+        """
+        Initialize the Ollama resource.
+
+        Args:
+            kwargs: The OllamaRepository arguments.
+
+        Returns:
+            An initialized Ollama repository.
+
+        """
+        return OllamaRepository(**kwargs)
+
+    async def shutdown(self, repository: OllamaRepository | None) -> None:
+        """
+        Shutdown the Ollama resource.
+
+        Args:
+            repository: The Ollama repository to shutdown.
+
+        """
+        if repository:
+            await repository.close()
@@ -0,0 +1,340 @@
+import asyncio
+import hashlib
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Mapping
+
+import httpx
+import ollama
+
+logger = logging.getLogger(__name__)
+
+LATENCY_SMOOTHING = 0.2
+
+
+def get_model_tag(model: str) -> str:
+    """Return the model name with the tag, Ollama defaults it to latest."""
+    return model if ":" in model else f"{model}:latest"
+
+
+def is_host_failure(error: BaseException) -> bool:
+    """Return True if the error means the host is unhealthy, not the request."""
+    if isinstance(error, ollama.ResponseError):
+        return error.status_code >= 500
+    return isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError))
+
+
+class OllamaHost:
+    """An Ollama backend along with its load and health state."""
+
+    def __init__(
+        self,
+        url: str,
+        weight: int = 1,
+        timeout: httpx.Timeout | None = None,
+        limits: httpx.Limits | None = None,
+    ) -> None:
+        """
+        Initialize the OllamaHost.
+
+        Args:
+            url: The Ollama API URL.
+            weight: The share of requests routed to the host.
+            timeout: The connect, read and write timeouts of the client,
+                none by default.
+            limits: The connection pool limits of the client, the httpx
+                ones by default.
+
+        """
+        if weight < 1:
+            raise ValueError(f"Host {url} weight must be positive, got {weight}")
+        self.url = url
+        self.weight = weight
+        # Ollama passes the extra options to its httpx client
+        options: dict[str, Any] = {} if limits is None else {"limits": limits}
+        self.client = ollama.AsyncClient(host=url, timeout=timeout, **options)
+        self.outstanding = 0
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_failures = 0
+        self.latency: float | None = None
+        self.ejected_until: float | None = None
+        self.loaded_models: set[str] = set()
+        self.last_request_at: float | None = None
+        # The system prompt of the latest generation, its prefix is cached
+        self.last_template: str | None = None
+
+    def is_ejected(self, now: float) -> bool:
+        """Return True if the host is out of rotation."""
+        return self.ejected_until is not None and now < self.ejected_until
+
+    def stats(self) -> dict[str, Any]:
+        """Return the host load, latency and error metrics."""
+        return {
+            "url": self.url,
+            "weight": self.weight,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "latency": self.latency,
+            "ejected": self.is_ejected(time.monotonic()),
+            "loaded_models": sorted(self.loaded_models),
+            "idle": (
+                None
+                if self.last_request_at is None
+                else time.monotonic() - self.last_request_at
+            ),
+        }
+
+
+class OllamaHostPool:
+    """
+    A pool of Ollama backends with health-aware load balancing.
+
+    Requests go to the host with the least outstanding requests relative to
+    its weight. A host without the requested model loaded counts the cold
+    load cost on top, so a request does not pay for a cold model load while
+    a warm host is about as free, yet a busy warm host does not take all the
+    traffic and a cold host gets to load the model again. Every host serves
+    at most the configured number of requests at once, further requests wait
+    for a free slot.
+
+    Health is checked passively: a host failing several requests in a row,
+    by a connection error, a timeout or a server error, is ejected from the
+    rotation for a while. Once the ejection expires, the host is probed by
+    listing its loaded models and brought back on success. The loaded
+    models of all hosts are refreshed the same way in the background.
+
+    With the affinity slack set, requests sharing a system prompt are pinned
+    to the same host by rendezvous hashing, so Ollama reuses the cached
+    prompt prefix. A request leaves its pinned host only once the host is
+    busier than the least loaded one by more than the slack, and moves to
+    the next host in the stable order of its system prompt.
+    """
+
+    def __init__(
+        self,
+        hosts: Mapping[str, int],
+        max_concurrency: int | None = None,
+        failure_threshold: int = 3,
+        ejection_time: float = 30.0,
+        probe_interval: float = 30.0,
+        timeout: httpx.Timeout | None = None,
+        limits: httpx.Limits | None = None,
+        affinity_slack: float | None = None,
+        cold_load_cost: float = 1.0,
+    ) -> None:
+        """
+        Initialize the OllamaHostPool.
+
+        Args:
+            hosts: The weight of every Ollama API URL.
+            max_concurrency: The maximum number of requests served by a host
+                at once, unlimited by default.
+            failure_threshold: The number of failures in a row ejecting a host.
+            ejection_time: Seconds to keep a failed host out of rotation.
+            probe_interval: Seconds between the loaded models checks.
+            timeout: The connect, read and write timeouts of every host
+                client, none by default.
+            limits: The connection pool limits of every host client.
+            affinity_slack: The outstanding requests per weight a pinned host
+                may have over the least loaded one, requests are not pinned
+                if not set.
+            cold_load_cost: The outstanding requests per weight a host
+                without the requested model loaded is charged for the load.
+
+        """
+        if not hosts:
+            raise ValueError("At least one Ollama host is required")
+        self._hosts = [
+            OllamaHost(url, weight, timeout=timeout, limits=limits)
+            for url, weight in hosts.items()
+        ]
+        self._max_concurrency = max_concurrency
+        self._failure_threshold = failure_threshold
+        self._ejection_time = ejection_time
+        self._probe_interval = probe_interval
+        self._affinity_slack = affinity_slack
+        self._cold_load_cost = cold_load_cost
+        self._condition = asyncio.Condition()
+        self._probed_at: float | None = None
+        self._probe_task: asyncio.Task[None] | None = None
+
+    @property
+    def hosts(self) -> list[OllamaHost]:
+        """Return the hosts of the pool."""
+        return self._hosts
+
+    def stats(self) -> list[dict[str, Any]]:
+        """Return the metrics of every host."""
+        return [host.stats() for host in self._hosts]
+
+    @staticmethod
+    def _get_affinity_score(host: OllamaHost, affinity: str) -> int:
+        """Return the rendezvous hash score, the highest is the pinned host."""
+        digest = hashlib.blake2b(
+            f"{affinity}\0{host.url}".encode(), digest_size=8
+        ).digest()
+        return int.from_bytes(digest, "big")
+
+    def _choose(
+        self, model: str | None, now: float, affinity: str | None = None
+    ) -> OllamaHost | None:
+        """Return the best host with a free slot, or None if all are busy."""
+        available = [
+            host
+            for host in self._hosts
+            if self._max_concurrency is None or host.outstanding < self._max_concurrency
+        ]
+        healthy = [host for host in available if not host.is_ejected(now)]
+        if not healthy:
+            if any(not host.is_ejected(now) for host in self._hosts):
+                return None
+            # Every host is ejected, the least recently failed one is the best bet
+            healthy = sorted(available, key=lambda host: host.ejected_until or 0)[:1]
+        if not healthy:
+            return None
+        model_tag = None if model is None else get_model_tag(model)
+
+        def is_cold(host: OllamaHost) -> bool:
+            return model_tag is not None and model_tag not in host.loaded_models
+
+        def get_load(host: OllamaHost) -> float:
+            load = host.outstanding / host.weight
+            return load + self._cold_load_cost if is_cold(host) else load
+
+        min_load = min(get_load(host) for host in healthy)
+
+        def get_affinity_key(host: OllamaHost) -> tuple[bool, int]:
+            if affinity is None or self._affinity_slack is None:
+                return False, 0
+            return (
+                get_load(host) > min_load + self._affinity_slack,
+                -self._get_affinity_score(host, affinity),
+            )
+
+        return min(
+            healthy,
+            key=lambda host: (
+                *get_affinity_key(host),
+                get_load(host),
+                is_cold(host),
+                random.random(),
+            ),
+        )
+
+    async def _probe_host(self, host: OllamaHost, now: float) -> None:
+        """Refresh the loaded models of the host, bringing it back on success."""
+        try:
+            response = await host.client.ps()
+        except Exception as e:
+            if host.ejected_until is not None:
+                host.ejected_until = now + self._ejection_time
+            logger.warning("Ollama host %s probe failed: %s", host.url, e)
+            return
+        host.loaded_models = {
+            get_model_tag(model.model) for model in response.models if model.model
+        }
+        if host.ejected_until is not None:
+            logger.info("Ollama host %s is back in rotation.", host.url)
+            host.ejected_until = None
+            host.consecutive_failures = 0
+
+    async def probe(self) -> None:
+        """Probe the hosts due for a loaded models check or back from ejection."""
+        now = time.monotonic()
+        is_due = (
+            self._probed_at is None or now - self._probed_at >= self._probe_interval
+        )
+        hosts = [
+            host
+            for host in self._hosts
+            if is_due or (host.ejected_until is not None and not host.is_ejected(now))
+        ]
+        if is_due:
+            self._probed_at = now
+        await asyncio.gather(*(self._probe_host(host, now) for host in hosts))
+
+    async def close(self) -> None:
+        """Stop the background probe and close the connections of every host."""
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            await asyncio.gather(self._probe_task, return_exceptions=True)
+            self._probe_task = None
+        await asyncio.gather(
+            *(host.client.close() for host in self._hosts)  # type: ignore[no-untyped-call]
+        )
+
+    def _schedule_probe(self) -> None:
+        """Probe the hosts in the background unless a probe is running."""
+        if self._probe_task is None or self._probe_task.done():
+            self._probe_task = asyncio.create_task(self.probe())
+
+    def _record(
+        self, host: OllamaHost, latency: float, error: BaseException | None
+    ) -> None:
+        """Update the host metrics, ejecting it after too many failures."""
+        host.requests += 1
+        if error is None or not is_host_failure(error):
+            host.consecutive_failures = 0
+            host.latency = (
+                latency
+                if host.latency is None
+                else host.latency + LATENCY_SMOOTHING * (latency - host.latency)
+            )
+            return
+        host.errors += 1
+        host.consecutive_failures += 1
+        if host.consecutive_failures >= self._failure_threshold:
+            host.ejected_until = time.monotonic() + self._ejection_time
+            logger.warning(
+                "Ollama host %s ejected for %.1f sec after %s failures: %s",
+                host.url,
+                self._ejection_time,
+                host.consecutive_failures,
+                error,
+            )
+
+    @asynccontextmanager
+    async def acquire(
+        self, model: str | None = None, affinity: str | None = None
+    ) -> AsyncIterator[OllamaHost]:
+        """
+        Take a slot on the best host for the model, waiting for a free one.
+
+        The outcome of the request made inside the context is recorded to the
+        host metrics and health.
+
+        Args:
+            model: The model of the request.
+            affinity: The system prompt of the request, pinning it to a host
+                if the affinity slack is set.
+
+        Yields:
+            The chosen host.
+
+        """
+        self._schedule_probe()
+        async with self._condition:
+            while (host := self._choose(model, time.monotonic(), affinity)) is None:
+                await self._condition.wait()
+            host.outstanding += 1
+
+        started_at = time.monotonic()
+        error: BaseException | None = None
+        try:
+            yield host
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            if model is not None and error is None:
+                host.loaded_models.add(get_model_tag(model))
+            host.last_request_at = time.monotonic()
+            if not isinstance(error, asyncio.CancelledError):
+                self._record(host, host.last_request_at - started_at, error)
+            async with self._condition:
+                host.outstanding -= 1
+                self._condition.notify()
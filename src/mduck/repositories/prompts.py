@@ -0,0 +1,167 @@
+import asyncio
+import hashlib
+import logging
+import random
+from pathlib import Path
+from types import MappingProxyType
+from typing import Mapping
+
+from mduck.schemas.ollama import Prompt
+
+logger = logging.getLogger(__name__)
+
+PROMPT_VERSION_LENGTH = 8
+
+# The file names, modification times and sizes of the prompt files
+_Signature = tuple[tuple[str, int, int], ...]
+
+
+def get_template_name(template: str) -> str:
+    """Return the template name without the version."""
+    return template.rpartition("@")[0] or template
+
+
+class PromptRegistry:
+    """
+    The system prompt templates read from a directory of .txt files.
+
+    Every prompt is identified by its file name and the hash of its text, so
+    the cached responses and the template statistics of an edited prompt
+    start over. The prompts form an immutable snapshot, which is replaced as
+    a whole once the directory changes, so a generation never sees a half
+    reloaded set. A reload producing no prompts, or failing to read the
+    directory, keeps the current snapshot serving.
+    """
+
+    def __init__(self, path: str, reload_interval: float | None = None) -> None:
+        """
+        Initialize the PromptRegistry.
+
+        Args:
+            path: A path to a directory with .txt prompt files.
+            reload_interval: Seconds between the directory change checks,
+                the prompts are read only once if not set.
+
+        Raises:
+            ValueError: If the directory has no prompts.
+
+        """
+        self._path = Path(path)
+        self._reload_interval = reload_interval
+        self._reload_task: asyncio.Task[None] | None = None
+        self._signature = self._get_signature()
+        self._snapshot = self._read()
+
+    def _get_signature(self) -> _Signature:
+        """Return the state of the prompt files, changing on every edit."""
+        files = []
+        for filepath in sorted(self._path.glob("*.txt")):
+            stat = filepath.stat()
+            files.append((filepath.name, stat.st_mtime_ns, stat.st_size))
+        return tuple(files)
+
+    def _read(self) -> Mapping[str, Prompt]:
+        """Return a snapshot of the prompts by their versioned template names."""
+        prompts = {}
+        for filepath in sorted(self._path.glob("*.txt")):
+            with open(filepath, "r", encoding="utf-8") as fp:
+                text = fp.read().strip()
+            if not text:
+                logger.warning("Skipping empty prompt %s", filepath)
+                continue
+            version = hashlib.sha256(text.encode()).hexdigest()
+            prompt = Prompt(
+                name=filepath.name,
+                text=text,
+                version=version[:PROMPT_VERSION_LENGTH],
+            )
+            prompts[prompt.key] = prompt
+        if not prompts:
+            raise ValueError(f"No prompts found in {self._path}")
+        return MappingProxyType(prompts)
+
+    @property
+    def templates(self) -> list[str]:
+        """Return the versioned names of the current prompts."""
+        return list(self._snapshot)
+
+    def get(self, template: str | None = None) -> Prompt:
+        """
+        Return the prompt of the template.
+
+        A template replaced by a reload resolves to its current version, a
+        removed one, like no template, to a random prompt.
+
+        Args:
+            template: The versioned template name.
+
+        Returns:
+            The prompt.
+
+        """
+        snapshot = self._snapshot
+        if template is not None:
+            if template in snapshot:
+                return snapshot[template]
+            name = get_template_name(template)
+            for prompt in snapshot.values():
+                if prompt.name == name:
+                    return prompt
+        return random.choice(list(snapshot.values()))
+
+    def reload(self) -> bool:
+        """
+        Swap in the prompts of the directory if it has changed.
+
+        Returns:
+            True if the prompts have changed.
+
+        """
+        try:
+            signature = self._get_signature()
+            if signature == self._signature:
+                return False
+            # A broken directory is reported once, not on every check
+            self._signature = signature
+            snapshot = self._read()
+        except (OSError, ValueError) as e:
+            logger.error(
+                "Failed to reload prompts, keeping %s current ones: %s",
+                len(self._snapshot),
+                e,
+            )
+            return False
+        if snapshot.keys() == self._snapshot.keys():
+            return False
+        added = snapshot.keys() - self._snapshot.keys()
+        removed = self._snapshot.keys() - snapshot.keys()
+        self._snapshot = snapshot
+        logger.info(
+            "Prompts reloaded, added: %s, removed: %s",
+            ", ".join(sorted(added)) or "-",
+            ", ".join(sorted(removed)) or "-",
+        )
+        return True
+
+    async def _reload_loop(self, interval: float) -> None:
+        """Reload the prompts on every interval."""
+        while True:
+            await asyncio.sleep(interval)
+            self.reload()
+
+    def start(self) -> None:
+        """Start checking the directory for changes in the background."""
+        if self._reload_interval is None:
+            return
+        if self._reload_task is None or self._reload_task.done():
+            self._reload_task = asyncio.create_task(
+                self._reload_loop(self._reload_interval), name="mduck-prompts"
+            )
+
+    async def stop(self) -> None:
+        """Stop checking the directory for changes."""
+        if self._reload_task is None:
+            return
+        self._reload_task.cancel()
+        await asyncio.gather(self._reload_task, return_exceptions=True)
+        self._reload_task = None
@@ -0,0 +1,763 @@
+import abc
+import asyncio
+import enum
+import logging
+import random
+import time
+from typing import Any, Iterable, Mapping, Protocol
+
+from pydantic import ValidationError
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+from redis.commands.core import AsyncScript
+
+from mduck.schemas.queue import (
+    DeadLetter,
+    MessagePayload,
+    QueueItem,
+    QueueLane,
+    QueueMessage,
+)
+
+logger = logging.getLogger(__name__)
+
+COALESCE_SCRIPT_PART = """
+local chats_key, buffer_key = KEYS[1], KEYS[2]
+local chat_id, payload = ARGV[1], ARGV[2]
+local buffer_size, buffer_ttl = tonumber(ARGV[3]), tonumber(ARGV[4])
+if redis.call("SISMEMBER", chats_key, chat_id) == 1 then
+    if buffer_size == 0 then
+        return 1
+    end
+    redis.call("RPUSH", buffer_key, payload)
+    redis.call("LTRIM", buffer_key, -buffer_size, -1)
+    redis.call("PEXPIRE", buffer_key, buffer_ttl)
+    return 3
+end
+"""
+
+COALESCE_SCRIPT = COALESCE_SCRIPT_PART + "return 0"
+
+ENQUEUE_SCRIPT = (
+    COALESCE_SCRIPT_PART
+    + """
+local lane_key, signal_key = KEYS[3], KEYS[4]
+local message, max_size = ARGV[5], tonumber(ARGV[6])
+if redis.call("LLEN", lane_key) >= max_size then
+    return 2
+end
+redis.call("LPUSH", lane_key, message)
+redis.call("SADD", chats_key, chat_id)
+redis.call("LPUSH", signal_key, 1)
+redis.call("LTRIM", signal_key, 0, tonumber(ARGV[7]) - 1)
+return 0
+"""
+)
+
+DEQUEUE_SCRIPT = """
+local processing_key = KEYS[1]
+for i = 2, #KEYS do
+    local raw = redis.call("LMOVE", KEYS[i], processing_key, "RIGHT", "LEFT")
+    if raw then
+        return raw
+    end
+end
+return false
+"""
+
+PROMOTE_SCRIPT = """
+local now, limit, mode = ARGV[1], tonumber(ARGV[2]), ARGV[3]
+local signal_key = KEYS[#KEYS]
+local moved = 0
+for i = 1, #KEYS - 1, 2 do
+    local due = redis.call("ZRANGEBYSCORE", KEYS[i], "-inf", now, "LIMIT", 0, limit)
+    for _, message in ipairs(due) do
+        redis.call("ZREM", KEYS[i], message)
+        if mode == "stream" then
+            redis.call("XADD", KEYS[i + 1], "*", "payload", message)
+        else
+            redis.call("RPUSH", KEYS[i + 1], message)
+        end
+        redis.call("LPUSH", signal_key, 1)
+        moved = moved + 1
+    end
+end
+redis.call("LTRIM", signal_key, 0, tonumber(ARGV[4]) - 1)
+return moved
+"""
+
+SIGNAL_SIZE = 100
+
+PROMOTE_BATCH_SIZE = 100
+
+DEFAULT_LANE_WEIGHTS = {
+    QueueLane.DIRECT: 6,
+    QueueLane.PRIVATE: 3,
+    QueueLane.GROUP: 1,
+}
+
+
+class EnqueueStatus(enum.IntEnum):
+    """Enqueue script result."""
+
+    QUEUED = 0
+    DUPLICATE = 1
+    FULL = 2
+    COALESCED = 3
+
+
+class QueueRepository(Protocol):
+    """The message queue backend interface."""
+
+    async def is_queued(self, chat_id: int) -> bool:
+        """Return True if the chat already has a message in the queue."""
+        ...
+
+    async def size(self) -> int:
+        """Return the number of chats with a queued or in-flight message."""
+        ...
+
+    async def stats(self) -> dict[str, Any]:
+        """Return the queue backend statistics."""
+        ...
+
+    async def coalesce(self, message: MessagePayload) -> bool:
+        """Buffer the message if its chat is already queued."""
+        ...
+
+    async def take_coalesced(self, chat_id: int) -> list[MessagePayload]:
+        """Return and clear the buffered messages of the chat."""
+        ...
+
+    async def enqueue(self, message: QueueMessage, max_size: int) -> EnqueueStatus:
+        """Add a message to the lane of the message."""
+        ...
+
+    async def dequeue(self, consumer: str) -> QueueItem | None:
+        """Take the next message from the queue for processing."""
+        ...
+
+    async def keep_alive(self, consumer: str, item: QueueItem) -> None:
+        """Keep the in-flight message owned by the consumer until cancelled."""
+        ...
+
+    async def ack(self, consumer: str, item: QueueItem) -> None:
+        """Mark the in-flight message as processed."""
+        ...
+
+    async def retry(
+        self, consumer: str, item: QueueItem, message: QueueMessage, delay: float
+    ) -> None:
+        """Replace the in-flight message with a delayed retry."""
+        ...
+
+    async def dead_letter(self, consumer: str, item: QueueItem, error: str) -> None:
+        """Move the in-flight message to the dead letter queue."""
+        ...
+
+    async def get_dead_letters(self, count: int | None = None) -> list[DeadLetter]:
+        """Return the dead letters, newest first."""
+        ...
+
+    async def replay_dead_letters(self, count: int | None = None) -> int:
+        """Return the oldest dead letters back to the queue."""
+        ...
+
+    async def requeue(self, consumer: str) -> int:
+        """Return all in-flight messages of the consumer back to the queue."""
+        ...
+
+    async def reap(self) -> int:
+        """Requeue abandoned messages and release orphaned chats."""
+        ...
+
+
+def get_lane_weights(weights: Mapping[str, int] | None) -> dict[QueueLane, int]:
+    """
+    Return the lane weights, falling back to the defaults for missing lanes.
+
+    Args:
+        weights: The lane weights by the lane name.
+
+    Returns:
+        The weight of every lane.
+
+    """
+    lane_weights = DEFAULT_LANE_WEIGHTS | {
+        QueueLane(lane): weight for lane, weight in (weights or {}).items()
+    }
+    for lane, weight in lane_weights.items():
+        if weight < 1:
+            raise ValueError(f"Lane {lane.value} weight must be positive, got {weight}")
+    return lane_weights
+
+
+def weighted_lane_order(weights: Mapping[QueueLane, int]) -> list[QueueLane]:
+    """
+    Return lanes in a weighted random order.
+
+    Every lane comes first with a probability proportional to its weight,
+    so the highest priority lane is served most of the time, while no lane
+    is starved under a constant load.
+
+    Args:
+        weights: The lane weights.
+
+    Returns:
+        The lanes ordered for the next dequeue attempt.
+
+    """
+    return sorted(
+        weights,
+        key=lambda lane: random.random() ** (1 / weights[lane]),
+        reverse=True,
+    )
+
+
+def get_lane(raw: str) -> QueueLane:
+    """Return the lane of the raw queue message, malformed ones go to the group lane."""
+    try:
+        return QueueMessage.model_validate_json(raw).lane
+    except ValidationError:
+        return QueueLane.GROUP
+
+
+def get_chat_ids(raw_messages: Iterable[str]) -> set[str]:
+    """Return chat ids of the raw queue messages, skipping malformed ones."""
+    chat_ids = set()
+    for raw in raw_messages:
+        try:
+            chat_ids.add(str(QueueMessage.model_validate_json(raw).message.chat_id))
+        except ValidationError:
+            continue
+    return chat_ids
+
+
+class BaseQueueRepository(abc.ABC):
+    """
+    The chat bookkeeping shared by the queue backends.
+
+    A chat has at most one message in the queue, the chat ids of queued and
+    in-flight messages are kept in a set. Messages arriving while their chat
+    is queued are coalesced into a small per-chat buffer, so the worker can
+    answer all of them with a single generation.
+
+    Failed messages waiting for a retry are kept in a sorted set per lane
+    scored by the retry time, the chat stays queued meanwhile. Due retries
+    are moved back to their lanes by the consumers before every dequeue.
+    Messages failed permanently are kept in a bounded dead letter list for
+    inspection and replay.
+    """
+
+    _enqueue_script: AsyncScript
+    _promote_mode: str
+
+    def __init__(
+        self,
+        redis: Redis,
+        visibility_timeout: float = 60.0,
+        dequeue_timeout: int = 5,
+        key_prefix: str = "mduck",
+        lane_weights: Mapping[str, int] | None = None,
+        coalesce_size: int = 5,
+        coalesce_ttl: float = 300.0,
+        dead_letter_size: int = 1000,
+    ) -> None:
+        """
+        Initialize the queue repository.
+
+        Args:
+            redis: The Redis client.
+            visibility_timeout: Seconds of inactivity after which in-flight
+                messages are considered abandoned and returned to the queue.
+            dequeue_timeout: Seconds to block waiting for a message.
+            key_prefix: The prefix for all queue keys.
+            lane_weights: The dequeue weight of every lane.
+            coalesce_size: The maximum number of buffered messages per chat,
+                0 disables coalescing.
+            coalesce_ttl: Seconds to keep the buffered messages of a chat.
+            dead_letter_size: The maximum number of kept dead letters.
+
+        """
+        if dequeue_timeout >= visibility_timeout:
+            raise ValueError(
+                "Dequeue timeout must be less than visibility timeout, "
+                f"got {dequeue_timeout} >= {visibility_timeout}"
+            )
+        if coalesce_size < 0:
+            raise ValueError(f"Coalesce size must not be negative, got {coalesce_size}")
+        self._redis = redis
+        self._visibility_timeout = visibility_timeout
+        self._dequeue_timeout = dequeue_timeout
+        self._lane_weights = get_lane_weights(lane_weights)
+        self._coalesce_size = coalesce_size
+        self._coalesce_ttl = coalesce_ttl
+        self._dead_letter_size = dead_letter_size
+        self._signal_key = f"{key_prefix}:queue_signal"
+        self._chats_in_queue_key = f"{key_prefix}:chats_in_queue"
+        self._buffer_key_prefix = f"{key_prefix}:chat_buffer"
+        self._retry_key_prefix = f"{key_prefix}:retry"
+        self._dead_letters_key = f"{key_prefix}:dead_letters"
+        self._coalesce_script = redis.register_script(COALESCE_SCRIPT)
+        self._promote_script = redis.register_script(PROMOTE_SCRIPT)
+
+    @abc.abstractmethod
+    def _lane_key(self, lane: QueueLane) -> str:
+        """Return the key of the lane holding the waiting messages."""
+
+    @abc.abstractmethod
+    def _remove_in_flight(self, pipe: Pipeline, consumer: str, item: QueueItem) -> None:
+        """Queue the removal of the in-flight item of the consumer on the pipe."""
+
+    def _buffer_key(self, chat_id: int) -> str:
+        return f"{self._buffer_key_prefix}:{chat_id}"
+
+    def _retry_key(self, lane: QueueLane) -> str:
+        return f"{self._retry_key_prefix}:{lane.value}"
+
+    def _coalesce_args(self, message: MessagePayload) -> list[Any]:
+        return [
+            message.chat_id,
+            message.model_dump_json(),
+            self._coalesce_size,
+            int(self._coalesce_ttl * 1000),
+        ]
+
+    async def is_queued(self, chat_id: int) -> bool:
+        """Return True if the chat already has a message in the queue."""
+        return bool(
+            await self._redis.sismember(  # type: ignore[misc]
+                self._chats_in_queue_key, str(chat_id)
+            )
+        )
+
+    async def size(self) -> int:
+        """Return the number of chats with a queued or in-flight message."""
+        return int(await self._redis.scard(self._chats_in_queue_key))  # type: ignore[misc]
+
+    async def coalesce(self, message: MessagePayload) -> bool:
+        """
+        Buffer the message if its chat is already queued.
+
+        Only the latest messages are kept in the buffer, and the buffer
+        expires if the chat is not processed in time.
+
+        Args:
+            message: The message to buffer.
+
+        Returns:
+            True if the chat is queued, False otherwise.
+
+        """
+        status = await self._coalesce_script(
+            keys=[self._chats_in_queue_key, self._buffer_key(message.chat_id)],
+            args=self._coalesce_args(message),
+        )
+        return bool(status)
+
+    async def take_coalesced(self, chat_id: int) -> list[MessagePayload]:
+        """Return and clear the buffered messages of the chat, oldest first."""
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.lrange(self._buffer_key(chat_id), 0, -1)
+            pipe.delete(self._buffer_key(chat_id))
+            raw_messages, _deleted = await pipe.execute()
+        messages = []
+        for raw in raw_messages:
+            try:
+                messages.append(MessagePayload.model_validate_json(raw))
+            except ValidationError as e:
+                logger.error("Dropping malformed buffered message %r: %s", raw, e)
+        return messages
+
+    async def enqueue(self, message: QueueMessage, max_size: int) -> EnqueueStatus:
+        """
+        Add a message to its lane in a single atomic round trip.
+
+        The chat deduplication, the lane capacity check and the push are done
+        by a server-side script, so concurrent producers can neither overshoot
+        the lane size nor queue two messages for the same chat. A message of an
+        already queued chat is coalesced into the chat buffer.
+
+        Args:
+            message: The message to queue.
+            max_size: The maximum number of messages in the lane.
+
+        Returns:
+            The enqueue status.
+
+        """
+        status = await self._enqueue_script(
+            keys=[
+                self._chats_in_queue_key,
+                self._buffer_key(message.message.chat_id),
+                self._lane_key(message.lane),
+                self._signal_key,
+            ],
+            args=[
+                *self._coalesce_args(message.message),
+                message.model_dump_json(),
+                max_size,
+                SIGNAL_SIZE,
+            ],
+        )
+        return EnqueueStatus(int(status))
+
+    async def promote_retries(self) -> int:
+        """Move the messages due for a retry back to their lanes."""
+        keys = []
+        for lane in QueueLane:
+            keys += [self._retry_key(lane), self._lane_key(lane)]
+        moved = await self._promote_script(
+            keys=[*keys, self._signal_key],
+            args=[time.time(), PROMOTE_BATCH_SIZE, self._promote_mode, SIGNAL_SIZE],
+        )
+        return int(moved)
+
+    async def _retry_stats(self) -> dict[str, int]:
+        """Return the number of delayed retries and dead letters."""
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for lane in QueueLane:
+                pipe.zcard(self._retry_key(lane))
+            pipe.llen(self._dead_letters_key)
+            *retries, dead_letters = await pipe.execute()
+        return {"retries": sum(retries), "dead_letters": dead_letters}
+
+    async def ack(self, consumer: str, item: QueueItem) -> None:
+        """Remove a processed message and release its chat."""
+        chat_id = item.message.message.chat_id
+        async with self._redis.pipeline(transaction=True) as pipe:
+            self._remove_in_flight(pipe, consumer, item)
+            pipe.srem(self._chats_in_queue_key, str(chat_id))
+            pipe.delete(self._buffer_key(chat_id))
+            await pipe.execute()
+
+    async def retry(
+        self, consumer: str, item: QueueItem, message: QueueMessage, delay: float
+    ) -> None:
+        """
+        Replace the in-flight message with a delayed retry.
+
+        The chat stays queued until the retry is processed, so new messages
+        of the chat keep being coalesced.
+
+        Args:
+            consumer: The consumer processing the message.
+            item: The in-flight queue item.
+            message: The message to retry.
+            delay: Seconds to wait before the retry.
+
+        """
+        async with self._redis.pipeline(transaction=True) as pipe:
+            self._remove_in_flight(pipe, consumer, item)
+            pipe.zadd(
+                self._retry_key(message.lane),
+                {message.model_dump_json(): time.time() + delay},
+            )
+            await pipe.execute()
+
+    async def dead_letter(self, consumer: str, item: QueueItem, error: str) -> None:
+        """
+        Move the in-flight message to the dead letter queue and release its chat.
+
+        Args:
+            consumer: The consumer processing the message.
+            item: The in-flight queue item.
+            error: The failure reason.
+
+        """
+        chat_id = item.message.message.chat_id
+        dead_letter = DeadLetter(message=item.message, error=error)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            self._remove_in_flight(pipe, consumer, item)
+            pipe.srem(self._chats_in_queue_key, str(chat_id))
+            pipe.delete(self._buffer_key(chat_id))
+            pipe.lpush(self._dead_letters_key, dead_letter.model_dump_json())
+            pipe.ltrim(self._dead_letters_key, 0, self._dead_letter_size - 1)
+            await pipe.execute()
+
+    async def get_dead_letters(self, count: int | None = None) -> list[DeadLetter]:
+        """
+        Return the dead letters, newest first.
+
+        Args:
+            count: The maximum number of dead letters, all by default.
+
+        Returns:
+            The dead letters, malformed ones are skipped.
+
+        """
+        raw_letters: list[str] = await self._redis.lrange(  # type: ignore[misc]
+            self._dead_letters_key, 0, -1 if count is None else count - 1
+        )
+        dead_letters = []
+        for raw in raw_letters:
+            try:
+                dead_letters.append(DeadLetter.model_validate_json(raw))
+            except ValidationError as e:
+                logger.error("Skipping malformed dead letter %r: %s", raw, e)
+        return dead_letters
+
+    async def replay_dead_letters(self, count: int | None = None) -> int:
+        """
+        Return the oldest dead letters back to the queue.
+
+        Replayed messages start over with no attempts and are scheduled for
+        an immediate retry, malformed dead letters are dropped.
+
+        Args:
+            count: The maximum number of replayed messages, all by default.
+
+        Returns:
+            The number of replayed messages.
+
+        """
+        raw_letters: list[str] = await self._redis.lrange(  # type: ignore[misc]
+            self._dead_letters_key, 0, -1
+        )
+        raw_letters.reverse()
+        if count is not None:
+            raw_letters = raw_letters[:count]
+
+        replayed = 0
+        for raw in raw_letters:
+            async with self._redis.pipeline(transaction=True) as pipe:
+                pipe.lrem(self._dead_letters_key, -1, raw)
+                try:
+                    dead_letter = DeadLetter.model_validate_json(raw)
+                except ValidationError as e:
+                    logger.error("Dropping malformed dead letter %r: %s", raw, e)
+                    await pipe.execute()
+                    continue
+                now = time.time()
+                message = dead_letter.message.model_copy(
+                    update={"attempts": 0, "enqueued_at": now}
+                )
+                pipe.zadd(
+                    self._retry_key(message.lane), {message.model_dump_json(): now}
+                )
+                pipe.sadd(self._chats_in_queue_key, str(message.message.chat_id))
+                await pipe.execute()
+            replayed += 1
+        if replayed:
+            logger.info("Replayed %s dead letters.", replayed)
+        return replayed
+
+
+class MessageQueueRepository(BaseQueueRepository):
+    """
+    A reliable message queue on top of Redis lists.
+
+    Messages are queued into one list per priority lane. Consumers atomically
+    move messages from the lanes into their own processing list, so a message
+    is never lost if the consumer dies in the middle of processing. Lanes are
+    polled in a weighted random order, so higher priority lanes are served
+    first most of the time while lower priority lanes never starve. While
+    alive, a consumer refreshes its heartbeat key; processing lists of
+    consumers whose heartbeat has expired are moved back to the lanes by the
+    reaper.
+    """
+
+    _promote_mode = "list"
+
+    def __init__(
+        self,
+        redis: Redis,
+        visibility_timeout: float = 60.0,
+        dequeue_timeout: int = 5,
+        key_prefix: str = "mduck",
+        lane_weights: Mapping[str, int] | None = None,
+        coalesce_size: int = 5,
+        coalesce_ttl: float = 300.0,
+        dead_letter_size: int = 1000,
+    ) -> None:
+        """
+        Initialize the MessageQueueRepository.
+
+        Args:
+            redis: The Redis client.
+            visibility_timeout: Seconds after the last heartbeat when messages
+                of a consumer are considered abandoned and returned to the queue.
+            dequeue_timeout: Seconds to block waiting for a message.
+            key_prefix: The prefix for all queue keys.
+            lane_weights: The dequeue weight of every lane.
+            coalesce_size: The maximum number of buffered messages per chat.
+            coalesce_ttl: Seconds to keep the buffered messages of a chat.
+            dead_letter_size: The maximum number of kept dead letters.
+
+        """
+        super().__init__(
+            redis,
+            visibility_timeout=visibility_timeout,
+            dequeue_timeout=dequeue_timeout,
+            key_prefix=key_prefix,
+            lane_weights=lane_weights,
+            coalesce_size=coalesce_size,
+            coalesce_ttl=coalesce_ttl,
+            dead_letter_size=dead_letter_size,
+        )
+        self._queue_key_prefix = f"{key_prefix}:message_queue"
+        self._consumers_key = f"{key_prefix}:consumers"
+        self._processing_key_prefix = f"{key_prefix}:processing"
+        self._heartbeat_key_prefix = f"{key_prefix}:heartbeat"
+        self._enqueue_script = redis.register_script(ENQUEUE_SCRIPT)
+        self._dequeue_script = redis.register_script(DEQUEUE_SCRIPT)
+
+    def _lane_key(self, lane: QueueLane) -> str:
+        return f"{self._queue_key_prefix}:{lane.value}"
+
+    def _processing_key(self, consumer: str) -> str:
+        return f"{self._processing_key_prefix}:{consumer}"
+
+    def _heartbeat_key(self, consumer: str) -> str:
+        return f"{self._heartbeat_key_prefix}:{consumer}"
+
+    def _remove_in_flight(self, pipe: Pipeline, consumer: str, item: QueueItem) -> None:
+        pipe.lrem(self._processing_key(consumer), 1, item.raw)
+
+    async def heartbeat(self, consumer: str) -> None:
+        """Register the consumer and mark it as alive."""
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.sadd(self._consumers_key, consumer)
+            pipe.set(
+                self._heartbeat_key(consumer),
+                "1",
+                px=int(self._visibility_timeout * 1000),
+            )
+            await pipe.execute()
+
+    async def stats(self) -> dict[str, Any]:
+        """Return the lane lengths, retries and the number of queued chats."""
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for lane in QueueLane:
+                pipe.llen(self._lane_key(lane))
+            pipe.scard(self._chats_in_queue_key)
+            *lengths, chats = await pipe.execute()
+        lanes = {
+            lane.value: length for lane, length in zip(QueueLane, lengths, strict=True)
+        }
+        return {
+            "backend": "list",
+            "length": sum(lanes.values()),
+            "lanes": lanes,
+            "chats": chats,
+            **await self._retry_stats(),
+        }
+
+    async def keep_alive(self, consumer: str, item: QueueItem) -> None:
+        """Refresh the consumer heartbeat until cancelled."""
+        interval = self._visibility_timeout / 3
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.heartbeat(consumer)
+            except Exception as e:
+                logger.warning("Failed to send heartbeat for %s: %s", consumer, e)
+
+    async def _move_next(self, processing_key: str) -> str | None:
+        """Move the next message of the first non-empty lane into processing."""
+        lanes = weighted_lane_order(self._lane_weights)
+        raw: str | None = await self._dequeue_script(
+            keys=[processing_key, *(self._lane_key(lane) for lane in lanes)]
+        )
+        return raw
+
+    async def dequeue(self, consumer: str) -> QueueItem | None:
+        """
+        Move the next message from the lanes into the consumer processing list.
+
+        Due retries are moved to the lanes first. If all lanes are empty, the
+        consumer blocks on the enqueue signal list and then tries once more.
+
+        Args:
+            consumer: The unique consumer name.
+
+        Returns:
+            The queue item or None if no message arrived within the timeout.
+
+        """
+        await self.heartbeat(consumer)
+        await self.promote_retries()
+        processing_key = self._processing_key(consumer)
+        raw = await self._move_next(processing_key)
+        if raw is None:
+            if not await self._redis.brpop(  # type: ignore[misc]
+                [self._signal_key], timeout=self._dequeue_timeout
+            ):
+                return None
+            raw = await self._move_next(processing_key)
+            if raw is None:
+                return None
+        try:
+            message = QueueMessage.model_validate_json(raw)
+        except ValidationError as e:
+            logger.error("Dropping malformed queue message %r: %s", raw, e)
+            await self._redis.lrem(processing_key, 1, raw)  # type: ignore[misc]
+            return None
+        return QueueItem(raw=raw, message=message)
+
+    async def requeue(self, consumer: str) -> int:
+        """
+        Return all in-flight messages of the consumer back to their lanes.
+
+        Messages are pushed to the consumer side of the lanes, so they are
+        processed before anything queued after them.
+
+        Args:
+            consumer: The consumer name.
+
+        Returns:
+            The number of requeued messages.
+
+        """
+        processing_key = self._processing_key(consumer)
+        raw_messages: list[str] = await self._redis.lrange(processing_key, 0, -1)  # type: ignore[misc]
+        async with self._redis.pipeline(transaction=True) as pipe:
+            for raw in raw_messages:
+                pipe.rpush(self._lane_key(get_lane(raw)), raw)
+                pipe.lrem(processing_key, 1, raw)
+            pipe.srem(self._consumers_key, consumer)
+            pipe.delete(self._heartbeat_key(consumer))
+            await pipe.execute()
+        count = len(raw_messages)
+        if count:
+            logger.warning("Requeued %s messages of consumer %s.", count, consumer)
+        return count
+
+    async def reap(self) -> int:
+        """
+        Requeue messages of dead consumers and release orphaned chats.
+
+        A chat id without a queued, delayed or in-flight message would block
+        the chat forever, so such ids are removed from the queued chats set.
+
+        Returns:
+            The number of requeued messages.
+
+        """
+        consumers: set[str] = await self._redis.smembers(self._consumers_key)  # type: ignore[misc]
+        count = 0
+        alive = []
+        for consumer in consumers:
+            if await self._redis.exists(self._heartbeat_key(consumer)):
+                alive.append(consumer)
+            else:
+                count += await self.requeue(consumer)
+
+        keys = [
+            *(self._lane_key(lane) for lane in QueueLane),
+            *(self._processing_key(c) for c in alive),
+        ]
+        async with self._redis.pipeline(transaction=True) as pipe:
+            for key in keys:
+                pipe.lrange(key, 0, -1)
+            for lane in QueueLane:
+                pipe.zrange(self._retry_key(lane), 0, -1)
+            pipe.smembers(self._chats_in_queue_key)
+            *items, chats = await pipe.execute()
+
+        queued_chats = get_chat_ids(raw for key_items in items for raw in key_items)
+        orphaned = set(chats) - queued_chats
+        if orphaned:
+            logger.warning("Releasing orphaned chats from queue: %s", orphaned)
+            await self._redis.srem(self._chats_in_queue_key, *orphaned)  # type: ignore[misc]
+        return count
@@ -0,0 +1,157 @@
+import hashlib
+import logging
+import random
+import time
+
+from ollama import ChatResponse
+from pydantic import ValidationError
+from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+PUT_SCRIPT = """
+local key, index_key = KEYS[1], KEYS[2]
+local response, variants, ttl = ARGV[1], tonumber(ARGV[2]), tonumber(ARGV[3])
+local now, max_keys = tonumber(ARGV[4]), tonumber(ARGV[5])
+redis.call("LPUSH", key, response)
+redis.call("LTRIM", key, 0, variants - 1)
+redis.call("PEXPIRE", key, ttl)
+redis.call("ZADD", index_key, now, key)
+redis.call("ZREMRANGEBYSCORE", index_key, "-inf", now - ttl)
+local excess = redis.call("ZCARD", index_key) - max_keys
+if excess > 0 then
+    for _, evicted in ipairs(redis.call("ZPOPMIN", index_key, excess)) do
+        redis.call("DEL", evicted)
+    end
+end
+return excess
+"""
+
+
+def normalize_text(text: str) -> str:
+    """Return the text with the case and whitespace differences removed."""
+    return " ".join(text.casefold().split())
+
+
+class ResponseCacheRepository:
+    """
+    A cache of generated responses to short repeated messages.
+
+    Responses are keyed by the system prompt template, the model and the
+    normalized message text. Several variants are kept per key, and a key is
+    served only once all of its variants are generated, so cached replies do
+    not look canned. Keys expire after the TTL, and the least recently
+    written keys are evicted once the cache grows over the size limit.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        ttl: float = 86400.0,
+        variants: int = 3,
+        max_keys: int = 10000,
+        max_text_length: int = 100,
+        key_prefix: str = "mduck",
+    ) -> None:
+        """
+        Initialize the ResponseCacheRepository.
+
+        Args:
+            redis: The Redis client.
+            ttl: Seconds to keep the responses of a key since its last write.
+            variants: The number of responses kept per key.
+            max_keys: The maximum number of cached keys.
+            max_text_length: The maximum length of a cached message text,
+                longer messages rarely repeat.
+            key_prefix: The prefix for the cache keys.
+
+        """
+        if variants < 1:
+            raise ValueError(f"Cache variants must be positive, got {variants}")
+        self._redis = redis
+        self._ttl = ttl
+        self._variants = variants
+        self._max_keys = max_keys
+        self._max_text_length = max_text_length
+        self._key_prefix = f"{key_prefix}:response_cache"
+        self._index_key = f"{key_prefix}:response_cache_index"
+        self._stats_key = f"{key_prefix}:response_cache_stats"
+        self._put_script = redis.register_script(PUT_SCRIPT)
+
+    def _key(self, template: str, model: str, text: str) -> str | None:
+        """Return the cache key, or None if the text is not cacheable."""
+        text = normalize_text(text)
+        if not text or len(text) > self._max_text_length:
+            return None
+        digest = hashlib.sha256(f"{template}\0{model}\0{text}".encode()).hexdigest()
+        return f"{self._key_prefix}:{digest}"
+
+    async def get(self, template: str, model: str, text: str) -> ChatResponse | None:
+        """
+        Return a random cached response once all variants of the key are cached.
+
+        Args:
+            template: The system prompt template name.
+            model: The model name.
+            text: The user message text.
+
+        Returns:
+            The cached response or None on a miss.
+
+        """
+        key = self._key(template, model, text)
+        if key is None:
+            return None
+        raw_responses: list[str] = await self._redis.lrange(key, 0, -1)  # type: ignore[misc]
+        is_hit = len(raw_responses) >= self._variants
+        await self._redis.hincrby(self._stats_key, "hits" if is_hit else "misses")  # type: ignore[misc]
+        if not is_hit:
+            return None
+        raw = random.choice(raw_responses)
+        try:
+            return ChatResponse.model_validate_json(raw)
+        except ValidationError as e:
+            logger.error("Dropping malformed cached response %r: %s", raw, e)
+            await self._redis.lrem(key, 0, raw)  # type: ignore[misc]
+            return None
+
+    async def put(
+        self, template: str, model: str, text: str, response: ChatResponse
+    ) -> None:
+        """
+        Add the response as the newest variant of the key.
+
+        Args:
+            template: The system prompt template name.
+            model: The model name.
+            text: The user message text.
+            response: The generated response.
+
+        """
+        key = self._key(template, model, text)
+        if key is None:
+            return
+        evicted = await self._put_script(
+            keys=[key, self._index_key],
+            args=[
+                response.model_dump_json(),
+                self._variants,
+                int(self._ttl * 1000),
+                int(time.time() * 1000),
+                self._max_keys,
+            ],
+        )
+        if int(evicted) > 0:
+            logger.debug("Evicted %s cached responses.", evicted)
+
+    async def stats(self) -> dict[str, int]:
+        """Return the number of hits, misses and cached keys."""
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.hgetall(self._stats_key)
+            pipe.zcard(self._index_key)
+            counters, keys = await pipe.execute()
+        return {
+            "hits": int(counters.get("hits", 0)),
+            "misses": int(counters.get("misses", 0)),
+            "keys": keys,
+        }
@@ -0,0 +1,206 @@
+import asyncio
+import base64
+import logging
+import time
+from typing import Sequence
+
+import numpy as np
+from ollama import ChatResponse
+from pydantic import ValidationError
+from redis.asyncio import Redis
+
+from mduck.schemas.cache import SemanticCacheEntry
+
+logger = logging.getLogger(__name__)
+
+
+def encode_embedding(embedding: np.ndarray) -> str:
+    """Return the embedding as a base64 encoded float32 vector."""
+    return base64.b64encode(embedding.astype(np.float32).tobytes()).decode()
+
+
+def decode_embedding(encoded: str) -> np.ndarray:
+    """Return the base64 encoded float32 vector as an embedding."""
+    return np.frombuffer(base64.b64decode(encoded), dtype=np.float32)
+
+
+def normalize_embedding(embedding: Sequence[float] | np.ndarray) -> np.ndarray:
+    """Return the embedding scaled to the unit length."""
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SemanticCacheRepository:
+    """
+    A cache of responses to paraphrases of recent messages.
+
+    The embeddings of recent messages are kept as the rows of a unit length
+    matrix in memory, so a lookup is a single matrix product giving the
+    cosine similarity to every cached message. A response is reused if the
+    most similar message of the same template and model is above the
+    threshold. The entries are persisted to a bounded Redis list, loaded on
+    the first lookup and reloaded periodically to pick up the responses
+    cached by other replicas.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        threshold: float = 0.92,
+        size: int = 1000,
+        sync_interval: float = 60.0,
+        key_prefix: str = "mduck",
+    ) -> None:
+        """
+        Initialize the SemanticCacheRepository.
+
+        Args:
+            redis: The Redis client.
+            threshold: The minimum cosine similarity of a paraphrase.
+            size: The maximum number of cached entries.
+            sync_interval: Seconds between reloads of the entries from Redis.
+            key_prefix: The prefix for the cache keys.
+
+        """
+        if size < 1:
+            raise ValueError(f"Semantic cache size must be positive, got {size}")
+        self._redis = redis
+        self._threshold = threshold
+        self._size = size
+        self._sync_interval = sync_interval
+        self._key = f"{key_prefix}:semantic_cache"
+        self._stats_key = f"{key_prefix}:semantic_cache_stats"
+        self._lock = asyncio.Lock()
+        self._synced_at: float | None = None
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._namespaces = np.array([], dtype=object)
+        self._responses: list[ChatResponse] = []
+
+    @staticmethod
+    def _namespace(template: str, model: str) -> str:
+        return f"{template}\0{model}"
+
+    def _set_entries(self, entries: list[SemanticCacheEntry]) -> None:
+        """Replace the in-memory entries, skipping ones of another dimension."""
+        embeddings = [decode_embedding(entry.embedding) for entry in entries]
+        dimension = embeddings[0].shape[0] if embeddings else 0
+        kept = [
+            (entry, embedding)
+            for entry, embedding in zip(entries, embeddings, strict=True)
+            if embedding.shape[0] == dimension
+        ]
+        self._matrix = (
+            np.vstack([embedding for _entry, embedding in kept])
+            if kept
+            else np.zeros((0, dimension), dtype=np.float32)
+        )
+        self._namespaces = np.array(
+            [self._namespace(entry.template, entry.model) for entry, _ in kept],
+            dtype=object,
+        )
+        self._responses = [entry.response for entry, _embedding in kept]
+
+    async def _sync(self) -> None:
+        """Reload the entries from Redis once the sync interval passes."""
+        async with self._lock:
+            now = time.monotonic()
+            if (
+                self._synced_at is not None
+                and now - self._synced_at < self._sync_interval
+            ):
+                return
+            raw_entries: list[str] = await self._redis.lrange(  # type: ignore[misc]
+                self._key, 0, self._size - 1
+            )
+            entries = []
+            for raw in raw_entries:
+                try:
+                    entries.append(SemanticCacheEntry.model_validate_json(raw))
+                except ValidationError as e:
+                    logger.error("Skipping malformed semantic cache entry: %s", e)
+            self._set_entries(entries)
+            self._synced_at = now
+
+    async def get(
+        self, template: str, model: str, embedding: Sequence[float]
+    ) -> ChatResponse | None:
+        """
+        Return the response to the most similar cached message.
+
+        Args:
+            template: The system prompt template name.
+            model: The model name.
+            embedding: The embedding of the user message.
+
+        Returns:
+            The cached response or None if no message is similar enough.
+
+        """
+        await self._sync()
+        query = normalize_embedding(embedding)
+        response = None
+        if len(self._responses) and self._matrix.shape[1] == query.shape[0]:
+            similarity = self._matrix @ query
+            similarity[self._namespaces != self._namespace(template, model)] = -1
+            best = int(np.argmax(similarity))
+            if similarity[best] >= self._threshold:
+                response = self._responses[best]
+        await self._redis.hincrby(  # type: ignore[misc]
+            self._stats_key, "misses" if response is None else "hits"
+        )
+        return response
+
+    async def put(
+        self,
+        template: str,
+        model: str,
+        embedding: Sequence[float],
+        response: ChatResponse,
+    ) -> None:
+        """
+        Add the response to the message with the embedding.
+
+        Args:
+            template: The system prompt template name.
+            model: The model name.
+            embedding: The embedding of the user message.
+            response: The generated response.
+
+        """
+        vector = normalize_embedding(embedding)
+        entry = SemanticCacheEntry(
+            template=template,
+            model=model,
+            embedding=encode_embedding(vector),
+            response=response,
+        )
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.lpush(self._key, entry.model_dump_json())
+            pipe.ltrim(self._key, 0, self._size - 1)
+            await pipe.execute()
+
+        if self._matrix.shape[1] != vector.shape[0]:
+            # The embedding model has changed, the old entries are useless
+            self._set_entries([entry])
+            return
+        self._matrix = np.vstack([vector, self._matrix])[: self._size]
+        self._namespaces = np.concatenate(
+            [
+                np.array([self._namespace(template, model)], dtype=object),
+                self._namespaces,
+            ]
+        )[: self._size]
+        self._responses = [response, *self._responses][: self._size]
+
+    async def stats(self) -> dict[str, int]:
+        """Return the number of hits, misses and cached entries."""
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.hgetall(self._stats_key)
+            pipe.llen(self._key)
+            counters, size = await pipe.execute()
+        return {
+            "hits": int(counters.get("hits", 0)),
+            "misses": int(counters.get("misses", 0)),
+            "size": size,
+        }
@@ -0,0 +1,337 @@
+import asyncio
+import logging
+from typing import Any, Mapping
+
+from pydantic import ValidationError
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+from redis.exceptions import ResponseError
+
+from mduck.repositories.queue import (
+    COALESCE_SCRIPT_PART,
+    BaseQueueRepository,
+    get_chat_ids,
+    weighted_lane_order,
+)
+from mduck.schemas.queue import QueueItem, QueueLane, QueueMessage
+
+logger = logging.getLogger(__name__)
+
+STREAM_ENQUEUE_SCRIPT = (
+    COALESCE_SCRIPT_PART
+    + """
+local stream_key, signal_key = KEYS[3], KEYS[4]
+local message, max_size = ARGV[5], tonumber(ARGV[6])
+if redis.call("XLEN", stream_key) >= max_size then
+    return 2
+end
+redis.call("XADD", stream_key, "*", "payload", message)
+redis.call("SADD", chats_key, chat_id)
+redis.call("LPUSH", signal_key, 1)
+redis.call("LTRIM", signal_key, 0, tonumber(ARGV[7]) - 1)
+return 0
+"""
+)
+
+STREAM_DEQUEUE_SCRIPT = """
+local group, consumer, min_idle = ARGV[1], ARGV[2], ARGV[3]
+for i = 1, #KEYS do
+    local claimed = redis.call(
+        "XAUTOCLAIM", KEYS[i], group, consumer, min_idle, "0-0", "COUNT", 1
+    )
+    local entry = claimed[2][1]
+    if entry then
+        return {i, entry[1], entry[2], 1}
+    end
+end
+for i = 1, #KEYS do
+    local response = redis.call(
+        "XREADGROUP", "GROUP", group, consumer, "COUNT", 1, "STREAMS", KEYS[i], ">"
+    )
+    if response then
+        local entry = response[1][2][1]
+        return {i, entry[1], entry[2], 0}
+    end
+end
+return false
+"""
+
+
+class StreamQueueRepository(BaseQueueRepository):
+    """
+    A message queue on top of Redis streams with a consumer group.
+
+    Messages are queued into one stream per priority lane. Every replica reads
+    the streams as a member of the same consumer group, so each message is
+    delivered to exactly one consumer at a time. Lanes are polled in a weighted
+    random order, so higher priority lanes are served first most of the time
+    while lower priority lanes never starve. Delivered but not acknowledged
+    entries stay in the group pending list; once an entry stays idle longer
+    than the visibility timeout it is claimed by the next consumer asking for
+    work. Delivery is at-least-once.
+    """
+
+    _promote_mode = "stream"
+
+    def __init__(
+        self,
+        redis: Redis,
+        visibility_timeout: float = 60.0,
+        dequeue_timeout: int = 5,
+        key_prefix: str = "mduck",
+        group: str = "mduck",
+        lane_weights: Mapping[str, int] | None = None,
+        coalesce_size: int = 5,
+        coalesce_ttl: float = 300.0,
+        dead_letter_size: int = 1000,
+    ) -> None:
+        """
+        Initialize the StreamQueueRepository.
+
+        Args:
+            redis: The Redis client.
+            visibility_timeout: Seconds of inactivity after which an in-flight
+                message is considered abandoned and claimed by another consumer.
+            dequeue_timeout: Seconds to block waiting for a message.
+            key_prefix: The prefix for all queue keys.
+            group: The consumer group name.
+            lane_weights: The dequeue weight of every lane.
+            coalesce_size: The maximum number of buffered messages per chat.
+            coalesce_ttl: Seconds to keep the buffered messages of a chat.
+            dead_letter_size: The maximum number of kept dead letters.
+
+        """
+        super().__init__(
+            redis,
+            visibility_timeout=visibility_timeout,
+            dequeue_timeout=dequeue_timeout,
+            key_prefix=key_prefix,
+            lane_weights=lane_weights,
+            coalesce_size=coalesce_size,
+            coalesce_ttl=coalesce_ttl,
+            dead_letter_size=dead_letter_size,
+        )
+        self._stream_key_prefix = f"{key_prefix}:message_stream"
+        self._group = group
+        self._is_group_created = False
+        self._enqueue_script = redis.register_script(STREAM_ENQUEUE_SCRIPT)
+        self._dequeue_script = redis.register_script(STREAM_DEQUEUE_SCRIPT)
+
+    def _lane_key(self, lane: QueueLane) -> str:
+        return f"{self._stream_key_prefix}:{lane.value}"
+
+    def _remove_in_flight(self, pipe: Pipeline, consumer: str, item: QueueItem) -> None:
+        assert item.entry_id is not None
+        stream_key = self._lane_key(item.message.lane)
+        pipe.xack(stream_key, self._group, item.entry_id)
+        pipe.xdel(stream_key, item.entry_id)
+
+    async def _ensure_group(self) -> None:
+        """Create the consumer group on every lane stream unless it exists."""
+        if self._is_group_created:
+            return
+        for lane in QueueLane:
+            stream_key = self._lane_key(lane)
+            try:
+                await self._redis.xgroup_create(
+                    stream_key, self._group, id="0", mkstream=True
+                )
+                logger.info(
+                    "Consumer group %s created for %s.", self._group, stream_key
+                )
+            except ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+        self._is_group_created = True
+
+    async def stats(self) -> dict[str, Any]:
+        """Return the lane lengths, consumer group lag, pending entries and retries."""
+        await self._ensure_group()
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for lane in QueueLane:
+                pipe.xlen(self._lane_key(lane))
+                pipe.xinfo_groups(self._lane_key(lane))
+            pipe.scard(self._chats_in_queue_key)
+            *results, chats = await pipe.execute()
+
+        lanes: dict[str, dict[str, Any]] = {}
+        for lane, length, groups in zip(
+            QueueLane, results[::2], results[1::2], strict=True
+        ):
+            group: dict[str, Any] = next(
+                (g for g in groups if g["name"] == self._group), {}
+            )
+            lanes[lane.value] = {
+                "length": length,
+                "lag": group.get("lag"),
+                "pending": group.get("pending"),
+                "consumers": group.get("consumers"),
+            }
+        return {
+            "backend": "stream",
+            "length": sum(lane["length"] for lane in lanes.values()),
+            "pending": sum(lane["pending"] or 0 for lane in lanes.values()),
+            "lanes": lanes,
+            "chats": chats,
+            **await self._retry_stats(),
+        }
+
+    async def _read_next(self, consumer: str) -> tuple[QueueLane, str, str] | None:
+        """Claim an abandoned entry or read a new one from the lane streams."""
+        lanes = weighted_lane_order(self._lane_weights)
+        result = await self._dequeue_script(
+            keys=[self._lane_key(lane) for lane in lanes],
+            args=[self._group, consumer, int(self._visibility_timeout * 1000)],
+        )
+        if not result:
+            return None
+        index, entry_id, fields, is_claimed = result
+        if is_claimed:
+            logger.warning("Claimed abandoned message %s.", entry_id)
+        values = dict(zip(fields[::2], fields[1::2], strict=True))
+        return lanes[int(index) - 1], entry_id, values.get("payload", "")
+
+    async def dequeue(self, consumer: str) -> QueueItem | None:
+        """
+        Take the next message for the consumer.
+
+        Due retries are added to the lanes first, then abandoned entries of
+        other consumers are claimed and new entries are read. If all lanes are
+        empty, the consumer blocks on the enqueue signal list and then tries
+        once more.
+
+        Args:
+            consumer: The unique consumer name.
+
+        Returns:
+            The queue item or None if no message arrived within the timeout.
+
+        """
+        await self._ensure_group()
+        await self.promote_retries()
+        entry = await self._read_next(consumer)
+        if entry is None:
+            if not await self._redis.brpop(  # type: ignore[misc]
+                [self._signal_key], timeout=self._dequeue_timeout
+            ):
+                return None
+            entry = await self._read_next(consumer)
+            if entry is None:
+                return None
+
+        lane, entry_id, raw = entry
+        try:
+            message = QueueMessage.model_validate_json(raw)
+        except ValidationError as e:
+            logger.error("Dropping malformed queue message %r: %s", raw, e)
+            async with self._redis.pipeline(transaction=True) as pipe:
+                pipe.xack(self._lane_key(lane), self._group, entry_id)
+                pipe.xdel(self._lane_key(lane), entry_id)
+                await pipe.execute()
+            return None
+        # The entry is acknowledged in the stream it was read from.
+        message.lane = lane
+        return QueueItem(raw=raw, message=message, entry_id=entry_id)
+
+    async def keep_alive(self, consumer: str, item: QueueItem) -> None:
+        """Reset the idle time of the in-flight entry until cancelled."""
+        assert item.entry_id is not None
+        interval = self._visibility_timeout / 3
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self._redis.xclaim(
+                    self._lane_key(item.message.lane),
+                    self._group,
+                    consumer,
+                    min_idle_time=0,
+                    message_ids=[item.entry_id],
+                    justid=True,
+                )
+            except Exception as e:
+                logger.warning("Failed to send heartbeat for %s: %s", consumer, e)
+
+    async def requeue(self, consumer: str) -> int:
+        """
+        Return all pending entries of the consumer back to their lane streams.
+
+        Entries are re-added as new ones, so they are delivered right away
+        instead of waiting for the visibility timeout.
+
+        Args:
+            consumer: The consumer name.
+
+        Returns:
+            The number of requeued messages.
+
+        """
+        await self._ensure_group()
+        count = 0
+        for lane in QueueLane:
+            stream_key = self._lane_key(lane)
+            pending = await self._redis.xpending_range(
+                stream_key,
+                self._group,
+                min="-",
+                max="+",
+                count=1000,
+                consumername=consumer,
+            )
+            for entry in pending:
+                entry_id = entry["message_id"]
+                for _id, fields in await self._redis.xrange(
+                    stream_key, entry_id, entry_id
+                ):
+                    async with self._redis.pipeline(transaction=True) as pipe:
+                        pipe.xadd(stream_key, fields)
+                        pipe.xack(stream_key, self._group, entry_id)
+                        pipe.xdel(stream_key, entry_id)
+                        await pipe.execute()
+                    count += 1
+            await self._redis.xgroup_delconsumer(stream_key, self._group, consumer)
+        if count:
+            logger.warning("Requeued %s messages of consumer %s.", count, consumer)
+        return count
+
+    async def reap(self) -> int:
+        """
+        Remove stale consumers and release orphaned chats.
+
+        Abandoned entries are claimed by the consumers themselves, so nothing
+        is requeued here.
+
+        Returns:
+            Always 0.
+
+        """
+        await self._ensure_group()
+        for lane in QueueLane:
+            stream_key = self._lane_key(lane)
+            consumers = await self._redis.xinfo_consumers(stream_key, self._group)
+            for consumer in consumers:
+                idle_seconds = consumer["idle"] / 1000
+                if not consumer["pending"] and idle_seconds > self._visibility_timeout:
+                    await self._redis.xgroup_delconsumer(
+                        stream_key, self._group, consumer["name"]
+                    )
+                    logger.debug("Stale consumer %s removed.", consumer["name"])
+
+        async with self._redis.pipeline(transaction=True) as pipe:
+            for lane in QueueLane:
+                pipe.xrange(self._lane_key(lane))
+            for lane in QueueLane:
+                pipe.zrange(self._retry_key(lane), 0, -1)
+            pipe.smembers(self._chats_in_queue_key)
+            *results, chats = await pipe.execute()
+
+        entries, retries = results[: len(QueueLane)], results[len(QueueLane) :]
+        queued_chats = get_chat_ids(
+            fields.get("payload", "")
+            for lane_entries in entries
+            for _id, fields in lane_entries
+        ) | get_chat_ids(raw for lane_retries in retries for raw in lane_retries)
+        orphaned = set(chats) - queued_chats
+        if orphaned:
+            logger.warning("Releasing orphaned chats from queue: %s", orphaned)
+            await self._redis.srem(self._chats_in_queue_key, *orphaned)  # type: ignore[misc]
+        return 0
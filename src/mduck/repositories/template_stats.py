@@ -0,0 +1,98 @@
+import logging
+from statistics import fmean
+
+from ollama import ChatResponse
+from redis.asyncio import Redis
+
+from mduck.schemas.templates import TemplateStats
+
+logger = logging.getLogger(__name__)
+
+FAILURE_SAMPLE = "-"
+
+
+class TemplateStatsRepository:
+    """
+    Rolling generation statistics of the system prompt templates in Redis.
+
+    Every generation adds a compact sample to the list of its template: the
+    prompt tokens, the output tokens and the total duration, or a failure
+    mark. Only the latest samples are kept, so the statistics follow the
+    current model and hardware, and every replica sees the same ones.
+    """
+
+    def __init__(
+        self, redis: Redis, window: int = 100, key_prefix: str = "mduck"
+    ) -> None:
+        """
+        Initialize the TemplateStatsRepository.
+
+        Args:
+            redis: The Redis client.
+            window: The number of latest samples kept per template.
+            key_prefix: The prefix for the statistics keys.
+
+        """
+        if window < 1:
+            raise ValueError(f"Stats window must be positive, got {window}")
+        self._redis = redis
+        self._window = window
+        self._key_prefix = f"{key_prefix}:template_stats"
+        self._index_key = f"{key_prefix}:template_stats_index"
+
+    async def record(self, template: str, response: ChatResponse | None) -> None:
+        """
+        Add a generation sample of the template.
+
+        Args:
+            template: The system prompt template name.
+            response: The generated response, None if the generation failed.
+
+        """
+        if response is None:
+            sample = FAILURE_SAMPLE
+        else:
+            sample = (
+                f"{response.prompt_eval_count or 0} {response.eval_count or 0} "
+                f"{(response.total_duration or 0) / 1e9:.3f}"
+            )
+        key = f"{self._key_prefix}:{template}"
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.sadd(self._index_key, template)
+            pipe.lpush(key, sample)
+            pipe.ltrim(key, 0, self._window - 1)
+            await pipe.execute()
+
+    @staticmethod
+    def _parse(template: str, samples: list[str]) -> TemplateStats:
+        """Aggregate the raw samples of the template."""
+        stats = TemplateStats(template=template, samples=len(samples))
+        rows = []
+        for sample in samples:
+            if sample == FAILURE_SAMPLE:
+                stats.failures += 1
+                continue
+            try:
+                prompt_tokens, eval_count, duration = sample.split()
+                rows.append((int(prompt_tokens), int(eval_count), float(duration)))
+            except ValueError:
+                logger.warning("Skipping malformed %s sample %r", template, sample)
+                stats.samples -= 1
+        if rows:
+            stats.prompt_tokens = fmean(row[0] for row in rows)
+            stats.eval_count = fmean(row[1] for row in rows)
+            stats.duration = fmean(row[2] for row in rows)
+        return stats
+
+    async def get_all(self) -> dict[str, TemplateStats]:
+        """Return the statistics of every template with samples, by name."""
+        templates = sorted(await self._redis.smembers(self._index_key))  # type: ignore[misc]
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for template in templates:
+                pipe.lrange(f"{self._key_prefix}:{template}", 0, -1)
+            samples = await pipe.execute()
+        return {
+            template: self._parse(template, template_samples)
+            for template, template_samples in zip(templates, samples, strict=True)
+            if template_samples
+        }
@@ -0,0 +1,97 @@
+import logging
+from collections import OrderedDict
+
+from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateDedupRepository:
+    """
+    Deduplication of incoming Telegram updates by the update id.
+
+    Telegram redelivers a webhook update when the response is slow, so the
+    same update may arrive twice, possibly at different replicas. The first
+    delivery claims the update id with a short-lived Redis key, later ones
+    are rejected. Recently claimed ids are remembered in a small in-process
+    LRU cache, so redeliveries to the same replica never reach Redis. An
+    update failing to be handled is released, so its redelivery is retried.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        ttl: float = 3600.0,
+        cache_size: int = 10000,
+        key_prefix: str = "mduck",
+    ) -> None:
+        """
+        Initialize the UpdateDedupRepository.
+
+        Args:
+            redis: The Redis client.
+            ttl: Seconds to remember a claimed update id.
+            cache_size: The number of update ids remembered in process,
+                0 disables the cache.
+            key_prefix: The prefix for the update keys.
+
+        """
+        if cache_size < 0:
+            raise ValueError(f"Cache size must not be negative, got {cache_size}")
+        self._redis = redis
+        self._ttl = ttl
+        self._cache_size = cache_size
+        self._cache: OrderedDict[int, None] = OrderedDict()
+        self._key_prefix = f"{key_prefix}:update"
+
+    def _remember(self, update_id: int) -> None:
+        if not self._cache_size:
+            return
+        self._cache[update_id] = None
+        self._cache.move_to_end(update_id)
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+    async def claim(self, update_id: int) -> bool:
+        """
+        Claim the update for processing.
+
+        If Redis is unavailable the update is processed, a rare duplicate
+        reply is better than a lost one.
+
+        Args:
+            update_id: The Telegram update id.
+
+        Returns:
+            True if the update is seen for the first time, False otherwise.
+
+        """
+        if update_id in self._cache:
+            self._cache.move_to_end(update_id)
+            return False
+        try:
+            is_claimed = await self._redis.set(
+                f"{self._key_prefix}:{update_id}",
+                "1",
+                nx=True,
+                px=int(self._ttl * 1000),
+            )
+        except Exception as e:
+            logger.warning("Failed to claim update %s: %s", update_id, e)
+            return True
+        self._remember(update_id)
+        return bool(is_claimed)
+
+    async def release(self, update_id: int) -> None:
+        """
+        Release the claimed update, so its redelivery is handled again.
+
+        Args:
+            update_id: The Telegram update id.
+
+        """
+        self._cache.pop(update_id, None)
+        try:
+            await self._redis.delete(f"{self._key_prefix}:{update_id}")
+        except Exception as e:
+            logger.warning("Failed to release update %s: %s", update_id, e)
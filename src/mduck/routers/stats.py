@@ -0,0 +1,61 @@
+from typing import Annotated, Any
+
+from dependency_injector.wiring import Provide, inject
+from fastapi import APIRouter, Depends
+
+from mduck.repositories.circuit_breaker import CircuitBreaker
+from mduck.repositories.ollama import OllamaRepository
+from mduck.repositories.ollama_pool import OllamaHostPool
+from mduck.repositories.queue import QueueRepository
+from mduck.repositories.response_cache import ResponseCacheRepository
+from mduck.repositories.semantic_cache import SemanticCacheRepository
+from mduck.repositories.template_stats import TemplateStatsRepository
+from mduck.services.admission import AdmissionController
+
+router = APIRouter(prefix="/stats", tags=["stats"])
+
+
+@router.get("")
+@inject
+async def stats(
+    queue: Annotated[QueueRepository, Depends(Provide["gateways.queue"])],
+    admission: Annotated[AdmissionController, Depends(Provide["admission"])],
+    response_cache: Annotated[
+        ResponseCacheRepository, Depends(Provide["gateways.response_cache"])
+    ],
+    semantic_cache: Annotated[
+        SemanticCacheRepository, Depends(Provide["gateways.semantic_cache"])
+    ],
+    ollama_pool: Annotated[OllamaHostPool, Depends(Provide["gateways.ollama_pool"])],
+    ollama: Annotated[OllamaRepository, Depends(Provide["gateways.ollama"])],
+    circuit_breaker: Annotated[
+        CircuitBreaker, Depends(Provide["gateways.circuit_breaker"])
+    ],
+) -> dict[str, Any]:
+    """Return the queue, admission controller, cache and Ollama host statistics."""
+    return {
+        "queue": await queue.stats(),
+        "admission": (await admission.refresh()).model_dump(mode="json"),
+        "response_cache": await response_cache.stats(),
+        "semantic_cache": await semantic_cache.stats(),
+        "ollama": ollama_pool.stats(),
+        "circuit_breaker": (await circuit_breaker.get_state()).value,
+        "models": {
+            model: stats.model_dump() for model, stats in ollama.model_stats().items()
+        },
+        "prefix_cache": {
+            template: stats.model_dump()
+            for template, stats in ollama.prefix_stats().items()
+        },
+    }
+
+
+@router.get("/templates")
+@inject
+async def template_stats(
+    template_stats: Annotated[
+        TemplateStatsRepository, Depends(Provide["gateways.template_stats"])
+    ],
+) -> list[dict[str, Any]]:
+    """Return the rolling generation statistics of every prompt template."""
+    return [stats.model_dump() for stats in (await template_stats.get_all()).values()]
@@ -1,3 +1,4 @@
+import logging
 from http import HTTPStatus
 from typing import Annotated, Any
 
@@ -5,6 +6,10 @@ import aiogram
 from dependency_injector.wiring import Provide, inject
 from fastapi import APIRouter, Depends, Header, HTTPException
 
+from mduck.repositories.updates import UpdateDedupRepository
+
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/webhook", tags=["webhook"])
 
 
@@ -17,6 +22,7 @@ async def webhook(
     bot: Annotated[aiogram.Bot, Depends(Provide["gateways.bot"])],
     key: Annotated[str, Depends(Provide["config.tg.webhook.key"])],
     secret: Annotated[str, Depends(Provide["config.tg.webhook.secret"])],
+    dedup: Annotated[UpdateDedupRepository, Depends(Provide["gateways.update_dedup"])],
     x_telegram_bot_api_secret_token: Annotated[str | None, Header()] = None,
 ) -> dict[str, str]:
     """Return a healthcheck."""
@@ -24,5 +30,16 @@ async def webhook(
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND)
     if x_telegram_bot_api_secret_token != secret:
         raise HTTPException(status_code=HTTPStatus.UNAUTHORIZED)
-    await dp.feed_webhook_update(bot, update)
+    # Redelivered updates are acknowledged without parsing or handling them
+    update_id = update.get("update_id")
+    if isinstance(update_id, int) and not await dedup.claim(update_id):
+        logger.info("Dropping duplicate update %s.", update_id)
+        return {"status": "duplicate", "path": str(key), "secret": str(secret)}
+    try:
+        await dp.feed_webhook_update(bot, update)
+    except Exception:
+        # Telegram redelivers a failed update, which must not be a duplicate
+        if isinstance(update_id, int):
+            await dedup.release(update_id)
+        raise
     return {"status": "ok", "path": str(key), "secret": str(secret)}
@@ -0,0 +1,28 @@
+import enum
+
+from pydantic import BaseModel, Field
+
+
+class AdmissionDecision(str, enum.Enum):
+    """Admission controller decision enum."""
+
+    ADMIT = "admit"
+    SCALE = "scale"
+    SHED = "shed"
+
+
+class AdmissionState(BaseModel):
+    """The admission controller state and its decisions so far."""
+
+    target_wait: float | None
+    concurrency: int
+    samples: int = 0
+    mean_latency: float | None = None
+    queue_size: int = 0
+    expected_wait: float | None = None
+    factor: float = 1.0
+    decision: AdmissionDecision = AdmissionDecision.ADMIT
+    updated_at: float | None = None
+    decisions: dict[AdmissionDecision, int] = Field(
+        default_factory=lambda: dict.fromkeys(AdmissionDecision, 0)
+    )
@@ -0,0 +1,21 @@
+import enum
+
+from ollama import ChatResponse
+from pydantic import BaseModel
+
+
+class ResponseCachePolicy(str, enum.Enum):
+    """When cached responses are served instead of generating new ones."""
+
+    OFF = "off"
+    ALWAYS = "always"
+    LOAD = "load"
+
+
+class SemanticCacheEntry(BaseModel):
+    """A cached response along with the embedding of its message."""
+
+    template: str
+    model: str
+    embedding: str  # Base64 encoded float32 vector
+    response: ChatResponse
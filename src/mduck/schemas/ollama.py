@@ -0,0 +1,89 @@
+import enum
+from typing import Literal
+
+from pydantic import BaseModel, ConfigDict, computed_field
+
+
+class ModelStats(BaseModel):
+    """The recent generation speed of a model and the number of its replies."""
+
+    requests: int = 0
+    tps: float | None = None
+    eval_count: float | None = None
+
+    @property
+    def expected_duration(self) -> float | None:
+        """Return the seconds a typical reply takes to generate, if known."""
+        if not self.tps or self.eval_count is None:
+            return None
+        return self.eval_count / self.tps
+
+
+class CircuitState(str, enum.Enum):
+    """Circuit breaker state enum."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class Prompt(BaseModel):
+    """A version of a system prompt template."""
+
+    model_config = ConfigDict(frozen=True)
+
+    name: str
+    text: str
+    version: str
+
+    @property
+    def key(self) -> str:
+        """Return the template name along with the version."""
+        return f"{self.name}@{self.version}"
+
+
+class Turn(BaseModel):
+    """A message of a chat conversation with the model."""
+
+    role: Literal["user", "assistant"]
+    content: str
+
+
+class PrefixStats(BaseModel):
+    """
+    The prompt evaluation of the generations by the cached prefix state.
+
+    A generation is warm if the previous one on its host had the same system
+    prompt, so Ollama could reuse the cached prefix, and cold otherwise. The
+    savings are the warm generations times the difference of the average
+    cold and warm prompt evaluation.
+    """
+
+    warm_requests: int = 0
+    cold_requests: int = 0
+    warm_prompt_tokens: int = 0
+    cold_prompt_tokens: int = 0
+    warm_prompt_eval_duration: float = 0.0
+    cold_prompt_eval_duration: float = 0.0
+
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def saved_tokens(self) -> float | None:
+        """Return the prompt tokens not evaluated thanks to the cached prefix."""
+        if not self.warm_requests or not self.cold_requests:
+            return None
+        return self.warm_requests * (
+            self.cold_prompt_tokens / self.cold_requests
+            - self.warm_prompt_tokens / self.warm_requests
+        )
+
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def saved_duration(self) -> float | None:
+        """Return the prompt evaluation seconds saved by the cached prefix."""
+        if not self.warm_requests or not self.cold_requests:
+            return None
+        return self.warm_requests * (
+            self.cold_prompt_eval_duration / self.cold_requests
+            - self.warm_prompt_eval_duration / self.warm_requests
+        )
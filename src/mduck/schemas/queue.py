@@ -1,8 +1,19 @@
+import enum
+import time
+
 from pydantic import BaseModel, Field
 
 from mduck.log import chat_id_var, update_id_var, user_id_var
 
 
+class QueueLane(str, enum.Enum):
+    """Queue priority lane enum."""
+
+    DIRECT = "direct"
+    PRIVATE = "private"
+    GROUP = "group"
+
+
 class MessagePayload(BaseModel):
     """The essential fields from an aiogram Message object for queueing."""
 
@@ -43,3 +54,23 @@ class QueueMessage(BaseModel):
 
     message: MessagePayload
     context: QueueContext = Field(default_factory=QueueContext.from_contextvars)
+    lane: QueueLane = QueueLane.GROUP
+    enqueued_at: float = Field(default_factory=time.time)
+    attempts: int = 0
+    coalesced: list[MessagePayload] = Field(default_factory=list)
+
+
+class QueueItem(BaseModel):
+    """A message taken from the queue along with its raw representation."""
+
+    raw: str
+    message: QueueMessage
+    entry_id: str | None = None
+
+
+class DeadLetter(BaseModel):
+    """A message failed permanently along with the failure reason."""
+
+    message: QueueMessage
+    error: str
+    failed_at: float = Field(default_factory=time.time)
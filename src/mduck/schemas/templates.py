@@ -0,0 +1,18 @@
+from pydantic import BaseModel, computed_field
+
+
+class TemplateStats(BaseModel):
+    """The rolling generation statistics of a system prompt template."""
+
+    template: str
+    samples: int = 0
+    failures: int = 0
+    prompt_tokens: float | None = None
+    eval_count: float | None = None
+    duration: float | None = None
+
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def failure_rate(self) -> float:
+        """Return the share of failed generations."""
+        return self.failures / self.samples if self.samples else 0.0
@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import time
+
+from ollama import ChatResponse
+
+from mduck.repositories.latency import LatencyRepository
+from mduck.repositories.queue import QueueRepository
+from mduck.schemas.admission import AdmissionDecision, AdmissionState
+from mduck.schemas.queue import QueueLane
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionController:
+    """
+    A load-adaptive admission controller.
+
+    The controller estimates the queue wait from the number of queued chats
+    and the rolling generation latency. While the expected wait is below the
+    target, response probabilities are kept as is. Above the target, they are
+    scaled down proportionally, and once the expected wait exceeds the target
+    by the shed ratio, random picks are not admitted at all. Messages
+    addressing the bot directly are always admitted. Without a target wait
+    the controller only tracks the load.
+    """
+
+    def __init__(
+        self,
+        queue: QueueRepository,
+        latency: LatencyRepository,
+        target_wait: float | None = 60.0,
+        shed_ratio: float = 2.0,
+        concurrency: int = 1,
+        refresh_interval: float = 5.0,
+    ) -> None:
+        """
+        Initialize the AdmissionController.
+
+        Args:
+            queue: The message queue repository.
+            latency: The generation latency repository.
+            target_wait: Seconds a queued message is expected to wait at most,
+                None disables the admission control.
+            shed_ratio: The expected to target wait ratio to shed load at.
+            concurrency: The number of messages processed at the same time
+                by all workers.
+            refresh_interval: Seconds to cache the load estimate for.
+
+        """
+        if target_wait is not None and target_wait <= 0:
+            raise ValueError(f"Target wait must be positive, got {target_wait}")
+        if shed_ratio < 1:
+            raise ValueError(f"Shed ratio must be at least 1, got {shed_ratio}")
+        self._queue = queue
+        self._latency = latency
+        self._target_wait = target_wait
+        self._shed_ratio = shed_ratio
+        self._concurrency = max(concurrency, 1)
+        self._refresh_interval = refresh_interval
+        self._lock = asyncio.Lock()
+        self._state = AdmissionState(
+            target_wait=target_wait, concurrency=self._concurrency
+        )
+
+    @property
+    def state(self) -> AdmissionState:
+        """Return a copy of the last computed state."""
+        return self._state.model_copy(deep=True)
+
+    async def record(self, response: ChatResponse) -> None:
+        """Record the generation latency of an Ollama response."""
+        if not response.total_duration:
+            return
+        try:
+            await self._latency.record(response.total_duration / 1e9)
+        except Exception as e:
+            logger.warning("Failed to record generation latency: %s", e)
+
+    async def refresh(self, force: bool = False) -> AdmissionState:
+        """
+        Recompute the expected wait unless the cached one is fresh.
+
+        Args:
+            force: Recompute even if the cached state is fresh.
+
+        Returns:
+            The current state.
+
+        """
+        async with self._lock:
+            state = self._state
+            now = time.monotonic()
+            if (
+                not force
+                and state.updated_at is not None
+                and now - state.updated_at < self._refresh_interval
+            ):
+                return self.state
+
+            latencies = await self._latency.get_latest()
+            state.queue_size = await self._queue.size()
+            state.samples = len(latencies)
+            state.updated_at = now
+            if not latencies:
+                state.mean_latency = state.expected_wait = None
+                state.factor = 1.0
+                state.decision = AdmissionDecision.ADMIT
+                return self.state
+
+            state.mean_latency = sum(latencies) / len(latencies)
+            state.expected_wait = (
+                state.queue_size * state.mean_latency / self._concurrency
+            )
+            if self._target_wait is None:
+                return self.state
+
+            ratio = state.expected_wait / self._target_wait
+            previous = state.decision
+            if ratio >= self._shed_ratio:
+                state.factor = 0.0
+                state.decision = AdmissionDecision.SHED
+            elif ratio > 1:
+                state.factor = 1 / ratio
+                state.decision = AdmissionDecision.SCALE
+            else:
+                state.factor = 1.0
+                state.decision = AdmissionDecision.ADMIT
+            if state.decision != previous:
+                logger.info(
+                    "Admission changed to %s: expected wait %.1f sec, "
+                    "target %.1f sec, probability factor %.2f.",
+                    state.decision.value,
+                    state.expected_wait,
+                    self._target_wait,
+                    state.factor,
+                )
+            return self.state
+
+    async def scale_probability(self, lane: QueueLane, probability: float) -> float:
+        """
+        Return the effective response probability under the current load.
+
+        Args:
+            lane: The queue lane of the message.
+            probability: The configured response probability.
+
+        Returns:
+            The effective response probability.
+
+        """
+        if lane == QueueLane.DIRECT:
+            return probability
+        try:
+            state = await self.refresh()
+        except Exception as e:
+            logger.warning("Failed to estimate the queue wait: %s", e)
+            return probability
+        self._state.decisions[state.decision] += 1
+        return probability * state.factor
@@ -0,0 +1,201 @@
+import math
+from collections import deque
+
+from mduck.schemas.ollama import Turn
+
+# Ollama does not expose its tokenizer, a token is about 4 characters of text
+CHARS_PER_TOKEN = 4.0
+# The typical reply length is the 90th percentile of the recent ones
+REPLY_LENGTH_PERCENTILE = 0.9
+# Replies a bit longer than typical are not cut
+REPLY_LENGTH_HEADROOM = 1.5
+# The history budget changes in coarse load steps, not on every load change
+HISTORY_LOAD_STEPS = 4
+
+
+class TokenBudget:
+    """
+    A token budget for the prompt and the reply of a generation.
+
+    The reply budget of a template is its typical reply length with some
+    headroom, learned from the output token counts of its recent replies, so
+    typical replies are never cut while a runaway generation is. Until a
+    template has history, the max budget applies. Both the reply and the
+    prompt budgets shrink linearly from the max to the min one as the load
+    factor goes from 1, an idle system, to 0, shedding load, and so does the
+    conversation history budget, down to no history at all by default.
+
+    The history is cut so consecutive prompts of a chat start with the same
+    turns and Ollama reuses the cache of the shared prefix: its budget moves
+    in coarse load steps, and the cut moves by half of the budget at once,
+    always to a user turn.
+    """
+
+    def __init__(
+        self,
+        max_predict: int = 512,
+        min_predict: int = 64,
+        max_prompt_tokens: int = 1024,
+        min_prompt_tokens: int = 256,
+        window: int = 50,
+        max_history_tokens: int = 1024,
+        min_history_tokens: int = 0,
+    ) -> None:
+        """
+        Initialize the TokenBudget.
+
+        Args:
+            max_predict: The maximum number of reply tokens.
+            min_predict: The number of reply tokens under the highest load.
+            max_prompt_tokens: The maximum number of user prompt tokens.
+            min_prompt_tokens: The number of prompt tokens under the highest
+                load.
+            window: The number of recent reply lengths kept per template.
+            max_history_tokens: The maximum number of conversation history
+                tokens.
+            min_history_tokens: The number of history tokens under the
+                highest load.
+
+        """
+        if not 0 < min_predict <= max_predict:
+            raise ValueError(
+                f"Reply budget must be 0 < min <= max, got {min_predict}, {max_predict}"
+            )
+        if not 0 < min_prompt_tokens <= max_prompt_tokens:
+            raise ValueError(
+                "Prompt budget must be 0 < min <= max, got "
+                f"{min_prompt_tokens}, {max_prompt_tokens}"
+            )
+        if not 0 <= min_history_tokens <= max_history_tokens:
+            raise ValueError(
+                "History budget must be 0 <= min <= max, got "
+                f"{min_history_tokens}, {max_history_tokens}"
+            )
+        self._max_predict = max_predict
+        self._min_predict = min_predict
+        self._max_prompt_tokens = max_prompt_tokens
+        self._min_prompt_tokens = min_prompt_tokens
+        self._window = window
+        self._max_history_tokens = max_history_tokens
+        self._min_history_tokens = min_history_tokens
+        self._reply_lengths: dict[str, deque[int]] = {}
+
+    @staticmethod
+    def _scale(low: int, high: int, load_factor: float) -> int:
+        """Return the budget between low and high for the load factor."""
+        load_factor = min(max(load_factor, 0.0), 1.0)
+        return round(low + (high - low) * load_factor)
+
+    def record(
+        self, template: str, eval_count: int | None, num_predict: int | None = None
+    ) -> None:
+        """
+        Add the output token count of a reply to the template history.
+
+        A reply cut at the budget only shows the budget, not the reply
+        length, so it is skipped, otherwise the typical length would follow
+        the budget shrunk under load and keep cutting replies once idle.
+
+        Args:
+            template: The system prompt template name.
+            eval_count: The number of reply tokens.
+            num_predict: The reply budget of the generation, if any.
+
+        """
+        if not eval_count:
+            return
+        if num_predict is not None and eval_count >= num_predict:
+            return
+        lengths = self._reply_lengths.setdefault(template, deque(maxlen=self._window))
+        lengths.append(eval_count)
+
+    def get_typical_length(self, template: str) -> int | None:
+        """Return the typical reply length of the template, if known."""
+        lengths = sorted(self._reply_lengths.get(template, ()))
+        if not lengths:
+            return None
+        index = math.ceil(len(lengths) * REPLY_LENGTH_PERCENTILE) - 1
+        return lengths[index]
+
+    def get_num_predict(self, template: str, load_factor: float = 1.0) -> int:
+        """
+        Return the maximum number of reply tokens.
+
+        Args:
+            template: The system prompt template name.
+            load_factor: 1.0 for an idle system down to 0.0 shedding load.
+
+        Returns:
+            The num_predict option of the generation.
+
+        """
+        max_predict = self._scale(self._min_predict, self._max_predict, load_factor)
+        typical_length = self.get_typical_length(template)
+        if typical_length is None:
+            return max_predict
+        return max(
+            min(math.ceil(typical_length * REPLY_LENGTH_HEADROOM), max_predict),
+            self._min_predict,
+        )
+
+    def truncate_prompt(self, prompt: str, load_factor: float = 1.0) -> str:
+        """
+        Return the end of the prompt fitting into the prompt budget.
+
+        The latest text is the one being replied to, so the prompt is cut
+        from the start, at a word boundary.
+
+        Args:
+            prompt: The user prompt.
+            load_factor: 1.0 for an idle system down to 0.0 shedding load.
+
+        Returns:
+            The prompt, truncated if it is over the budget.
+
+        """
+        max_tokens = self._scale(
+            self._min_prompt_tokens, self._max_prompt_tokens, load_factor
+        )
+        max_chars = int(max_tokens * CHARS_PER_TOKEN)
+        if len(prompt) <= max_chars:
+            return prompt
+        truncated = prompt[-max_chars:]
+        if not (prompt[-max_chars - 1].isspace() or truncated[0].isspace()):
+            # Drop the partial first word, unless it is the only one
+            words = truncated.split(maxsplit=1)
+            if len(words) > 1:
+                truncated = words[1]
+        return f"…{truncated.lstrip()}"
+
+    def trim_history(self, turns: list[Turn], load_factor: float = 1.0) -> list[Turn]:
+        """
+        Return the latest conversation turns fitting into the history budget.
+
+        The history is cut at a multiple of half of the budget from its start,
+        so the cut stays put while the turns are appended, until they outgrow
+        the budget again.
+
+        Args:
+            turns: The conversation turns, from the oldest.
+            load_factor: 1.0 for an idle system down to 0.0 shedding load.
+
+        Returns:
+            The latest turns, whole ones only, starting with a user turn.
+
+        """
+        load_factor = math.floor(load_factor * HISTORY_LOAD_STEPS) / HISTORY_LOAD_STEPS
+        max_tokens = self._scale(
+            self._min_history_tokens, self._max_history_tokens, load_factor
+        )
+        max_chars = int(max_tokens * CHARS_PER_TOKEN)
+        if max_chars <= 0:
+            return []
+        size = sum(len(turn.content) for turn in turns)
+        cut_step = max_chars / 2
+        cut_offset = math.ceil(max(size - max_chars, 0) / cut_step) * cut_step
+        offset = 0
+        for index, turn in enumerate(turns):
+            if offset >= cut_offset and turn.role == "user":
+                return turns[index:]
+            offset += len(turn.content)
+        return []
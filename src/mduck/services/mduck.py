@@ -1,16 +1,36 @@
 import asyncio
 import logging
 import random
+import time
+from typing import Awaitable, Callable, Mapping
 
 from aiogram import Bot, types
 from aiogram.enums import ChatAction, ChatType, ParseMode
-from redis.asyncio import Redis
+from ollama import ChatResponse
 
+from mduck.repositories.circuit_breaker import CircuitOpenError
+from mduck.repositories.conversation import ConversationRepository
 from mduck.repositories.ollama import OllamaRepository
-from mduck.schemas.queue import MessagePayload, QueueMessage
+from mduck.repositories.queue import EnqueueStatus, QueueRepository
+from mduck.repositories.response_cache import ResponseCacheRepository
+from mduck.repositories.semantic_cache import SemanticCacheRepository
+from mduck.schemas.admission import AdmissionDecision
+from mduck.schemas.cache import ResponseCachePolicy
+from mduck.schemas.ollama import Turn
+from mduck.schemas.queue import MessagePayload, QueueItem, QueueLane, QueueMessage
+from mduck.services.admission import AdmissionController
+from mduck.services.budget import TokenBudget
+from mduck.services.retry import RetryPolicy
+from mduck.services.streaming import StreamingReply
+from mduck.services.templates import TemplateSelector
 
 logger = logging.getLogger(__name__)
 
+# A queue update failing on a Redis blip is retried, otherwise the chat
+# stays queued for as long as the consumer is alive
+QUEUE_UPDATE_ATTEMPTS = 3
+QUEUE_UPDATE_BASE_DELAY = 0.5
+
 
 class MDuckService:
     """
@@ -157,30 +177,87 @@ class MDuckService:
         self,
         bot: Bot,
         ollama_repository: OllamaRepository,
-        redis: Redis,
+        queue: QueueRepository,
         response_probability_private: float = 0.2,
         response_probability_group: float = 0.01,
         response_probability_supergroup: float = 0.001,
         max_queue_size: int = 10,
+        lane_max_queue_sizes: Mapping[str, int | None] | None = None,
+        max_message_age: float | None = None,
+        reply_deadline: float | None = None,
+        admission: AdmissionController | None = None,
+        retry_policy: RetryPolicy | None = None,
+        stream_edit_interval: float | None = None,
+        response_cache: ResponseCacheRepository | None = None,
+        response_cache_policy: str = ResponseCachePolicy.OFF,
+        semantic_cache: SemanticCacheRepository | None = None,
+        token_budget: TokenBudget | None = None,
+        template_selector: TemplateSelector | None = None,
+        conversation: ConversationRepository | None = None,
+        template_batch_size: int = 1,
     ) -> None:
         """
         Initialize the MDuckService.
 
         :param ollama_repository: The repository for interacting with Ollama.
+        :param queue: The message queue repository.
         :param response_probability: The chance (0.0 to 1.0) of responding to a message.
-        :param max_queue_size: The maximum number of messages in the queue.
+        :param max_queue_size: The maximum number of messages in a queue lane.
+        :param lane_max_queue_sizes: The per lane overrides of max_queue_size.
+        :param max_message_age: Seconds after queueing when a message is dropped
+            instead of being processed.
+        :param reply_deadline: Seconds after queueing when the generation is
+            cancelled and a sticker is sent instead.
+        :param admission: The controller scaling response probabilities by load.
+        :param retry_policy: The policy retrying failed messages, failed messages
+            are dead-lettered right away without it.
+        :param stream_edit_interval: The minimum seconds between edits of a reply
+            streamed while it is generated, replies are sent once generated
+            if not set.
+        :param response_cache: The cache of responses to repeated messages.
+        :param response_cache_policy: When cached responses are served: never,
+            always, or only while the admission controller reports load.
+        :param semantic_cache: The cache of responses to paraphrased messages,
+            consulted after a response cache miss.
+        :param token_budget: The budget capping the prompt and reply tokens
+            by the load, generations are unbounded without it.
+        :param template_selector: The system prompt template selection by the
+            template costs, templates are chosen uniformly without it.
+        :param conversation: The recent turns of every chat, sent along with
+            the prompt, every generation is stateless without it.
+        :param template_batch_size: The number of consecutive replies sharing
+            a system prompt template, so Ollama reuses its cached prefix.
         """
         self._bot = bot
         self._ollama_repository = ollama_repository
-        self._redis = redis
+        self._queue = queue
         self._response_probability = {
             ChatType.PRIVATE.value: response_probability_private,
             ChatType.GROUP.value: response_probability_group,
             ChatType.SUPERGROUP.value: response_probability_supergroup,
         }
-        self._max_queue_size = max_queue_size
-        self._message_queue_key = "mduck:message_queue"
-        self._chats_in_queue_key = "mduck:chats_in_queue"
+        self._max_queue_size = dict.fromkeys(QueueLane, max_queue_size)
+        for lane_name, lane_max_queue_size in (lane_max_queue_sizes or {}).items():
+            if lane_max_queue_size is not None:
+                self._max_queue_size[QueueLane(lane_name)] = lane_max_queue_size
+        self._max_message_age = max_message_age
+        self._reply_deadline = reply_deadline
+        self._admission = admission
+        self._retry_policy = retry_policy
+        self._stream_edit_interval = stream_edit_interval
+        self._response_cache = response_cache
+        self._response_cache_policy = ResponseCachePolicy(response_cache_policy)
+        self._semantic_cache = semantic_cache
+        self._token_budget = token_budget
+        self._template_selector = template_selector
+        self._conversation = conversation
+        if template_batch_size < 1:
+            raise ValueError(
+                f"Template batch size must be positive, got {template_batch_size}"
+            )
+        self._template_batch_size = template_batch_size
+        self._batch_template: str | None = None
+        self._batch_left = 0
         logger.info(
             "MDuckService initialized with probability: %s, max_queue_size: %s",
             self._response_probability,
@@ -231,32 +308,36 @@ class MDuckService:
         if user.id == self._bot.id:
             await self._handle_bot_is_added(event)
 
-    async def send_random_sticker(self, message: types.Message) -> None:
-        """Send a random sticker."""
+    async def send_random_sticker(
+        self, message: types.Message | MessagePayload
+    ) -> None:
+        """Send a random sticker, replying to a queued message."""
         random_pack = random.choice(self.STICKER_PACKS)
         random_sticker_key, random_sticker = random.choice(list(random_pack.items()))
         logger.info(f"Sending random sticker {random_sticker_key}")
         random_sticker = random_pack[random_sticker_key]
-        await message.answer_sticker(random_sticker)
+        if isinstance(message, MessagePayload):
+            await self._bot.send_sticker(
+                chat_id=message.chat_id,
+                sticker=random_sticker,
+                reply_to_message_id=message.message_id,
+            )
+        else:
+            await message.answer_sticker(random_sticker)
 
     async def handle_incoming_message(self, message: types.Message) -> None:
         """
         Handle an incoming message, deciding whether to queue it for a response.
 
         The message is queued if the chat does not already have a message in the
-        queue and if the probability check passes.
+        queue and if the probability check passes. Otherwise, while the chat is
+        queued, the message is coalesced into the chat buffer to be answered
+        together with the queued one. Queueing takes a single atomic
+        round trip to Redis. Messages addressing the bot directly go to the
+        direct lane, others to the private or group lane by the chat type.
 
         :param message: The incoming aiogram Message object.
         """
-        is_in_queue = await self._redis.sismember(  # type: ignore[misc]
-            self._chats_in_queue_key, str(message.chat.id)
-        )
-        if is_in_queue:
-            logger.debug(
-                "Chat %s already has a message in queue, skipping.", message.chat.id
-            )
-            return
-
         if not message.text:
             return
         bot_info: types.User = await self._bot.me()
@@ -266,76 +347,399 @@ class MDuckService:
             and message.reply_to_message.from_user.id == self._bot.id
         ):
             response_probability = 1.0
+            lane = QueueLane.DIRECT
         else:
             response_probability = self._response_probability.get(
                 message.chat.type, 0.0
             )
+            lane = (
+                QueueLane.PRIVATE
+                if message.chat.type == ChatType.PRIVATE
+                else QueueLane.GROUP
+            )
+            if self._admission is not None:
+                response_probability = await self._admission.scale_probability(
+                    lane, response_probability
+                )
 
         probability = random.random()
-        if probability < response_probability:
-            queue_size = await self._redis.scard(self._chats_in_queue_key)  # type: ignore[misc]
-            if queue_size >= self._max_queue_size:
+        is_selected = probability < response_probability
+        payload = MessagePayload(
+            chat_id=message.chat.id,
+            message_id=message.message_id,
+            text=message.text,
+            chat_type=message.chat.type,
+        )
+        if is_selected and random.choice([True, False]):
+            if await self._ollama_repository.is_circuit_open():
                 logger.warning(
-                    "Message queue is full (%s messages), "
-                    "skipping message from chat %s.",
-                    self._max_queue_size,
+                    "Ollama circuit breaker is open, answering chat %s with a sticker.",
                     message.chat.id,
                 )
                 await self.send_random_sticker(message)
                 return
-            else:
-                if random.choice([True, False]):
-                    await self.send_random_sticker(message)
-                    return
-
-            payload = MessagePayload(
-                chat_id=message.chat.id,
-                message_id=message.message_id,
-                text=message.text,
-                chat_type=message.chat.type,
+            status = await self._queue.enqueue(
+                QueueMessage(message=payload, lane=lane), self._max_queue_size[lane]
             )
-            queue_message = QueueMessage(message=payload)
+            if status == EnqueueStatus.COALESCED:
+                logger.info(
+                    "Message from chat %s coalesced with the queued one.",
+                    message.chat.id,
+                )
+            elif status == EnqueueStatus.DUPLICATE:
+                logger.debug(
+                    "Chat %s already has a message in queue, skipping.",
+                    message.chat.id,
+                )
+            elif status == EnqueueStatus.FULL:
+                logger.warning(
+                    "Message queue lane %s is full (%s messages), "
+                    "skipping message from chat %s.",
+                    lane.value,
+                    self._max_queue_size[lane],
+                    message.chat.id,
+                )
+                await self.send_random_sticker(message)
+            else:
+                logger.info(
+                    "Message from chat %s queued for processing.", message.chat.id
+                )
+            return
 
-            await self._redis.lpush(  # type: ignore[misc]
-                self._message_queue_key, queue_message.model_dump_json()
-            )
-            await self._redis.sadd(self._chats_in_queue_key, str(message.chat.id))  # type: ignore[misc]
-            logger.info("Message from chat %s queued for processing.", message.chat.id)
-        else:
+        if await self._queue.coalesce(payload):
             logger.debug(
-                "Message from chat %s skipped due to probability: %s > %s",
+                "Chat %s already has a message in queue, message coalesced.",
                 message.chat.id,
-                probability,
-                response_probability,
             )
-            if message.chat.type == ChatType.PRIVATE:
-                if random.choice([True, False]):
-                    await message.answer(
-                        random.choice(self.PRIVATE_MESSAGES),
-                        parse_mode=ParseMode.MARKDOWN,
+            return
+
+        if is_selected:
+            await self.send_random_sticker(message)
+            return
+
+        logger.debug(
+            "Message from chat %s skipped due to probability: %s > %s",
+            message.chat.id,
+            probability,
+            response_probability,
+        )
+        if message.chat.type == ChatType.PRIVATE:
+            if random.choice([True, False]):
+                await message.answer(
+                    random.choice(self.PRIVATE_MESSAGES),
+                    parse_mode=ParseMode.MARKDOWN,
+                )
+            else:
+                await self.send_random_sticker(message)
+
+    async def process_queue_item(self, consumer: str, item: QueueItem) -> None:
+        """
+        Process a message taken from the queue and send a reply.
+
+        The message stays in the consumer processing list until it is processed,
+        if the processing is interrupted the message is returned to the queue
+        on shutdown or by the reaper. Messages coalesced while the chat was
+        queued are answered along with the queued message. Messages older than
+        the max age are dropped, and the generation is cancelled once the reply
+        deadline passes. Failed messages are retried later with the coalesced
+        messages kept, or moved to the dead letter queue.
+
+        :param consumer: The unique name of the queue consumer.
+        :param item: The queue item taken by the consumer.
+        """
+        try:
+            item.message.context.set_contextvars()
+            age = time.time() - item.message.enqueued_at
+            if self._max_message_age is not None and age > self._max_message_age:
+                logger.warning(
+                    "Dropping message from chat %s queued %.1f sec ago.",
+                    item.message.message.chat_id,
+                    age,
+                )
+                await self._update_queue(lambda: self._queue.ack(consumer, item))
+                return
+
+            deadline = (
+                item.message.enqueued_at + self._reply_deadline
+                if self._reply_deadline is not None
+                else None
+            )
+            heartbeat = asyncio.create_task(self._queue.keep_alive(consumer, item))
+            try:
+                try:
+                    coalesced = [
+                        *item.message.coalesced,
+                        *await self._queue.take_coalesced(item.message.message.chat_id),
+                    ]
+                except Exception as e:
+                    logger.warning(
+                        "Failed to take coalesced messages of chat %s: %s, "
+                        "returning the message to the queue.",
+                        item.message.message.chat_id,
+                        e,
                     )
+                    await self._update_queue(
+                        lambda: self._queue.retry(consumer, item, item.message, 0.0)
+                    )
+                    return
+                try:
+                    await self._process_message(
+                        item.message.message, coalesced, deadline=deadline
+                    )
+                except Exception as e:
+                    await self._handle_failure(consumer, item, coalesced, e)
                 else:
-                    await self.send_random_sticker(message)
+                    await self._update_queue(lambda: self._queue.ack(consumer, item))
+            finally:
+                heartbeat.cancel()
+        except Exception as e:
+            logger.error("Error processing message from queue: %s", e, exc_info=True)
+
+    @staticmethod
+    async def _update_queue(update: Callable[[], Awaitable[None]]) -> None:
+        """
+        Run the queue update, retrying it with a backoff on failure.
+
+        :param update: The queue update to run.
+        """
+        for attempt in range(QUEUE_UPDATE_ATTEMPTS):
+            try:
+                await update()
+                return
+            except Exception as e:
+                if attempt + 1 >= QUEUE_UPDATE_ATTEMPTS:
+                    raise
+                delay = QUEUE_UPDATE_BASE_DELAY * 2**attempt
+                logger.warning(
+                    "Queue update failed: %s, retrying in %.1f sec.", e, delay
+                )
+                await asyncio.sleep(delay)
 
-    async def process_message_from_queue(self) -> None:
+    async def _handle_failure(
+        self,
+        consumer: str,
+        item: QueueItem,
+        coalesced: list[MessagePayload],
+        error: Exception,
+    ) -> None:
         """
-        Wait for a message from the queue, process it, and send a reply.
+        Schedule a retry of the failed message or move it to the dead letters.
 
-        This method is intended to be run as a continuous background task.
+        :param consumer: The unique name of the queue consumer.
+        :param item: The failed queue item.
+        :param coalesced: The messages answered along with the queued message.
+        :param error: The failure.
         """
+        chat_id = item.message.message.chat_id
+        attempt = item.message.attempts + 1
+        if self._retry_policy is not None and self._retry_policy.should_retry(
+            error, attempt
+        ):
+            delay = self._retry_policy.get_delay(attempt, error)
+            logger.warning(
+                "Attempt %s for chat %s failed: %s, retrying in %.1f sec.",
+                attempt,
+                chat_id,
+                error,
+                delay,
+            )
+            message = item.message.model_copy(
+                update={"attempts": attempt, "coalesced": coalesced}
+            )
+            await self._update_queue(
+                lambda: self._queue.retry(consumer, item, message, delay)
+            )
+            return
+
+        logger.error(
+            "Error processing message in chat %s after %s attempts: %s",
+            chat_id,
+            attempt,
+            error,
+            exc_info=error,
+        )
+        await self._update_queue(
+            lambda: self._queue.dead_letter(consumer, item, repr(error))
+        )
+        await self._send_error_message(item.message.message)
+
+    async def _send_error_message(self, message: MessagePayload) -> None:
+        """Reply to the message with the error message."""
         try:
-            _key, raw_message = await self._redis.brpop(  # type: ignore[misc]
-                [self._message_queue_key]
+            await self._bot.send_message(
+                chat_id=message.chat_id,
+                text="Quack! *ERROR* 0xQUACK\n"
+                "Duck OS has temporarily lost control of the feathers.\n"
+                "Suggested fixes:\n"
+                "  • flap wings aggressively\n"
+                "  • quack exactly three times\n"
+                "  • wait until I paddle back to shore\n"
+                "Quaaaack… restarting in wet mode ♡",
+                reply_to_message_id=message.message_id,
+                parse_mode=ParseMode.MARKDOWN,
+            )
+        except Exception as e:
+            logger.error(
+                "Failed to send error message to chat %s: %s",
+                message.chat_id,
+                e,
+                exc_info=True,
             )
-            queue_message = QueueMessage.model_validate_json(raw_message)
 
-            queue_message.context.set_contextvars()
+    async def _is_cache_served(self) -> bool:
+        """Return True if the cache policy allows serving cached responses now."""
+        if self._response_cache_policy == ResponseCachePolicy.OFF:
+            return False
+        if self._response_cache_policy == ResponseCachePolicy.LOAD:
+            if self._admission is None:
+                return False
+            state = await self._admission.refresh()
+            return state.decision != AdmissionDecision.ADMIT
+        return True
+
+    async def _get_load(self) -> tuple[int, float]:
+        """
+        Return the queue size and the load factor of the admission controller.
 
-            await self._process_message(queue_message.message)
+        :return: The number of queued messages and the load factor, from 1.0
+            for an idle system down to 0.0 shedding load.
+        """
+        try:
+            if self._admission is not None:
+                state = await self._admission.refresh()
+                return state.queue_size, state.factor
+            return await self._queue.size(), 1.0
         except Exception as e:
-            logger.error("Error processing message from queue: %s", e, exc_info=True)
+            logger.warning("Failed to get the load: %s", e)
+            return 0, 1.0
 
-    async def _process_message(self, message: MessagePayload) -> None:
+    async def _choose_template(self, load_factor: float) -> str:
+        """
+        Return the system prompt template, cheaper ones are likelier under load.
+
+        A template is kept for a batch of consecutive replies, unless it has
+        been replaced by a prompt reload.
+
+        :param load_factor: 1.0 for an idle system down to 0.0 shedding load.
+        :return: The template name.
+        """
+        if (
+            self._batch_left > 0
+            and self._batch_template in self._ollama_repository.templates
+        ):
+            self._batch_left -= 1
+            return self._batch_template
+        if self._template_selector is None:
+            template = self._ollama_repository.choose_template()
+        else:
+            template = await self._template_selector.choose(
+                self._ollama_repository.templates, load_factor
+            )
+        self._batch_template = template
+        self._batch_left = self._template_batch_size - 1
+        return template
+
+    async def _record_template(
+        self, template: str, response: ChatResponse | None
+    ) -> None:
+        """Add a generation sample to the template statistics, if tracked."""
+        if self._template_selector is not None:
+            await self._template_selector.record(template, response)
+
+    async def _get_cached_response(
+        self, template: str, model: str, prompt: str
+    ) -> tuple[ChatResponse | None, list[float] | None]:
+        """
+        Return a cached response to the prompt or to a paraphrase of it.
+
+        :param template: The system prompt template name.
+        :param model: The model name.
+        :param prompt: The user prompt.
+        :return: The cached response and the prompt embedding, if computed.
+        """
+        if not await self._is_cache_served():
+            return None, None
+        embedding = None
+        try:
+            if self._response_cache is not None:
+                response = await self._response_cache.get(template, model, prompt)
+                if response is not None:
+                    return response, None
+            if self._semantic_cache is not None:
+                embedding = await self._ollama_repository.embed(prompt)
+                response = await self._semantic_cache.get(template, model, embedding)
+                return response, embedding
+        except Exception as e:
+            logger.warning("Failed to get cached response: %s", e)
+        return None, embedding
+
+    async def _cache_response(
+        self,
+        template: str,
+        model: str,
+        prompt: str,
+        response: ChatResponse,
+        embedding: list[float] | None = None,
+    ) -> None:
+        """Add a generated response to the caches unless caching is off."""
+        if self._response_cache_policy == ResponseCachePolicy.OFF:
+            return
+        if not (response.message and response.message.content):
+            return
+        try:
+            if self._response_cache is not None:
+                await self._response_cache.put(template, model, prompt, response)
+            if self._semantic_cache is not None:
+                if embedding is None:
+                    embedding = await self._ollama_repository.embed(prompt)
+                await self._semantic_cache.put(template, model, embedding, response)
+        except Exception as e:
+            logger.warning("Failed to cache response: %s", e)
+
+    async def _get_history(self, chat_id: int, load_factor: float) -> list[Turn]:
+        """Return the latest turns of the chat fitting into the token budget."""
+        if self._conversation is None:
+            return []
+        try:
+            history = await self._conversation.get(chat_id)
+        except Exception as e:
+            logger.warning("Failed to get chat %s history: %s", chat_id, e)
+            return []
+        if self._token_budget is not None:
+            history = self._token_budget.trim_history(history, load_factor)
+        return history
+
+    async def _remember(self, chat_id: int, prompt: str, reply: str) -> None:
+        """Add the prompt and the reply to the chat history, if tracked."""
+        if self._conversation is None:
+            return
+        try:
+            await self._conversation.append(
+                chat_id,
+                Turn(role="user", content=prompt),
+                Turn(role="assistant", content=reply),
+            )
+        except Exception as e:
+            logger.warning("Failed to update chat %s history: %s", chat_id, e)
+
+    @staticmethod
+    def _get_prompt(messages: list[MessagePayload]) -> str:
+        """Join the message texts into a prompt, dropping leading mentions."""
+        texts = []
+        for message in messages:
+            text = message.text or ""
+            if text.startswith("@"):
+                text = text.partition(" ")[2]
+            if text.strip():
+                texts.append(text.strip())
+        return "\n".join(texts)
+
+    async def _process_message(
+        self,
+        message: MessagePayload,
+        coalesced: list[MessagePayload] | None = None,
+        deadline: float | None = None,
+    ) -> None:
         chat_id = message.chat_id
         logger.info("Processing message from chat %s from queue.", chat_id)
 
@@ -344,18 +748,124 @@ class MDuckService:
             if message.text is None:
                 raise RuntimeError("Empty message text")
 
+            messages = [message, *(coalesced or [])]
+            if await self._ollama_repository.is_circuit_open():
+                logger.warning(
+                    "Ollama circuit breaker is open, answering chat %s with a sticker.",
+                    chat_id,
+                )
+                await self.send_random_sticker(messages[-1])
+                return
+
             # Send "typing" action in background
             task = asyncio.create_task(self._send_typing_periodically(chat_id, event))
 
-            prompt = message.text
-
-            if prompt.startswith("@"):
-                prompt = prompt.split(" ", 1)[1]
+            # Answer all the coalesced messages at once, replying to the latest
+            prompt = self._get_prompt(messages)
+            reply_to_message_id = messages[-1].message_id
 
             if prompt:
-                template, response = await self._ollama_repository.generate_response(
-                    prompt
+                timeout = None if deadline is None else max(deadline - time.time(), 0)
+                reply = StreamingReply(
+                    self._bot,
+                    chat_id,
+                    reply_to_message_id,
+                    edit_interval=self._stream_edit_interval or 0,
+                )
+                on_chunk = reply.update if self._stream_edit_interval else None
+                queue_size, load_factor = await self._get_load()
+                template = await self._choose_template(load_factor)
+                model = self._ollama_repository.choose_model(queue_size, timeout)
+                response, embedding = await self._get_cached_response(
+                    template, model, prompt
                 )
+                is_cached = response is not None
+                generation_prompt = prompt
+                if response is None:
+                    num_predict = None
+                    if self._token_budget is not None:
+                        num_predict = self._token_budget.get_num_predict(
+                            template, load_factor
+                        )
+                        generation_prompt = self._token_budget.truncate_prompt(
+                            prompt, load_factor
+                        )
+                    history = await self._get_history(chat_id, load_factor)
+                    logger.debug(
+                        "Generating with %s for queue size %s: num_predict=%s, "
+                        "prompt %s of %s chars, %s history turns.",
+                        model,
+                        queue_size,
+                        num_predict,
+                        len(generation_prompt),
+                        len(prompt),
+                        len(history),
+                    )
+                    deadline_timeout = asyncio.timeout(timeout)
+                    try:
+                        async with deadline_timeout:
+                            result = await self._ollama_repository.generate_response(
+                                generation_prompt,
+                                on_chunk=on_chunk,
+                                template=template,
+                                model=model,
+                                num_predict=num_predict,
+                                history=history,
+                            )
+                    except TimeoutError:
+                        await self._record_template(template, None)
+                        if not deadline_timeout.expired():
+                            # An Ollama request timeout is retried like any
+                            # transient error
+                            raise
+                        # A partially streamed reply is better than a sticker
+                        if not reply.is_sent:
+                            logger.warning(
+                                "Reply deadline passed for chat %s, sending a sticker.",
+                                chat_id,
+                            )
+                            await self.send_random_sticker(messages[-1])
+                        else:
+                            logger.warning(
+                                "Reply deadline passed for chat %s, reply is cut.",
+                                chat_id,
+                            )
+                        return
+                    except CircuitOpenError:
+                        logger.warning(
+                            "Ollama circuit breaker rejected the reply to chat %s, "
+                            "sending a sticker.",
+                            chat_id,
+                        )
+                        await self.send_random_sticker(messages[-1])
+                        return
+                    except Exception as e:
+                        await self._record_template(template, None)
+                        if not reply.is_sent:
+                            raise
+                        # A retry would post a second reply under the partial one
+                        logger.warning(
+                            "Reply to chat %s failed while streaming: %s, "
+                            "reply is cut.",
+                            chat_id,
+                            e,
+                        )
+                        await reply.finish(f"{reply.text}…")
+                        return
+                    template, response = result
+                    await self._record_template(template, response)
+                    if self._admission is not None:
+                        await self._admission.record(response)
+                    if self._token_budget is not None:
+                        self._token_budget.record(
+                            template, response.eval_count, num_predict
+                        )
+                    # A reply to the chat thread is cached by the prompt alone,
+                    # so it would be served to other chats
+                    if not history:
+                        await self._cache_response(
+                            template, model, prompt, response, embedding
+                        )
 
                 if response.message and response.message.content:
                     text = response.message.content.strip()
@@ -370,53 +880,32 @@ class MDuckService:
 
                 tps = eval_count / eval_duration * 1e9
                 duration = (response.total_duration or 0) / 1e9
+                load_duration = (response.load_duration or 0) / 1e9
 
                 meta = (
                     f"Duration: {duration:.2f}sec\n"
+                    f"Load: {load_duration:.2f}sec\n"
                     f"Tokens: {response.prompt_eval_count} -> {response.eval_count}\n"
                     f"Speed: {tps:.1f}tps\n"
+                    f"Model: {response.model or model}\n"
                     f"Prompt: {template}"
                 )
+                if is_cached:
+                    meta += "\nCached: yes"
 
                 if message.chat_type == ChatType.PRIVATE:
                     text += f"\n\n```metadata\n{meta}```"
 
-                # Send the response
-                await self._bot.send_message(
-                    chat_id=chat_id,
-                    text=text,
-                    parse_mode=ParseMode.MARKDOWN,
-                    reply_to_message_id=message.message_id,
+                # Send the response or replace the streamed one
+                await reply.finish(text)
+                # The turns are kept as sent and generated, so the next prompt
+                # of the chat starts with the same tokens
+                await self._remember(
+                    chat_id, generation_prompt, response.message.content
                 )
 
             event.set()
             task.cancel()
             logger.info("Replied to message in chat %s.", chat_id)
-        except Exception as e:
-            logger.error(
-                "Error processing message in chat %s: %s", chat_id, e, exc_info=True
-            )
-            try:
-                await self._bot.send_message(
-                    chat_id=chat_id,
-                    text="Quack! *ERROR* 0xQUACK\n"
-                    "Duck OS has temporarily lost control of the feathers.\n"
-                    "Suggested fixes:\n"
-                    "  • flap wings aggressively\n"
-                    "  • quack exactly three times\n"
-                    "  • wait until I paddle back to shore\n"
-                    "Quaaaack… restarting in wet mode ♡",
-                    reply_to_message_id=message.message_id,
-                    parse_mode=ParseMode.MARKDOWN,
-                )
-            except Exception as e2:
-                logger.error(
-                    "Failed to send error message to chat %s: %s",
-                    chat_id,
-                    e2,
-                    exc_info=True,
-                )
         finally:
             event.set()
-            await self._redis.srem(self._chats_in_queue_key, str(chat_id))  # type: ignore[misc]
-            logger.debug("Chat %s removed from queued messages set.", chat_id)
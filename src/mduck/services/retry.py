@@ -0,0 +1,84 @@
+import random
+
+import httpx
+import ollama
+from aiogram.exceptions import (
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+
+TRANSIENT_ERRORS: tuple[type[BaseException], ...] = (
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+    httpx.TransportError,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+class RetryPolicy:
+    """
+    A retry policy with exponential backoff and jitter.
+
+    Only transient failures, like network errors, Ollama server errors or
+    Telegram flood control, are retried. The delay doubles with every attempt
+    up to the max delay, half of it is randomized, so retries of messages
+    failed at the same time are spread out.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 5.0,
+        max_delay: float = 300.0,
+    ) -> None:
+        """
+        Initialize the RetryPolicy.
+
+        Args:
+            max_attempts: The maximum number of processing attempts.
+            base_delay: Seconds to wait before the first retry.
+            max_delay: The maximum seconds to wait before a retry.
+
+        """
+        if max_attempts < 1:
+            raise ValueError(f"Max attempts must be positive, got {max_attempts}")
+        self._max_attempts = max_attempts
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+
+    @property
+    def max_attempts(self) -> int:
+        """Return the maximum number of processing attempts."""
+        return self._max_attempts
+
+    @staticmethod
+    def is_transient(error: BaseException) -> bool:
+        """Return True if the error is worth retrying."""
+        if isinstance(error, ollama.ResponseError):
+            return error.status_code == 429 or error.status_code >= 500
+        return isinstance(error, TRANSIENT_ERRORS)
+
+    def should_retry(self, error: BaseException, attempt: int) -> bool:
+        """Return True if the failed attempt should be retried."""
+        return attempt < self._max_attempts and self.is_transient(error)
+
+    def get_delay(self, attempt: int, error: BaseException | None = None) -> float:
+        """
+        Return seconds to wait before the next attempt.
+
+        Args:
+            attempt: The number of the failed attempt, starting from 1.
+            error: The failure, Telegram flood control delay is respected.
+
+        Returns:
+            The delay in seconds.
+
+        """
+        delay = min(self._base_delay * 2.0 ** (attempt - 1), self._max_delay)
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        if isinstance(error, TelegramRetryAfter):
+            delay = max(delay, float(error.retry_after))
+        return delay
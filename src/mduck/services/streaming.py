@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import time
+
+from aiogram import Bot
+from aiogram.enums import ParseMode
+from aiogram.exceptions import (
+    TelegramAPIError,
+    TelegramBadRequest,
+    TelegramRetryAfter,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class StreamingReply:
+    """
+    A reply message updated in place while the response is being generated.
+
+    The first generated text is sent right away, so the user sees the reply
+    after the first token instead of the whole generation. Later texts edit
+    the message no more often than the edit interval, as Telegram limits the
+    message edits per chat. Partial texts are sent as plain text, since an
+    unfinished Markdown entity would be rejected; the final text is sent as
+    Markdown, falling back to plain text if Telegram cannot parse it.
+
+    The final edit keeps the edit interval too and waits out the Telegram
+    flood control once. Once the reply is sent, a failed final edit is only
+    logged, a retry would post a second reply under it.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        chat_id: int,
+        reply_to_message_id: int,
+        edit_interval: float = 3.0,
+    ) -> None:
+        """
+        Initialize the StreamingReply.
+
+        Args:
+            bot: The bot sending the reply.
+            chat_id: The chat to reply in.
+            reply_to_message_id: The message to reply to.
+            edit_interval: The minimum seconds between the message edits.
+
+        """
+        self._bot = bot
+        self._chat_id = chat_id
+        self._reply_to_message_id = reply_to_message_id
+        self._edit_interval = edit_interval
+        self._message_id: int | None = None
+        self._text = ""
+        self._latest_text = ""
+        self._edited_at = 0.0
+
+    @property
+    def is_sent(self) -> bool:
+        """Return True if the reply message has been sent."""
+        return self._message_id is not None
+
+    @property
+    def text(self) -> str:
+        """Return the latest text generated so far, shown or not."""
+        return self._latest_text
+
+    async def _send_or_edit(self, text: str, parse_mode: ParseMode | None) -> None:
+        if self._message_id is None:
+            message = await self._bot.send_message(
+                chat_id=self._chat_id,
+                text=text,
+                parse_mode=parse_mode,
+                reply_to_message_id=self._reply_to_message_id,
+            )
+            self._message_id = message.message_id
+        else:
+            await self._bot.edit_message_text(
+                text=text,
+                chat_id=self._chat_id,
+                message_id=self._message_id,
+                parse_mode=parse_mode,
+            )
+
+    async def update(self, text: str) -> None:
+        """
+        Show the text generated so far, unless the message was edited recently.
+
+        Failed updates are only logged, the final text is sent anyway.
+
+        Args:
+            text: The text generated so far.
+
+        """
+        text = text.strip()
+        now = time.monotonic()
+        if not text or text == self._text:
+            return
+        self._latest_text = text
+        if self.is_sent and now - self._edited_at < self._edit_interval:
+            return
+        try:
+            await self._send_or_edit(text, parse_mode=None)
+        except TelegramAPIError as e:
+            logger.warning("Failed to update reply in chat %s: %s", self._chat_id, e)
+            return
+        self._text = text
+        self._edited_at = now
+
+    async def finish(self, text: str) -> None:
+        """
+        Send the final text as Markdown, or as plain text if it is malformed.
+
+        Args:
+            text: The final reply text.
+
+        Raises:
+            TelegramAPIError: If the reply could not be sent at all.
+
+        """
+        if self.is_sent:
+            delay = self._edited_at + self._edit_interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        try:
+            await self._send_final(text)
+        except TelegramAPIError as e:
+            if not self.is_sent:
+                raise
+            logger.warning(
+                "Failed to finish reply in chat %s: %s, reply is cut.",
+                self._chat_id,
+                e,
+            )
+
+    async def _send_final(self, text: str) -> None:
+        try:
+            await self._send_formatted(text)
+        except TelegramRetryAfter as e:
+            logger.warning(
+                "Reply to chat %s is flood limited, retrying in %s sec.",
+                self._chat_id,
+                e.retry_after,
+            )
+            await asyncio.sleep(e.retry_after)
+            await self._send_formatted(text)
+
+    async def _send_formatted(self, text: str) -> None:
+        try:
+            await self._send_or_edit(text, parse_mode=ParseMode.MARKDOWN)
+        except TelegramBadRequest as e:
+            if "message is not modified" in str(e):
+                return
+            logger.warning(
+                "Failed to send Markdown reply to chat %s: %s, sending plain text.",
+                self._chat_id,
+                e,
+            )
+            await self._send_or_edit(text, parse_mode=None)
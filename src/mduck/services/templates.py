@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import random
+import time
+
+from ollama import ChatResponse
+
+from mduck.repositories.template_stats import TemplateStatsRepository
+from mduck.schemas.templates import TemplateStats
+
+logger = logging.getLogger(__name__)
+
+
+class TemplateSelector:
+    """
+    A system prompt template selection weighted by the template costs.
+
+    Templates differ in their prompt size and the length of their replies,
+    so some take much longer to generate. The selection mixes a uniform
+    choice with one weighted by the inverse mean duration and the success
+    rate of every template. The weighted part grows with the load: an idle
+    system picks templates uniformly, and under the highest load the mix
+    share of picks goes by the weights. Templates without statistics get
+    the average weight.
+    """
+
+    def __init__(
+        self,
+        stats: TemplateStatsRepository,
+        mix: float = 0.5,
+        refresh_interval: float = 30.0,
+    ) -> None:
+        """
+        Initialize the TemplateSelector.
+
+        Args:
+            stats: The template statistics repository.
+            mix: The share of the cost weighted choice under the highest
+                load, 0 always chooses uniformly.
+            refresh_interval: Seconds to cache the template statistics for.
+
+        """
+        if not 0 <= mix <= 1:
+            raise ValueError(f"Selection mix must be within [0, 1], got {mix}")
+        self._stats = stats
+        self._mix = mix
+        self._refresh_interval = refresh_interval
+        self._lock = asyncio.Lock()
+        self._cached_stats: dict[str, TemplateStats] = {}
+        self._updated_at: float | None = None
+
+    async def refresh(self) -> dict[str, TemplateStats]:
+        """Return the template statistics, reloading them if stale."""
+        async with self._lock:
+            now = time.monotonic()
+            if (
+                self._updated_at is None
+                or now - self._updated_at >= self._refresh_interval
+            ):
+                self._updated_at = now
+                try:
+                    self._cached_stats = await self._stats.get_all()
+                except Exception as e:
+                    logger.warning("Failed to load template stats: %s", e)
+            return self._cached_stats
+
+    def get_weights(
+        self,
+        templates: list[str],
+        stats: dict[str, TemplateStats],
+        load_factor: float = 1.0,
+    ) -> list[float]:
+        """
+        Return the selection probabilities of the templates.
+
+        Args:
+            templates: The template names.
+            stats: The template statistics by name.
+            load_factor: 1.0 for an idle system down to 0.0 shedding load.
+
+        Returns:
+            The probability of every template, in the same order.
+
+        """
+        costs: dict[str, float] = {}
+        for template in templates:
+            template_stats = stats.get(template)
+            if template_stats is not None and template_stats.duration:
+                costs[template] = (1 - template_stats.failure_rate) / (
+                    template_stats.duration
+                )
+        default_cost = sum(costs.values()) / len(costs) if costs else 1.0
+        weights = [costs.get(template, default_cost) for template in templates]
+        total = sum(weights)
+        mix = self._mix * (1 - min(max(load_factor, 0.0), 1.0))
+        if not total:
+            mix = 0.0
+        return [
+            (1 - mix) / len(templates) + mix * (weight / total if total else 0)
+            for weight in weights
+        ]
+
+    async def choose(self, templates: list[str], load_factor: float = 1.0) -> str:
+        """
+        Return a template for a generation under the current load.
+
+        Args:
+            templates: The template names.
+            load_factor: 1.0 for an idle system down to 0.0 shedding load.
+
+        Returns:
+            The chosen template name.
+
+        """
+        if load_factor >= 1 or not self._mix:
+            return random.choice(templates)
+        weights = self.get_weights(templates, await self.refresh(), load_factor)
+        return random.choices(templates, weights=weights)[0]
+
+    async def record(self, template: str, response: ChatResponse | None) -> None:
+        """Add a generation sample of the template, a failed one if no response."""
+        try:
+            await self._stats.record(template, response)
+        except Exception as e:
+            logger.warning("Failed to record template %s stats: %s", template, e)
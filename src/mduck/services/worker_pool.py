@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import os
+import socket
+
+from mduck.repositories.ollama import OllamaRepository
+from mduck.repositories.prompts import PromptRegistry
+from mduck.repositories.queue import QueueRepository
+from mduck.services.mduck import MDuckService
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPool:
+    """
+    A pool of queue consumers running on top of the MDuckService.
+
+    Every worker is an independent asyncio task consuming messages from the
+    queue. The number of messages being processed at the same time is
+    additionally bounded by the in-flight limit, so the pool never takes more
+    work from the queue than the Ollama backend is configured to handle.
+
+    Along with the workers the pool runs a reaper, returning messages abandoned
+    by dead consumers back to the queue on startup and then periodically, and
+    keeps the Ollama model loaded while the queue is quiet.
+
+    On shutdown the pool stops taking new messages, waits up to the grace
+    period for the in-flight ones and then returns the unfinished messages
+    back to the queue, so a restart never loses a message.
+    """
+
+    def __init__(
+        self,
+        mduck: MDuckService,
+        queue: QueueRepository,
+        workers: int = 1,
+        max_in_flight: int | None = None,
+        restart_delay: float = 1.0,
+        reaper_interval: float = 60.0,
+        grace_period: float = 30.0,
+        ollama: OllamaRepository | None = None,
+        prompts: PromptRegistry | None = None,
+    ) -> None:
+        """
+        Initialize the WorkerPool.
+
+        Args:
+            mduck: The service consuming the message queue.
+            queue: The message queue repository.
+            workers: The number of concurrent queue consumers.
+            max_in_flight: The maximum number of messages processed at once.
+                Defaults to the number of workers.
+            restart_delay: Seconds to wait before restarting a crashed worker.
+            reaper_interval: Seconds between abandoned messages checks.
+            grace_period: Seconds to wait for in-flight messages on shutdown.
+            ollama: The repository warming up the model for the workers.
+            prompts: The prompt registry reloaded while the workers run.
+
+        """
+        if workers < 1:
+            raise ValueError(f"Workers count must be positive, got {workers}")
+        self._mduck = mduck
+        self._queue = queue
+        self._workers = workers
+        self._max_in_flight = max_in_flight or workers
+        self._restart_delay = restart_delay
+        self._reaper_interval = reaper_interval
+        self._grace_period = grace_period
+        self._ollama = ollama
+        self._prompts = prompts
+        self._semaphore = asyncio.Semaphore(self._max_in_flight)
+        self._consumer_prefix = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks: dict[str, asyncio.Task[None]] = {}
+        self._busy: set[str] = set()
+        self._is_stopping = False
+
+    @property
+    def is_running(self) -> bool:
+        """Return True if at least one worker task is alive."""
+        return any(not task.done() for task in self._tasks.values())
+
+    def _consumer(self, name: str) -> str:
+        return f"{self._consumer_prefix}:{name}"
+
+    async def _run_worker(self, name: str) -> None:
+        """Consume the queue until stopped, restarting after failures."""
+        consumer = self._consumer(name)
+        logger.info("Worker %s started.", name)
+        try:
+            while not self._is_stopping:
+                try:
+                    async with self._semaphore:
+                        if self._is_stopping:
+                            break
+                        item = await self._queue.dequeue(consumer)
+                        if item is None:
+                            continue
+                        self._busy.add(name)
+                        try:
+                            await self._mduck.process_queue_item(consumer, item)
+                        finally:
+                            self._busy.discard(name)
+                except Exception as e:
+                    logger.error(
+                        "Worker %s crashed: %s, restarting in %.1f sec.",
+                        name,
+                        e,
+                        self._restart_delay,
+                        exc_info=True,
+                    )
+                    await asyncio.sleep(self._restart_delay)
+        finally:
+            logger.info("Worker %s stopped.", name)
+
+    async def _run_reaper(self) -> None:
+        """Requeue abandoned messages until cancelled."""
+        while True:
+            try:
+                await self._queue.reap()
+            except Exception as e:
+                logger.error("Reaper failed: %s", e, exc_info=True)
+            await asyncio.sleep(self._reaper_interval)
+
+    def start(self) -> None:
+        """Start the worker and reaper tasks."""
+        if self.is_running:
+            raise RuntimeError("Worker pool is already running")
+        self._is_stopping = False
+        self._tasks = {
+            name: asyncio.create_task(self._run_worker(name), name=name)
+            for name in (f"mduck-worker-{i}" for i in range(1, self._workers + 1))
+        }
+        self._tasks["mduck-reaper"] = asyncio.create_task(
+            self._run_reaper(), name="mduck-reaper"
+        )
+        if self._ollama is not None:
+            self._ollama.start_keep_alive()
+        if self._prompts is not None:
+            self._prompts.start()
+        logger.info(
+            "Worker pool started with %s workers, max in flight: %s.",
+            self._workers,
+            self._max_in_flight,
+        )
+
+    async def stop(self, grace_period: float | None = None) -> None:
+        """
+        Drain the workers and return unfinished messages back to the queue.
+
+        Idle workers and the reaper are cancelled right away, workers busy
+        with a message get the grace period to finish it. Messages of workers
+        cancelled in the middle of processing are requeued.
+
+        Args:
+            grace_period: Seconds to wait for in-flight messages, defaults to
+                the pool grace period.
+
+        """
+        if grace_period is None:
+            grace_period = self._grace_period
+        self._is_stopping = True
+        if self._ollama is not None:
+            await self._ollama.stop_keep_alive()
+        if self._prompts is not None:
+            await self._prompts.stop()
+        workers = {
+            name: task for name, task in self._tasks.items() if name != "mduck-reaper"
+        }
+        for name, task in self._tasks.items():
+            if name not in self._busy:
+                task.cancel()
+
+        busy = [task for name, task in workers.items() if name in self._busy]
+        if busy:
+            logger.info(
+                "Waiting up to %.1f sec for %s in-flight messages...",
+                grace_period,
+                len(busy),
+            )
+            _done, pending = await asyncio.wait(busy, timeout=grace_period)
+            for task in pending:
+                task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+        for name in workers:
+            try:
+                await self._queue.requeue(self._consumer(name))
+            except Exception as e:
+                logger.error(
+                    "Failed to requeue messages of %s: %s", name, e, exc_info=True
+                )
+        self._tasks = {}
+        logger.info("Worker pool stopped.")
@@ -109,6 +109,26 @@ def mock_ollama_api(settings: Settings, httpx_mock: HTTPXMock) -> None:
         url=f"{settings.ollama.host}/api/chat",
         is_optional=True,
     )
+    httpx_mock.add_response(
+        method="GET",
+        url=f"{settings.ollama.host}/api/ps",
+        json={"models": []},
+        is_optional=True,
+        is_reusable=True,
+    )
+    httpx_mock.add_response(
+        method="POST",
+        url=f"{settings.ollama.host}/api/generate",
+        json={
+            "model": settings.ollama.model,
+            "created_at": "2023-12-12T14:13:43.416799Z",
+            "response": "",
+            "done": True,
+            "load_duration": 2154458000,
+        },
+        is_optional=True,
+        is_reusable=True,
+    )
 
 
 @pytest.fixture
@@ -0,0 +1,143 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from dependency_injector import providers
+
+from mduck.containers.application import ApplicationContainer
+from mduck.main.admin import (
+    list_dead_letters,
+    main,
+    print_template_stats,
+    replay_dead_letters,
+)
+from mduck.repositories.queue import MessageQueueRepository
+from mduck.repositories.template_stats import TemplateStatsRepository
+from mduck.schemas.queue import DeadLetter, MessagePayload, QueueMessage
+from mduck.schemas.templates import TemplateStats
+
+
+@pytest.fixture
+def queue_mock(container: ApplicationContainer) -> MagicMock:
+    """Return a mock queue provided by the container."""
+    queue = MagicMock(spec=MessageQueueRepository)
+    container.gateways.queue.override(
+        providers.Coroutine(AsyncMock(return_value=queue))
+    )
+    return queue
+
+
+@pytest.mark.asyncio
+async def test_list_dead_letters(
+    container: ApplicationContainer,
+    queue_mock: MagicMock,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    """Test that dead letters are printed as JSON lines."""
+    # Arrange
+    dead_letter = DeadLetter(
+        message=QueueMessage(
+            message=MessagePayload(
+                chat_id=1, message_id=1, text="hi", chat_type="private"
+            )
+        ),
+        error="error",
+    )
+    queue_mock.get_dead_letters.return_value = [dead_letter]
+
+    # Act
+    await list_dead_letters(container, count=5)
+
+    # Assert
+    queue_mock.get_dead_letters.assert_awaited_once_with(5)
+    assert capsys.readouterr().out == dead_letter.model_dump_json() + "\n"
+
+
+@pytest.mark.asyncio
+async def test_replay_dead_letters(
+    container: ApplicationContainer,
+    queue_mock: MagicMock,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    """Test that dead letters are replayed."""
+    # Arrange
+    queue_mock.replay_dead_letters.return_value = 2
+
+    # Act
+    await replay_dead_letters(container)
+
+    # Assert
+    queue_mock.replay_dead_letters.assert_awaited_once_with(None)
+    assert "Replayed 2 dead letters." in capsys.readouterr().out
+
+
+@pytest.mark.asyncio
+async def test_print_template_stats(
+    container: ApplicationContainer, capsys: pytest.CaptureFixture[str]
+) -> None:
+    """Test that the template statistics are printed as a table."""
+    # Arrange
+    template_stats = MagicMock(spec=TemplateStatsRepository)
+    template_stats.get_all.return_value = {
+        "duck.txt": TemplateStats(
+            template="duck.txt",
+            samples=4,
+            failures=1,
+            prompt_tokens=120.0,
+            eval_count=80.5,
+            duration=3.25,
+        )
+    }
+    container.gateways.template_stats.override(
+        providers.Coroutine(AsyncMock(return_value=template_stats))
+    )
+
+    # Act
+    await print_template_stats(container)
+
+    # Assert
+    header, row = capsys.readouterr().out.splitlines()
+    assert header.split() == [
+        "template",
+        "samples",
+        "failures",
+        "prompt",
+        "output",
+        "duration",
+    ]
+    assert row.split() == ["duck.txt", "4", "25.0%", "120.0", "80.5", "3.25s"]
+
+
+@patch("mduck.main.admin.asyncio.run")
+def test_main_templates(mock_run: MagicMock) -> None:
+    """Test that the templates subcommand prints the template statistics."""
+    with (
+        patch("sys.argv", ["run-admin", "templates"]),
+        patch(
+            "mduck.main.admin.print_template_stats", new_callable=MagicMock
+        ) as mock_print,
+    ):
+        main()
+
+    mock_run.assert_called_once_with(mock_print.return_value)
+
+
+@pytest.mark.parametrize(
+    ("command", "target"),
+    [("list", "list_dead_letters"), ("replay", "replay_dead_letters")],
+)
+@patch("mduck.main.admin.asyncio.run")
+def test_main(mock_run: MagicMock, command: str, target: str) -> None:
+    """Test that the dlq subcommands run the matching coroutine."""
+    # Arrange
+    argv = ["run-admin", "dlq", command, "--count", "3"]
+
+    # Act
+    with (
+        patch("sys.argv", argv),
+        patch(f"mduck.main.admin.{target}", new_callable=MagicMock) as mock_target,
+    ):
+        main()
+
+    # Assert
+    mock_run.assert_called_once_with(mock_target.return_value)
+    assert mock_target.call_args.kwargs["count"] == 3
@@ -1,22 +1,28 @@
-import asyncio
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
+from dependency_injector import providers
 from watchdog.events import FileSystemEvent
 
 from mduck.containers.application import ApplicationContainer
 from mduck.main.pooling import (
     CodeChangeHandler,
     main,
-    run_mduck_processor,
     run_reloader,
     start_pooling,
 )
+from mduck.services.worker_pool import WorkerPool
 
 
 @pytest.mark.asyncio
 async def test_start_pooling(container: ApplicationContainer) -> None:
     """Test the start_pooling function."""
+    # Arrange
+    worker_pool_mock = MagicMock(spec=WorkerPool)
+    container.worker_pool.override(
+        providers.Coroutine(AsyncMock(return_value=worker_pool_mock))
+    )
+
     # Act
     await start_pooling(container)
 
@@ -24,6 +30,24 @@ async def test_start_pooling(container: ApplicationContainer) -> None:
     container.dispatcher().start_polling.assert_called_once_with(
         container.gateways.bot()
     )
+    worker_pool_mock.start.assert_called_once()
+    worker_pool_mock.stop.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_start_pooling_without_worker(container: ApplicationContainer) -> None:
+    """Test that the embedded worker can be disabled."""
+    # Arrange
+    container.config.mduck.embedded_worker.from_value(False)
+    worker_pool_provider = AsyncMock()
+    container.worker_pool.override(providers.Coroutine(worker_pool_provider))
+
+    # Act
+    await start_pooling(container)
+
+    # Assert
+    container.dispatcher().start_polling.assert_called_once()
+    worker_pool_provider.assert_not_called()
 
 
 @patch("mduck.main.pooling.start_pooling")
@@ -133,20 +157,3 @@ def test_code_change_handler(mock_popen: MagicMock, mock_time: MagicMock) -> Non
 
     # Assert
     assert mock_popen.call_count == 2
-
-
-@pytest.mark.asyncio
-async def test_run_mduck_processor() -> None:
-    """Test the run_mduck_processor function."""
-    # Arrange
-    mock_mduck = MagicMock()
-    mock_mduck.process_message_from_queue = AsyncMock(
-        side_effect=[None, None, asyncio.CancelledError]
-    )
-
-    # Act
-    with pytest.raises(asyncio.CancelledError):
-        await run_mduck_processor(mock_mduck)
-
-    # Assert
-    assert mock_mduck.process_message_from_queue.call_count == 3
@@ -0,0 +1,59 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from dependency_injector import providers
+
+from mduck.containers.application import ApplicationContainer
+from mduck.main.worker import main, start_worker
+from mduck.services.worker_pool import WorkerPool
+
+
+@pytest.mark.asyncio
+async def test_start_worker(container: ApplicationContainer) -> None:
+    """Test that the worker runs the pool until stopped."""
+    # Arrange
+    worker_pool_mock = MagicMock(spec=WorkerPool)
+    container.worker_pool.override(
+        providers.Coroutine(AsyncMock(return_value=worker_pool_mock))
+    )
+    stop_event = asyncio.Event()
+
+    # Act
+    task = asyncio.create_task(start_worker(container, stop_event=stop_event))
+    await asyncio.sleep(0)
+    worker_pool_mock.start.assert_called_once()
+    worker_pool_mock.stop.assert_not_called()
+    stop_event.set()
+    await task
+
+    # Assert
+    worker_pool_mock.stop.assert_awaited_once()
+    container.dispatcher().start_polling.assert_not_called()
+
+
+@patch("mduck.main.worker.start_worker")
+@patch("mduck.main.worker.argparse.ArgumentParser")
+def test_main(
+    mock_argparse: MagicMock,
+    mock_start_worker: MagicMock,
+) -> None:
+    """Test the main function."""
+    # Arrange
+    mock_args = MagicMock()
+    mock_args.log_level = "info"
+    mock_args.log_format = "human"
+    mock_args.log_file = None
+    mock_args.workers = 4
+    mock_argparse.return_value.parse_args.return_value = mock_args
+
+    # Act
+    with patch("mduck.main.worker.asyncio.run") as mock_run:
+        main()
+
+    # Assert
+    mock_argparse.assert_called_once_with(description="Run the queue worker.")
+    mock_run.assert_called_once()
+    mock_run.call_args.args[0].close()
+    container = mock_start_worker.call_args.kwargs["container"]
+    assert container.config.mduck.workers() == 4
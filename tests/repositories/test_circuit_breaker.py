@@ -0,0 +1,154 @@
+import asyncio
+from typing import AsyncIterator
+from unittest.mock import AsyncMock, MagicMock
+
+import fakeredis
+import pytest
+import pytest_asyncio
+from redis.asyncio import Redis
+
+from mduck.repositories.circuit_breaker import CircuitBreaker, CircuitOpenError
+from mduck.schemas.ollama import CircuitState
+
+
+@pytest_asyncio.fixture
+async def redis() -> AsyncIterator[fakeredis.FakeAsyncRedis]:
+    """Return an isolated fake redis client."""
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    yield client
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_opens_on_failure_rate(redis: fakeredis.FakeAsyncRedis) -> None:
+    """Test that the breaker opens once the failure rate reaches the threshold."""
+    # Arrange
+    breaker = CircuitBreaker(redis=redis, failure_rate=0.5, min_calls=4, window=10)
+
+    # Act
+    await breaker.record(1.0, is_failure=False)
+    await breaker.record(1.0, is_failure=True)
+    await breaker.record(1.0, is_failure=True)
+    state_before_min_calls = await breaker.get_state()
+    await breaker.record(1.0, is_failure=False)
+
+    # Assert
+    assert state_before_min_calls == CircuitState.CLOSED
+    assert await breaker.get_state() == CircuitState.OPEN
+    assert await breaker.is_open()
+    with pytest.raises(CircuitOpenError):
+        await breaker.allow()
+
+
+@pytest.mark.asyncio
+async def test_slow_calls_are_failures(redis: fakeredis.FakeAsyncRedis) -> None:
+    """Test that successful but slow requests open the breaker."""
+    # Arrange
+    breaker = CircuitBreaker(
+        redis=redis, min_calls=2, window=2, slow_call_duration=10.0
+    )
+
+    # Act
+    await breaker.record(5.0, is_failure=False)
+    await breaker.record(12.0, is_failure=False)
+
+    # Assert
+    assert await breaker.is_open()
+
+
+@pytest.mark.asyncio
+async def test_window_forgets_old_failures(redis: fakeredis.FakeAsyncRedis) -> None:
+    """Test that only the latest outcomes make the failure rate."""
+    # Arrange
+    breaker = CircuitBreaker(redis=redis, failure_rate=0.6, min_calls=2, window=2)
+
+    # Act
+    await breaker.record(1.0, is_failure=True)
+    await breaker.record(1.0, is_failure=False)
+    await breaker.record(1.0, is_failure=False)
+    await breaker.allow()
+
+    # Assert
+    assert await breaker.get_state() == CircuitState.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_half_open_probe_closes(redis: fakeredis.FakeAsyncRedis) -> None:
+    """Test that a single probe is let through after the open time."""
+    # Arrange
+    breaker = CircuitBreaker(redis=redis, min_calls=1, window=1, open_time=0.05)
+    await breaker.record(1.0, is_failure=True)
+    await asyncio.sleep(0.06)
+
+    # Act
+    state_after_open_time = await breaker.get_state()
+    await breaker.allow()
+    with pytest.raises(CircuitOpenError):
+        await breaker.allow()
+    await breaker.record(1.0, is_failure=False)
+
+    # Assert
+    assert state_after_open_time == CircuitState.HALF_OPEN
+    assert await breaker.get_state() == CircuitState.CLOSED
+    await breaker.allow()
+
+
+@pytest.mark.asyncio
+async def test_half_open_probe_failure_reopens(
+    redis: fakeredis.FakeAsyncRedis,
+) -> None:
+    """Test that a failed probe opens the breaker again."""
+    # Arrange
+    breaker = CircuitBreaker(redis=redis, min_calls=1, window=1, open_time=0.05)
+    await breaker.record(1.0, is_failure=True)
+    await asyncio.sleep(0.06)
+    await breaker.allow()
+
+    # Act
+    await breaker.record(1.0, is_failure=True)
+
+    # Assert
+    assert await breaker.is_open()
+    with pytest.raises(CircuitOpenError):
+        await breaker.allow()
+
+
+@pytest.mark.asyncio
+async def test_late_outcomes_are_ignored(redis: fakeredis.FakeAsyncRedis) -> None:
+    """Test that outcomes recorded while open do not change the state."""
+    # Arrange
+    breaker = CircuitBreaker(redis=redis, min_calls=1, window=1, open_time=60.0)
+    await breaker.record(1.0, is_failure=True)
+
+    # Act
+    await breaker.record(1.0, is_failure=False)
+
+    # Assert
+    assert await breaker.is_open()
+
+
+@pytest.mark.asyncio
+async def test_redis_errors_keep_closed() -> None:
+    """Test that the breaker lets requests through if Redis is unavailable."""
+    # Arrange
+    mock_redis = MagicMock(spec=Redis)
+    mock_redis.hmget = AsyncMock(side_effect=ConnectionError("redis is down"))
+    mock_redis.register_script.return_value = AsyncMock(
+        side_effect=ConnectionError("redis is down")
+    )
+    breaker = CircuitBreaker(redis=mock_redis)
+
+    # Act
+    await breaker.allow()
+    await breaker.record(100.0, is_failure=True)
+
+    # Assert
+    assert await breaker.get_state() == CircuitState.CLOSED
+
+
+def test_invalid_settings() -> None:
+    """Test that the breaker thresholds are validated."""
+    with pytest.raises(ValueError, match="Failure rate"):
+        CircuitBreaker(redis=MagicMock(spec=Redis), failure_rate=0)
+    with pytest.raises(ValueError, match="min calls"):
+        CircuitBreaker(redis=MagicMock(spec=Redis), min_calls=5, window=2)
@@ -0,0 +1,104 @@
+"""Tests for the conversation repository."""
+
+from typing import AsyncIterator
+
+import fakeredis
+import pytest
+import pytest_asyncio
+
+from mduck.repositories.conversation import ConversationRepository
+from mduck.schemas.ollama import Turn
+
+
+@pytest_asyncio.fixture
+async def redis() -> AsyncIterator[fakeredis.FakeAsyncRedis]:
+    """Return an isolated fake redis client."""
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    yield client
+    await client.aclose()
+
+
+def _turns(count: int, content: str = "quack") -> list[Turn]:
+    return [
+        Turn(role="user" if i % 2 == 0 else "assistant", content=f"{content} {i}")
+        for i in range(count)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_append_and_get(redis: fakeredis.FakeAsyncRedis) -> None:
+    """Test the turns are kept compactly in order and expire."""
+    # Arrange
+    repository = ConversationRepository(redis, ttl=60.0)
+    turns = _turns(4)
+
+    # Act
+    await repository.append(100, *turns[:2])
+    await repository.append(100, *turns[2:])
+    await repository.append(100)
+
+    # Assert
+    assert await repository.get(100) == turns
+    assert await repository.get(200) == []
+    assert await redis.lindex("mduck:conversation:100", 0) == "uquack 0"
+    assert 0 < await redis.pttl("mduck:conversation:100") <= 60000
+
+
+@pytest.mark.asyncio
+async def test_append_drops_half_over_max_turns(
+    redis: fakeredis.FakeAsyncRedis,
+) -> None:
+    """Test the history is cut to half of the turns limit at once."""
+    # Arrange
+    repository = ConversationRepository(redis, max_turns=4)
+    turns = _turns(6)
+
+    # Act
+    await repository.append(100, *turns[:4])
+    before_cut = await repository.get(100)
+    await repository.append(100, *turns[4:5])
+    after_cut = await repository.get(100)
+    await repository.append(100, *turns[5:])
+
+    # Assert
+    assert before_cut == turns[:4]
+    assert after_cut == turns[3:5]
+    # The history start is stable until the next cut
+    assert await repository.get(100) == turns[3:]
+
+
+@pytest.mark.asyncio
+async def test_append_drops_half_over_max_size(
+    redis: fakeredis.FakeAsyncRedis,
+) -> None:
+    """Test the history is cut to half of the size limit, oversized turns too."""
+    # Arrange
+    repository = ConversationRepository(redis, max_size=35)
+
+    # Act
+    await repository.append(100, *_turns(5))
+    await repository.append(200, Turn(role="user", content="q" * 50))
+
+    # Assert
+    assert await repository.get(100) == _turns(5)[3:]
+    assert await repository.get(200) == []
+
+
+@pytest.mark.asyncio
+async def test_get_skips_malformed_turns(redis: fakeredis.FakeAsyncRedis) -> None:
+    """Test a malformed turn is skipped."""
+    # Arrange
+    repository = ConversationRepository(redis)
+    await redis.rpush("mduck:conversation:100", "xquack", "", "ahonk")
+
+    # Act
+    turns = await repository.get(100)
+
+    # Assert
+    assert turns == [Turn(role="assistant", content="honk")]
+
+
+def test_max_turns_validation(redis: fakeredis.FakeAsyncRedis) -> None:
+    """Test a conversation must keep at least a prompt and a reply."""
+    with pytest.raises(ValueError, match="2\\+ turns"):
+        ConversationRepository(redis, max_turns=1)
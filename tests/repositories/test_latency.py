@@ -0,0 +1,29 @@
+from typing import AsyncIterator
+
+import fakeredis
+import pytest
+import pytest_asyncio
+
+from mduck.repositories.latency import LatencyRepository
+
+
+@pytest_asyncio.fixture
+async def redis() -> AsyncIterator[fakeredis.FakeAsyncRedis]:
+    """Return an isolated fake redis client."""
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    yield client
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_record_keeps_window(redis: fakeredis.FakeAsyncRedis) -> None:
+    """Test that only the latest latencies are kept."""
+    # Arrange
+    latency = LatencyRepository(redis=redis, window=2)
+
+    # Act
+    for seconds in (1.0, 2.0, 3.5):
+        await latency.record(seconds)
+
+    # Assert
+    assert await latency.get_latest() == [3.5, 2.0]
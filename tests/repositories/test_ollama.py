@@ -1,23 +1,346 @@
 """."""
 
+import asyncio
+import json
+import time
 from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
 
+import httpx
 import pytest
+from pytest_httpx import HTTPXMock
 
 from config.settings import Settings
 from mduck.containers.application import ApplicationContainer
-from mduck.repositories.ollama import OllamaRepository
+from mduck.repositories.circuit_breaker import CircuitBreaker, CircuitOpenError
+from mduck.repositories.ollama import OllamaRepository, OllamaResource
+from mduck.repositories.ollama_pool import OllamaHost, OllamaHostPool
+from mduck.schemas.ollama import ModelStats, Turn
 
 
 @pytest.mark.asyncio
 async def test_generate_response(container: ApplicationContainer) -> None:
     """Test generate_response."""
-    ollama = container.gateways.ollama()
+    ollama = await container.gateways.ollama()
 
     template_name, response = await ollama.generate_response("test-prompt")
     assert response.message.content == "test-prompt"
 
 
+@pytest.mark.asyncio
+async def test_generate_response_stream(container: ApplicationContainer) -> None:
+    """Test generate_response reports the streamed text."""
+    ollama = await container.gateways.ollama()
+    on_chunk = AsyncMock()
+
+    template_name, response = await ollama.generate_response(
+        "test-prompt", on_chunk=on_chunk
+    )
+    assert response.message.content == "test-prompt"
+    assert response.eval_count == 298
+    on_chunk.assert_awaited_once_with("test-prompt")
+
+
+@pytest.mark.asyncio
+async def test_embed(
+    container: ApplicationContainer, settings: Settings, httpx_mock: HTTPXMock
+) -> None:
+    """Test embed returns the embedding of the text."""
+    httpx_mock.add_response(
+        method="POST",
+        url=f"{settings.ollama.host}/api/embed",
+        json={"model": "all-minilm", "embeddings": [[0.1, 0.2]]},
+    )
+    ollama = await container.gateways.ollama()
+
+    assert await ollama.embed("test-prompt") == [0.1, 0.2]
+
+
+@pytest.mark.asyncio
+async def test_generate_response_logs_load_duration(
+    container: ApplicationContainer, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test a fast model load of a reply is not logged as a cold start."""
+    mock_logger = MagicMock()
+    monkeypatch.setattr("mduck.repositories.ollama.logger", mock_logger)
+    ollama = await container.gateways.ollama()
+
+    await ollama.generate_response("test-prompt")
+
+    mock_logger.warning.assert_not_called()
+    mock_logger.debug.assert_called_once_with(
+        "Model %s load on %s took %.2f sec.",
+        "test_model",
+        "http://ollama:11434",
+        0.002154458,
+    )
+
+
+@pytest.mark.asyncio
+async def test_warm_up(settings: Settings, httpx_mock: HTTPXMock) -> None:
+    """Test warm_up loads the model on every host with a load-only request."""
+    pool = OllamaHostPool({"http://ollama:11434": 1})
+    ollama = OllamaRepository(
+        host=settings.ollama.host,
+        model=settings.ollama.model,
+        temperature=settings.ollama.temperature,
+        prompts_dir_path=settings.ollama.prompts_dir_path,
+        pool=pool,
+        keep_alive="10m",
+    )
+
+    await ollama.warm_up()
+
+    request = httpx_mock.get_request(url=f"{settings.ollama.host}/api/generate")
+    assert request is not None
+    payload = json.loads(request.content)
+    assert payload["model"] == settings.ollama.model
+    assert payload["keep_alive"] == "10m"
+    assert not payload.get("prompt")
+    assert pool.hosts[0].loaded_models == {"test_model:latest"}
+    assert pool.hosts[0].last_request_at is not None
+
+
+@pytest.mark.asyncio
+async def test_keep_alive_warms_up_idle_hosts(settings: Settings) -> None:
+    """Test the keep-alive task reloads the model once a host is idle."""
+    ollama = OllamaRepository(
+        host=settings.ollama.host,
+        model=settings.ollama.model,
+        temperature=settings.ollama.temperature,
+        prompts_dir_path=settings.ollama.prompts_dir_path,
+        keep_alive_interval=0.05,
+    )
+
+    async def warm_up_host(host: OllamaHost) -> None:
+        host.last_request_at = time.monotonic()
+
+    mock_warm_up_host = AsyncMock(side_effect=warm_up_host)
+    ollama._warm_up_host = mock_warm_up_host  # type: ignore[method-assign]
+
+    ollama.start_keep_alive()
+    await asyncio.sleep(0.12)
+    await ollama.stop_keep_alive()
+
+    # The startup warm-up followed by at least one keep-alive
+    assert mock_warm_up_host.await_count >= 2
+
+
+@pytest.mark.asyncio
+async def test_keep_alive_disabled(settings: Settings) -> None:
+    """Test the keep-alive task is not started without an interval."""
+    ollama = OllamaRepository(
+        host=settings.ollama.host,
+        model=settings.ollama.model,
+        temperature=settings.ollama.temperature,
+        prompts_dir_path=settings.ollama.prompts_dir_path,
+    )
+    ollama._warm_up_host = AsyncMock()  # type: ignore[method-assign]
+
+    ollama.start_keep_alive()
+    await asyncio.sleep(0)
+    await ollama.stop_keep_alive()
+
+    ollama._warm_up_host.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_generate_response_history(
+    container: ApplicationContainer, settings: Settings, httpx_mock: HTTPXMock
+) -> None:
+    """Test the history goes between the system prompt and the user prompt."""
+    ollama = await container.gateways.ollama()
+    history = [
+        Turn(role="user", content="quack?"),
+        Turn(role="assistant", content="quack!"),
+    ]
+
+    await ollama.generate_response("test-prompt", history=history)
+
+    request = httpx_mock.get_request(url=f"{settings.ollama.host}/api/chat")
+    assert request is not None
+    assert [
+        (message["role"], message["content"])
+        for message in json.loads(request.content)["messages"][1:]
+    ] == [("user", "quack?"), ("assistant", "quack!"), ("user", "test-prompt")]
+
+
+@pytest.mark.asyncio
+async def test_generate_response_model(
+    settings: Settings, httpx_mock: HTTPXMock
+) -> None:
+    """Test generate_response uses the requested model and records its speed."""
+    ollama = OllamaRepository(
+        host=settings.ollama.host,
+        model=settings.ollama.model,
+        temperature=settings.ollama.temperature,
+        prompts_dir_path=settings.ollama.prompts_dir_path,
+        models=["fast", "best"],
+    )
+
+    await ollama.generate_response("test-prompt", model="fast")
+
+    request = httpx_mock.get_request(url=f"{settings.ollama.host}/api/chat")
+    assert request is not None
+    assert json.loads(request.content)["model"] == "fast"
+    stats = ollama.model_stats()
+    assert stats["fast"].requests == 1
+    assert stats["fast"].tps == pytest.approx(298 / 4.799921)
+    assert stats["fast"].eval_count == 298
+    assert stats["best"].requests == 0
+    assert ollama.model == "best"
+
+
+@pytest.mark.parametrize(
+    ("queue_size", "timeout", "expected"),
+    [
+        (0, None, "best"),
+        (2, None, "best"),
+        (3, None, "medium"),
+        (6, None, "fast"),
+        (100, None, "fast"),
+        (0, 10.0, "medium"),
+        (0, 1.0, "fast"),
+    ],
+)
+def test_choose_model(
+    settings: Settings, queue_size: int, timeout: float | None, expected: str
+) -> None:
+    """Test choose_model steps down by the queue size and the time left."""
+    ollama = OllamaRepository(
+        host=settings.ollama.host,
+        model=settings.ollama.model,
+        temperature=settings.ollama.temperature,
+        prompts_dir_path=settings.ollama.prompts_dir_path,
+        models=["fast", "medium", "best"],
+        tier_queue_size=3,
+    )
+    # A typical reply takes 20 sec on the best model and 5 sec on the medium one
+    ollama._model_stats["best"] = ModelStats(tps=10.0, eval_count=200.0)
+    ollama._model_stats["medium"] = ModelStats(tps=40.0, eval_count=200.0)
+    ollama._model_stats["fast"] = ModelStats(tps=100.0, eval_count=200.0)
+
+    assert ollama.choose_model(queue_size, timeout) == expected
+
+
+@pytest.mark.asyncio
+async def test_generate_response_circuit_breaker(
+    settings: Settings, httpx_mock: HTTPXMock
+) -> None:
+    """Test generations are rejected right away once Ollama keeps failing."""
+    breaker = MagicMock(spec=CircuitBreaker)
+    breaker.slow_call_duration = 60.0
+    ollama = OllamaRepository(
+        host="http://down:11434",
+        model=settings.ollama.model,
+        temperature=settings.ollama.temperature,
+        prompts_dir_path=settings.ollama.prompts_dir_path,
+        breaker=breaker,
+    )
+    httpx_mock.add_exception(
+        httpx.ConnectError("refused"), url="http://down:11434/api/chat"
+    )
+
+    with pytest.raises(ConnectionError):
+        await ollama.generate_response("test-prompt")
+    breaker.allow.side_effect = CircuitOpenError("open")
+    with pytest.raises(CircuitOpenError):
+        await ollama.generate_response("test-prompt")
+
+    breaker.record.assert_awaited_once()
+    assert breaker.record.call_args.kwargs == {"is_failure": True}
+    assert len(httpx_mock.get_requests(url="http://down:11434/api/chat")) == 1
+
+
+@pytest.mark.asyncio
+async def test_generate_response_request_timeout(
+    settings: Settings, httpx_mock: HTTPXMock
+) -> None:
+    """Test a generation over the request timeout fails and counts to the host."""
+    ollama = OllamaRepository(
+        host="http://slow:11434",
+        model=settings.ollama.model,
+        temperature=settings.ollama.temperature,
+        prompts_dir_path=settings.ollama.prompts_dir_path,
+        request_timeout=0.01,
+    )
+
+    async def slow_callback(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(1)
+        return httpx.Response(status_code=200)
+
+    httpx_mock.add_callback(slow_callback, url="http://slow:11434/api/chat")
+    httpx_mock.add_response(
+        url="http://slow:11434/api/ps", json={"models": []}, is_optional=True
+    )
+
+    with pytest.raises(TimeoutError):
+        await ollama.generate_response("test-prompt")
+
+    assert ollama.model_stats()[settings.ollama.model].requests == 0
+    assert ollama._pool.hosts[0].errors == 1
+
+
+@pytest.mark.asyncio
+async def test_ollama_resource_shutdown(container: ApplicationContainer) -> None:
+    """Test shutting down the Ollama resource closes the host connections."""
+    ollama = await container.gateways.ollama()
+    pool = container.gateways.ollama_pool()
+    ollama.start_keep_alive()
+
+    await container.shutdown_resources()  # type: ignore[misc]
+
+    assert all(host.client._client.is_closed for host in pool.hosts)
+    assert ollama._keep_alive_task is None
+    assert await OllamaResource().shutdown(None) is None
+
+
+@pytest.mark.asyncio
+async def test_generate_response_prefix_stats(
+    settings: Settings, httpx_mock: HTTPXMock
+) -> None:
+    """Test repeated system prompts on a host are reported as prefix savings."""
+    ollama = OllamaRepository(
+        host="http://warm:11434",
+        model=settings.ollama.model,
+        temperature=settings.ollama.temperature,
+        prompts_dir_path=settings.ollama.prompts_dir_path,
+    )
+    prompt_evals = iter([(300, 1.5), (20, 0.1), (40, 0.3)])
+
+    def callback(request: httpx.Request) -> httpx.Response:
+        prompt_tokens, seconds = next(prompt_evals)
+        return httpx.Response(
+            200,
+            json={
+                "model": settings.ollama.model,
+                "message": {"role": "assistant", "content": "quack"},
+                "done": True,
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": int(seconds * 1e9),
+            },
+        )
+
+    httpx_mock.add_callback(
+        callback, url="http://warm:11434/api/chat", is_reusable=True
+    )
+    httpx_mock.add_response(
+        url="http://warm:11434/api/ps",
+        json={"models": []},
+        is_optional=True,
+        is_reusable=True,
+    )
+    template = ollama.templates[0]
+
+    for _ in range(3):
+        await ollama.generate_response("test-prompt", template=template)
+
+    stats = ollama.prefix_stats()[template]
+    assert (stats.cold_requests, stats.warm_requests) == (1, 2)
+    assert stats.saved_tokens == 2 * (300 - 30)
+    assert stats.saved_duration == pytest.approx(2 * (1.5 - 0.2))
+
+
 def test_load_prompts_failed(settings: Settings, tmp_path: Path) -> None:
     """Test load prompts failed if not found eny prompt."""
     with pytest.raises(ValueError, match="No prompts found in *"):
@@ -0,0 +1,259 @@
+"""Tests for the Ollama host pool."""
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import httpx
+import ollama
+import pytest
+
+from mduck.repositories.ollama_pool import OllamaHostPool, is_host_failure
+
+
+def _mock_ps(pool: OllamaHostPool, loaded: dict[str, list[str]]) -> None:
+    """Mock the loaded models listing of every host of the pool."""
+    for host in pool.hosts:
+        host.client = MagicMock(spec=ollama.AsyncClient)
+        host.client.ps = AsyncMock(
+            return_value=ollama.ProcessResponse(
+                models=[{"model": model} for model in loaded.get(host.url, [])]
+            )
+        )
+
+
+def test_is_host_failure() -> None:
+    """Test only the errors of an unhealthy host count as host failures."""
+    assert is_host_failure(httpx.ConnectError("refused"))
+    assert is_host_failure(TimeoutError())
+    assert is_host_failure(ollama.ResponseError("overloaded", 503))
+    assert not is_host_failure(ollama.ResponseError("model not found", 404))
+    assert not is_host_failure(ValueError("bad request"))
+
+
+@pytest.mark.asyncio
+async def test_acquire_least_outstanding_by_weight() -> None:
+    """Test requests go to the host with the least load per weight."""
+    # Arrange
+    pool = OllamaHostPool({"http://a": 2, "http://b": 1})
+    _mock_ps(pool, {})
+    await pool.probe()
+
+    # Act
+    async with (
+        pool.acquire() as first,
+        pool.acquire() as second,
+        pool.acquire() as third,
+    ):
+        urls = [first.url, second.url, third.url]
+
+    # Assert
+    assert sorted(urls) == ["http://a", "http://a", "http://b"]
+    assert [host.outstanding for host in pool.hosts] == [0, 0]
+
+
+@pytest.mark.asyncio
+async def test_acquire_prefers_loaded_model() -> None:
+    """Test requests go to a host with the model loaded while it is as free."""
+    # Arrange
+    pool = OllamaHostPool({"http://a": 1, "http://b": 1})
+    _mock_ps(pool, {"http://b": ["llama2:latest"]})
+    await pool.probe()
+
+    # Act
+    async with (
+        pool.acquire("llama2") as first,
+        pool.acquire("llama2") as second,
+        pool.acquire("gemma") as third,
+    ):
+        urls = [first.url, second.url, third.url]
+
+    # Assert
+    assert urls == ["http://b", "http://b", "http://a"]
+    assert "gemma:latest" in pool.hosts[0].loaded_models
+
+
+@pytest.mark.asyncio
+async def test_acquire_spills_over_to_cold_host() -> None:
+    """Test a busy host with the model loaded does not take all the requests."""
+    # Arrange
+    pool = OllamaHostPool({"http://a": 1, "http://b": 1}, cold_load_cost=1)
+    _mock_ps(pool, {"http://a": ["llama2:latest"]})
+    await pool.probe()
+    warm, cold = pool.hosts
+
+    # Act
+    async with (
+        pool.acquire("llama2"),
+        pool.acquire("llama2"),
+        pool.acquire("llama2"),
+        pool.acquire("llama2"),
+        pool.acquire("llama2"),
+        pool.acquire("llama2"),
+    ):
+        outstanding = [warm.outstanding, cold.outstanding]
+
+    # Assert
+    assert outstanding == [4, 2]
+    assert "llama2:latest" in cold.loaded_models
+
+
+@pytest.mark.asyncio
+async def test_acquire_pins_affinity_within_slack() -> None:
+    """Test requests sharing a system prompt stay on one host until it is busy."""
+    # Arrange
+    pool = OllamaHostPool(
+        {"http://a": 1, "http://b": 1, "http://c": 1}, affinity_slack=1
+    )
+    _mock_ps(pool, {})
+    await pool.probe()
+
+    # Act
+    async with (
+        pool.acquire(affinity="duck.txt@1") as first,
+        pool.acquire(affinity="duck.txt@1") as second,
+        pool.acquire(affinity="duck.txt@1") as third,
+    ):
+        urls = [first.url, second.url, third.url]
+    async with pool.acquire(affinity="duck.txt@1") as host:
+        idle_url = host.url
+
+    # Assert
+    assert urls[0] == urls[1] == idle_url
+    assert urls[2] != urls[0]
+
+
+@pytest.mark.asyncio
+async def test_acquire_waits_for_free_slot() -> None:
+    """Test requests over the host concurrency wait for a released slot."""
+    # Arrange
+    pool = OllamaHostPool({"http://a": 1}, max_concurrency=1)
+    _mock_ps(pool, {})
+    await pool.probe()
+    acquired = asyncio.Event()
+
+    async def second_request() -> None:
+        async with pool.acquire():
+            acquired.set()
+
+    # Act
+    async with pool.acquire():
+        task = asyncio.create_task(second_request())
+        await asyncio.sleep(0.01)
+        is_acquired_while_busy = acquired.is_set()
+    await asyncio.wait_for(task, timeout=1)
+
+    # Assert
+    assert not is_acquired_while_busy
+    assert acquired.is_set()
+
+
+@pytest.mark.asyncio
+async def test_acquire_ejects_failing_host() -> None:
+    """Test a host failing requests in a row is taken out of rotation."""
+    # Arrange
+    pool = OllamaHostPool({"http://a": 2, "http://b": 1}, failure_threshold=2)
+    _mock_ps(pool, {"http://a": ["llama2:latest"]})
+    await pool.probe()
+    failing, healthy = pool.hosts
+
+    # Act
+    async with pool.acquire("llama2"):
+        pass
+    for _ in range(2):
+        with pytest.raises(httpx.ConnectError):
+            async with pool.acquire("llama2"):
+                raise httpx.ConnectError("refused")
+    async with pool.acquire("llama2") as host:
+        chosen = host
+
+    # Assert
+    assert chosen is healthy
+    assert failing.stats() | {"latency": None, "idle": None} == {
+        "url": "http://a",
+        "weight": 2,
+        "outstanding": 0,
+        "requests": 3,
+        "errors": 2,
+        "latency": None,
+        "ejected": True,
+        "loaded_models": ["llama2:latest"],
+        "idle": None,
+    }
+    assert failing.latency is not None
+
+
+@pytest.mark.asyncio
+async def test_acquire_ignores_request_errors() -> None:
+    """Test errors caused by the request itself keep the host in rotation."""
+    # Arrange
+    pool = OllamaHostPool({"http://a": 1}, failure_threshold=1)
+    _mock_ps(pool, {})
+    await pool.probe()
+
+    # Act
+    with pytest.raises(ollama.ResponseError):
+        async with pool.acquire():
+            raise ollama.ResponseError("model not found", 404)
+
+    # Assert
+    assert not pool.hosts[0].stats()["ejected"]
+    assert pool.hosts[0].errors == 0
+
+
+@pytest.mark.asyncio
+async def test_probe_reinstates_ejected_host() -> None:
+    """Test an ejected host is brought back once its probe succeeds."""
+    # Arrange
+    pool = OllamaHostPool({"http://a": 1}, ejection_time=0.0)
+    _mock_ps(pool, {"http://a": ["llama2:latest"]})
+    host = pool.hosts[0]
+    host.ejected_until = 0.0
+    host.consecutive_failures = 3
+
+    # Act
+    await pool.probe()
+
+    # Assert
+    assert host.ejected_until is None
+    assert host.consecutive_failures == 0
+    assert host.loaded_models == {"llama2:latest"}
+
+
+@pytest.mark.asyncio
+async def test_probe_failure_keeps_host_ejected() -> None:
+    """Test an ejected host failing its probe stays out of rotation."""
+    # Arrange
+    pool = OllamaHostPool({"http://a": 1, "http://b": 1}, ejection_time=30.0)
+    _mock_ps(pool, {})
+    failing = pool.hosts[0]
+    failing.client.ps.side_effect = httpx.ConnectError("refused")
+    failing.ejected_until = 0.0
+
+    # Act
+    await pool.probe()
+    async with pool.acquire() as host:
+        chosen = host
+
+    # Assert
+    assert failing.stats()["ejected"]
+    assert chosen is pool.hosts[1]
+
+
+@pytest.mark.asyncio
+async def test_client_options_and_close() -> None:
+    """Test every host client shares the timeouts and is closed with the pool."""
+    # Arrange
+    timeout = httpx.Timeout(5.0, read=300.0, pool=None)
+    pool = OllamaHostPool(
+        {"http://a": 1, "http://b": 1},
+        timeout=timeout,
+        limits=httpx.Limits(max_connections=2, keepalive_expiry=300.0),
+    )
+
+    # Act
+    timeouts = [host.client._client.timeout for host in pool.hosts]
+    await pool.close()
+
+    # Assert
+    assert timeouts == [timeout, timeout]
+    assert all(host.client._client.is_closed for host in pool.hosts)
@@ -0,0 +1,102 @@
+"""Tests for the prompt registry."""
+
+import asyncio
+import os
+from pathlib import Path
+
+import pytest
+
+from mduck.repositories.prompts import PromptRegistry, get_template_name
+
+
+def _write(path: Path, text: str, mtime_ns: int) -> None:
+    """Write the prompt file with a distinct modification time."""
+    path.write_text(text, encoding="utf-8")
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_get_template_name() -> None:
+    """Test the version is stripped from a template name."""
+    assert get_template_name("duck.txt@1a2b3c4d") == "duck.txt"
+    assert get_template_name("duck.txt") == "duck.txt"
+
+
+def test_prompts_are_versioned(tmp_path: Path) -> None:
+    """Test every prompt is named after its file and the hash of its text."""
+    # Arrange
+    _write(tmp_path / "duck.txt", " Quack. \n", 1)
+    _write(tmp_path / "empty.txt", "\n", 1)
+    _write(tmp_path / "notes.md", "Not a prompt", 1)
+
+    # Act
+    registry = PromptRegistry(str(tmp_path))
+
+    # Assert
+    [template] = registry.templates
+    prompt = registry.get(template)
+    assert template == prompt.key
+    assert prompt.name == "duck.txt"
+    assert prompt.text == "Quack."
+    assert len(prompt.version) == 8
+    assert PromptRegistry(str(tmp_path)).templates == [template]
+
+
+def test_reload_swaps_snapshot(tmp_path: Path) -> None:
+    """Test an edited prompt gets a new version, the old one resolves to it."""
+    # Arrange
+    _write(tmp_path / "duck.txt", "Quack.", 1)
+    registry = PromptRegistry(str(tmp_path))
+    [old_template] = registry.templates
+
+    # Act
+    is_unchanged_reloaded = registry.reload()
+    _write(tmp_path / "duck.txt", "Quack quack.", 2)
+    _write(tmp_path / "goose.txt", "Honk.", 2)
+    is_reloaded = registry.reload()
+
+    # Assert
+    assert not is_unchanged_reloaded
+    assert is_reloaded
+    assert len(registry.templates) == 2
+    assert old_template not in registry.templates
+    assert registry.get(old_template).text == "Quack quack."
+    assert registry.get("swan.txt@00000000").name in {"duck.txt", "goose.txt"}
+
+
+def test_reload_keeps_snapshot_without_prompts(tmp_path: Path) -> None:
+    """Test a reload leaving no prompts keeps the current ones serving."""
+    # Arrange
+    _write(tmp_path / "duck.txt", "Quack.", 1)
+    registry = PromptRegistry(str(tmp_path))
+    templates = registry.templates
+
+    # Act
+    _write(tmp_path / "duck.txt", "", 2)
+    is_reloaded = registry.reload()
+
+    # Assert
+    assert not is_reloaded
+    assert registry.templates == templates
+
+
+def test_no_prompts(tmp_path: Path) -> None:
+    """Test a registry cannot start without prompts."""
+    with pytest.raises(ValueError, match="No prompts found in *"):
+        PromptRegistry(str(tmp_path))
+
+
+@pytest.mark.asyncio
+async def test_reload_in_background(tmp_path: Path) -> None:
+    """Test the registry picks up a new prompt while running."""
+    # Arrange
+    _write(tmp_path / "duck.txt", "Quack.", 1)
+    registry = PromptRegistry(str(tmp_path), reload_interval=0.01)
+
+    # Act
+    registry.start()
+    _write(tmp_path / "goose.txt", "Honk.", 2)
+    await asyncio.sleep(0.05)
+    await registry.stop()
+
+    # Assert
+    assert len(registry.templates) == 2
@@ -0,0 +1,405 @@
+import asyncio
+from typing import AsyncIterator
+from unittest.mock import MagicMock, patch
+
+import fakeredis
+import pytest
+import pytest_asyncio
+from redis.asyncio import Redis
+
+from mduck.repositories.queue import (
+    BaseQueueRepository,
+    EnqueueStatus,
+    MessageQueueRepository,
+    weighted_lane_order,
+)
+from mduck.schemas.queue import (
+    MessagePayload,
+    QueueContext,
+    QueueLane,
+    QueueMessage,
+)
+
+
+@pytest_asyncio.fixture
+async def redis() -> AsyncIterator[fakeredis.FakeAsyncRedis]:
+    """Return an isolated fake redis client."""
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    yield client
+    await client.aclose()
+
+
+@pytest.fixture
+def queue(redis: fakeredis.FakeAsyncRedis) -> MessageQueueRepository:
+    """Return a message queue repository."""
+    return MessageQueueRepository(
+        redis=redis, visibility_timeout=2.0, dequeue_timeout=1
+    )
+
+
+def _message(
+    chat_id: int, text: str = "hello", lane: QueueLane = QueueLane.GROUP
+) -> QueueMessage:
+    return QueueMessage(
+        message=MessagePayload(
+            chat_id=chat_id, message_id=1, text=text, chat_type="private"
+        ),
+        context=QueueContext(),
+        lane=lane,
+    )
+
+
+@pytest.mark.asyncio
+async def test_push_dequeue_ack(queue: MessageQueueRepository) -> None:
+    """Test that a message is kept in-flight until acknowledged."""
+    # Arrange
+    await queue.enqueue(_message(1), max_size=10)
+    await queue.enqueue(_message(2), max_size=10)
+
+    # Act
+    item = await queue.dequeue("worker-1")
+
+    # Assert
+    assert item is not None
+    assert item.message.message.chat_id == 1
+    assert await queue.is_queued(1)
+    assert await queue.size() == 2
+
+    await queue.ack("worker-1", item)
+    assert not await queue.is_queued(1)
+    assert await queue.size() == 1
+
+
+@pytest.mark.asyncio
+async def test_enqueue_statuses(queue: MessageQueueRepository) -> None:
+    """Test that enqueue deduplicates chats and respects the queue size."""
+    assert await queue.enqueue(_message(1), max_size=2) == EnqueueStatus.QUEUED
+    assert await queue.enqueue(_message(1), max_size=2) == EnqueueStatus.COALESCED
+    assert await queue.enqueue(_message(2), max_size=2) == EnqueueStatus.QUEUED
+    assert await queue.enqueue(_message(3), max_size=2) == EnqueueStatus.FULL
+    assert await queue.size() == 2
+    assert not await queue.is_queued(3)
+
+
+@pytest.mark.asyncio
+async def test_dequeue_timeout(queue: MessageQueueRepository) -> None:
+    """Test that dequeue returns None on an empty queue."""
+    assert await queue.dequeue("worker-1") is None
+
+
+@pytest.mark.asyncio
+async def test_dequeue_drops_malformed_message(
+    queue: MessageQueueRepository, redis: fakeredis.FakeAsyncRedis
+) -> None:
+    """Test that a malformed message is dropped instead of blocking the queue."""
+    # Arrange
+    await redis.lpush("mduck:message_queue:group", "not a json")
+
+    # Act
+    item = await queue.dequeue("worker-1")
+
+    # Assert
+    assert item is None
+    assert await redis.llen("mduck:processing:worker-1") == 0
+
+
+@pytest.mark.asyncio
+async def test_reap_requeues_dead_consumer(
+    queue: MessageQueueRepository, redis: fakeredis.FakeAsyncRedis
+) -> None:
+    """Test that messages of a consumer without heartbeat return to the queue."""
+    # Arrange
+    await queue.enqueue(_message(1), max_size=10)
+    await queue.enqueue(_message(2), max_size=10)
+    assert await queue.dequeue("dead") is not None
+    await redis.delete("mduck:heartbeat:dead")
+
+    # Act
+    requeued = await queue.reap()
+
+    # Assert
+    assert requeued == 1
+    assert await queue.is_queued(1)
+    item = await queue.dequeue("alive")
+    assert item is not None
+    assert item.message.message.chat_id == 1
+    assert "dead" not in await redis.smembers("mduck:consumers")
+
+
+@pytest.mark.asyncio
+async def test_reap_keeps_alive_consumer(queue: MessageQueueRepository) -> None:
+    """Test that messages of an alive consumer stay in-flight."""
+    # Arrange
+    await queue.enqueue(_message(1), max_size=10)
+    assert await queue.dequeue("alive") is not None
+
+    # Act
+    requeued = await queue.reap()
+
+    # Assert
+    assert requeued == 0
+    assert await queue.is_queued(1)
+    assert await queue.dequeue("other") is None
+
+
+@pytest.mark.asyncio
+async def test_reap_releases_orphaned_chats(
+    queue: MessageQueueRepository, redis: fakeredis.FakeAsyncRedis
+) -> None:
+    """Test that chats without queued messages are released."""
+    # Arrange
+    await queue.enqueue(_message(1), max_size=10)
+    await redis.sadd("mduck:chats_in_queue", "42")
+
+    # Act
+    await queue.reap()
+
+    # Assert
+    assert await queue.is_queued(1)
+    assert not await queue.is_queued(42)
+
+
+@pytest.mark.asyncio
+async def test_enqueue_lane_size(queue: MessageQueueRepository) -> None:
+    """Test that the queue size is checked per lane."""
+    assert await queue.enqueue(_message(1), max_size=1) == EnqueueStatus.QUEUED
+    assert await queue.enqueue(_message(2), max_size=1) == EnqueueStatus.FULL
+    assert (
+        await queue.enqueue(_message(2, lane=QueueLane.DIRECT), max_size=1)
+        == EnqueueStatus.QUEUED
+    )
+    assert (await queue.stats())["lanes"] == {"direct": 1, "private": 0, "group": 1}
+
+
+@pytest.mark.asyncio
+@patch("mduck.repositories.queue.weighted_lane_order")
+async def test_dequeue_lane_order(
+    mock_order: MagicMock, queue: MessageQueueRepository
+) -> None:
+    """Test that lanes are polled in the weighted order."""
+    # Arrange
+    mock_order.return_value = [QueueLane.DIRECT, QueueLane.PRIVATE, QueueLane.GROUP]
+    await queue.enqueue(_message(1), max_size=10)
+    await queue.enqueue(_message(2, lane=QueueLane.PRIVATE), max_size=10)
+    await queue.enqueue(_message(3, lane=QueueLane.DIRECT), max_size=10)
+
+    # Act
+    items = [await queue.dequeue("worker-1") for _ in range(3)]
+
+    # Assert
+    assert [item.message.message.chat_id for item in items if item] == [3, 2, 1]
+
+
+@pytest.mark.asyncio
+async def test_dequeue_wakes_up_on_enqueue(queue: MessageQueueRepository) -> None:
+    """Test that a blocked consumer gets a message queued while waiting."""
+    # Arrange
+    dequeue = asyncio.create_task(queue.dequeue("worker-1"))
+    await asyncio.sleep(0.1)
+
+    # Act
+    await queue.enqueue(_message(1, lane=QueueLane.DIRECT), max_size=10)
+
+    # Assert
+    item = await dequeue
+    assert item is not None
+    assert item.message.lane == QueueLane.DIRECT
+
+
+@pytest.mark.asyncio
+async def test_requeue_returns_to_lane(
+    queue: MessageQueueRepository, redis: fakeredis.FakeAsyncRedis
+) -> None:
+    """Test that in-flight messages are returned to their own lanes."""
+    # Arrange
+    await queue.enqueue(_message(1, lane=QueueLane.PRIVATE), max_size=10)
+    assert await queue.dequeue("stopped") is not None
+
+    # Act
+    requeued = await queue.requeue("stopped")
+
+    # Assert
+    assert requeued == 1
+    assert await redis.llen("mduck:message_queue:private") == 1
+    assert await redis.llen("mduck:processing:stopped") == 0
+
+
+@pytest.mark.asyncio
+async def test_coalesce(redis: fakeredis.FakeAsyncRedis) -> None:
+    """Test that only the latest messages of a queued chat are buffered."""
+    # Arrange
+    queue = MessageQueueRepository(
+        redis=redis, visibility_timeout=2.0, dequeue_timeout=1, coalesce_size=2
+    )
+    assert not await queue.coalesce(_message(1, "before").message)
+    await queue.enqueue(_message(1), max_size=10)
+
+    # Act
+    for text in ("one", "two", "three"):
+        assert await queue.coalesce(_message(1, text).message)
+
+    # Assert
+    assert [m.text for m in await queue.take_coalesced(1)] == ["two", "three"]
+    assert await queue.take_coalesced(1) == []
+
+
+@pytest.mark.asyncio
+async def test_coalesce_disabled(redis: fakeredis.FakeAsyncRedis) -> None:
+    """Test that a message of a queued chat is dropped without the buffer."""
+    # Arrange
+    queue = MessageQueueRepository(
+        redis=redis, visibility_timeout=2.0, dequeue_timeout=1, coalesce_size=0
+    )
+    await queue.enqueue(_message(1), max_size=10)
+
+    # Act
+    status = await queue.enqueue(_message(1, "again"), max_size=10)
+
+    # Assert
+    assert status == EnqueueStatus.DUPLICATE
+    assert await queue.coalesce(_message(1, "more").message)
+    assert await queue.take_coalesced(1) == []
+
+
+@pytest.mark.asyncio
+async def test_ack_drops_buffer(
+    queue: MessageQueueRepository, redis: fakeredis.FakeAsyncRedis
+) -> None:
+    """Test that messages buffered during processing are dropped on ack."""
+    # Arrange
+    await queue.enqueue(_message(1), max_size=10)
+    item = await queue.dequeue("worker-1")
+    assert item is not None
+    await queue.coalesce(_message(1, "late").message)
+
+    # Act
+    await queue.ack("worker-1", item)
+
+    # Assert
+    assert not await redis.exists("mduck:chat_buffer:1")
+
+
+@pytest.mark.asyncio
+async def test_retry_is_promoted_when_due(
+    queue: MessageQueueRepository, redis: fakeredis.FakeAsyncRedis
+) -> None:
+    """Test that a delayed retry is dequeued again only once it is due."""
+    # Arrange
+    await queue.enqueue(_message(1, lane=QueueLane.PRIVATE), max_size=10)
+    item = await queue.dequeue("worker-1")
+    assert item is not None
+    retried = item.message.model_copy(update={"attempts": 1})
+
+    # Act
+    await queue.retry("worker-1", item, retried, delay=60)
+
+    # Assert
+    assert await redis.llen("mduck:processing:worker-1") == 0
+    assert await queue.is_queued(1)
+    stats = await queue.stats()
+    assert stats["retries"] == 1
+    assert stats["length"] == 0
+    assert await queue.reap() == 0
+    assert await queue.is_queued(1)
+
+    await redis.zadd("mduck:retry:private", {retried.model_dump_json(): 0})
+    again = await queue.dequeue("worker-1")
+    assert again is not None
+    assert again.message.attempts == 1
+    assert again.message.lane == QueueLane.PRIVATE
+    assert (await queue.stats())["retries"] == 0
+
+
+@pytest.mark.asyncio
+async def test_dead_letter_and_replay(
+    queue: MessageQueueRepository, redis: fakeredis.FakeAsyncRedis
+) -> None:
+    """Test that a dead letter releases its chat and can be replayed."""
+    # Arrange
+    await queue.enqueue(_message(1), max_size=10)
+    item = await queue.dequeue("worker-1")
+    assert item is not None
+    item.message.attempts = 3
+    await queue.coalesce(_message(1, "late").message)
+
+    # Act
+    await queue.dead_letter("worker-1", item, "RuntimeError('boom')")
+
+    # Assert
+    assert not await queue.is_queued(1)
+    assert not await redis.exists("mduck:chat_buffer:1")
+    assert await redis.llen("mduck:processing:worker-1") == 0
+    [dead_letter] = await queue.get_dead_letters()
+    assert dead_letter.error == "RuntimeError('boom')"
+    assert dead_letter.message.message.chat_id == 1
+    assert (await queue.stats())["dead_letters"] == 1
+
+    assert await queue.replay_dead_letters() == 1
+    assert await queue.get_dead_letters() == []
+    assert await queue.is_queued(1)
+    replayed = await queue.dequeue("worker-1")
+    assert replayed is not None
+    assert replayed.message.attempts == 0
+
+
+@pytest.mark.asyncio
+async def test_dead_letters_are_bounded(redis: fakeredis.FakeAsyncRedis) -> None:
+    """Test that only the latest dead letters are kept and replayed oldest first."""
+    # Arrange
+    queue = MessageQueueRepository(
+        redis=redis, visibility_timeout=2.0, dequeue_timeout=0, dead_letter_size=2
+    )
+    for chat_id in (1, 2, 3):
+        await queue.enqueue(_message(chat_id), max_size=10)
+        item = await queue.dequeue("worker-1")
+        assert item is not None
+        await queue.dead_letter("worker-1", item, "error")
+
+    # Act
+    dead_letters = await queue.get_dead_letters()
+    replayed = await queue.replay_dead_letters(count=1)
+
+    # Assert
+    assert [d.message.message.chat_id for d in dead_letters] == [3, 2]
+    assert replayed == 1
+    assert await queue.is_queued(2)
+    assert not await queue.is_queued(3)
+    assert [d.message.message.chat_id for d in await queue.get_dead_letters()] == [3]
+
+
+def test_weighted_lane_order() -> None:
+    """Test that every lane comes first proportionally to its weight."""
+    # Arrange
+    weights = {QueueLane.DIRECT: 8, QueueLane.PRIVATE: 1, QueueLane.GROUP: 1}
+
+    # Act
+    first = [weighted_lane_order(weights)[0] for _ in range(2000)]
+
+    # Assert
+    assert 0.75 < first.count(QueueLane.DIRECT) / len(first) < 0.85
+    assert first.count(QueueLane.GROUP) > 0
+
+
+def test_invalid_lane_weight() -> None:
+    """Test that lane weights must be positive."""
+    with pytest.raises(ValueError, match="Lane group weight must be positive"):
+        MessageQueueRepository(redis=MagicMock(spec=Redis), lane_weights={"group": 0})
+
+
+def test_invalid_timeouts() -> None:
+    """Test that dequeue timeout must be less than visibility timeout."""
+    with pytest.raises(ValueError, match="Dequeue timeout must be less"):
+        MessageQueueRepository(
+            redis=MagicMock(spec=Redis), visibility_timeout=1, dequeue_timeout=1
+        )
+
+
+def test_backend_without_hooks() -> None:
+    """Test that a queue backend must implement the lane and in-flight hooks."""
+
+    class LanelessQueueRepository(BaseQueueRepository):
+        def _lane_key(self, lane: QueueLane) -> str:
+            return lane.value
+
+    with pytest.raises(TypeError, match="_remove_in_flight"):
+        LanelessQueueRepository(redis=MagicMock(spec=Redis))  # type: ignore[abstract]
@@ -0,0 +1,91 @@
+from typing import AsyncIterator
+
+import fakeredis
+import pytest
+import pytest_asyncio
+from ollama import ChatResponse, Message
+
+from mduck.repositories.response_cache import ResponseCacheRepository, normalize_text
+
+
+@pytest_asyncio.fixture
+async def redis() -> AsyncIterator[fakeredis.FakeAsyncRedis]:
+    """Return an isolated fake redis client."""
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    yield client
+    await client.aclose()
+
+
+def _response(content: str) -> ChatResponse:
+    return ChatResponse(message=Message(role="assistant", content=content))
+
+
+@pytest.mark.asyncio
+async def test_get_after_all_variants(redis: fakeredis.FakeAsyncRedis) -> None:
+    """Test that a key is served only once all its variants are cached."""
+    # Arrange
+    cache = ResponseCacheRepository(redis=redis, variants=2)
+    await cache.put("duck.txt", "model", "LOL", _response("quack"))
+
+    # Act
+    first = await cache.get("duck.txt", "model", "lol")
+    await cache.put("duck.txt", "model", " lol ", _response("quack quack"))
+    second = await cache.get("duck.txt", "model", "Lol")
+
+    # Assert
+    assert first is None
+    assert second is not None
+    assert second.message.content in {"quack", "quack quack"}
+    assert await cache.get("other.txt", "model", "lol") is None
+    assert await cache.stats() == {"hits": 1, "misses": 2, "keys": 1}
+
+
+@pytest.mark.asyncio
+async def test_put_keeps_latest_variants(redis: fakeredis.FakeAsyncRedis) -> None:
+    """Test that only the latest variants are kept."""
+    # Arrange
+    cache = ResponseCacheRepository(redis=redis, variants=1)
+
+    # Act
+    await cache.put("duck.txt", "model", "ok", _response("old"))
+    await cache.put("duck.txt", "model", "ok", _response("new"))
+
+    # Assert
+    response = await cache.get("duck.txt", "model", "ok")
+    assert response is not None
+    assert response.message.content == "new"
+
+
+@pytest.mark.asyncio
+async def test_put_evicts_oldest_keys(redis: fakeredis.FakeAsyncRedis) -> None:
+    """Test that the least recently written keys are evicted over the limit."""
+    # Arrange
+    cache = ResponseCacheRepository(redis=redis, variants=1, max_keys=2)
+
+    # Act
+    for text in ("a", "b", "c"):
+        await cache.put("duck.txt", "model", text, _response(text))
+
+    # Assert
+    assert await cache.get("duck.txt", "model", "a") is None
+    assert await cache.get("duck.txt", "model", "c") is not None
+    assert (await cache.stats())["keys"] == 2
+
+
+@pytest.mark.asyncio
+async def test_long_text_is_not_cached(redis: fakeredis.FakeAsyncRedis) -> None:
+    """Test that long messages are not cached."""
+    # Arrange
+    cache = ResponseCacheRepository(redis=redis, variants=1, max_text_length=5)
+
+    # Act
+    await cache.put("duck.txt", "model", "too long", _response("quack"))
+
+    # Assert
+    assert await cache.get("duck.txt", "model", "too long") is None
+    assert (await cache.stats())["keys"] == 0
+
+
+def test_normalize_text() -> None:
+    """Test that case and whitespace differences are removed."""
+    assert normalize_text("  Hello \n  World ") == "hello world"
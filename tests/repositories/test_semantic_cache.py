@@ -0,0 +1,97 @@
+from typing import AsyncIterator
+
+import fakeredis
+import pytest
+import pytest_asyncio
+from ollama import ChatResponse, Message
+
+from mduck.repositories.semantic_cache import SemanticCacheRepository
+
+
+@pytest_asyncio.fixture
+async def redis() -> AsyncIterator[fakeredis.FakeAsyncRedis]:
+    """Return an isolated fake redis client."""
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    yield client
+    await client.aclose()
+
+
+def _response(content: str) -> ChatResponse:
+    return ChatResponse(message=Message(role="assistant", content=content))
+
+
+@pytest.mark.asyncio
+async def test_get_similar(redis: fakeredis.FakeAsyncRedis) -> None:
+    """Test that the response to the most similar message is reused."""
+    # Arrange
+    cache = SemanticCacheRepository(redis=redis, threshold=0.9)
+    await cache.put("duck.txt", "model", [1.0, 0.0, 0.0], _response("x"))
+    await cache.put("duck.txt", "model", [0.0, 1.0, 0.0], _response("y"))
+    await cache.put("other.txt", "model", [0.0, 0.0, 1.0], _response("z"))
+
+    # Act
+    similar = await cache.get("duck.txt", "model", [0.1, 2.0, 0.0])
+    other_template = await cache.get("duck.txt", "model", [0.0, 0.0, 1.0])
+    dissimilar = await cache.get("duck.txt", "model", [1.0, 1.0, 0.0])
+
+    # Assert
+    assert similar is not None
+    assert similar.message.content == "y"
+    assert other_template is None
+    assert dissimilar is None
+    assert await cache.stats() == {"hits": 1, "misses": 2, "size": 3}
+
+
+@pytest.mark.asyncio
+async def test_entries_survive_restart(redis: fakeredis.FakeAsyncRedis) -> None:
+    """Test that the entries are loaded from Redis by a new instance."""
+    # Arrange
+    await SemanticCacheRepository(redis=redis).put(
+        "duck.txt", "model", [0.6, 0.8], _response("quack")
+    )
+
+    # Act
+    response = await SemanticCacheRepository(redis=redis).get(
+        "duck.txt", "model", [0.6, 0.8]
+    )
+
+    # Assert
+    assert response is not None
+    assert response.message.content == "quack"
+
+
+@pytest.mark.asyncio
+async def test_size_is_bounded(redis: fakeredis.FakeAsyncRedis) -> None:
+    """Test that only the latest entries are kept."""
+    # Arrange
+    cache = SemanticCacheRepository(redis=redis, size=2)
+    await cache.get("duck.txt", "model", [1.0, 0.0, 0.0])
+
+    # Act
+    for index, content in enumerate("abc"):
+        embedding = [0.0, 0.0, 0.0]
+        embedding[index] = 1.0
+        await cache.put("duck.txt", "model", embedding, _response(content))
+
+    # Assert
+    assert await cache.get("duck.txt", "model", [1.0, 0.0, 0.0]) is None
+    assert await cache.get("duck.txt", "model", [0.0, 0.0, 1.0]) is not None
+    assert (await cache.stats())["size"] == 2
+
+
+@pytest.mark.asyncio
+async def test_put_other_dimension_resets(redis: fakeredis.FakeAsyncRedis) -> None:
+    """Test that a new embedding model replaces the old entries."""
+    # Arrange
+    cache = SemanticCacheRepository(redis=redis)
+    await cache.get("duck.txt", "model", [1.0, 0.0])
+    await cache.put("duck.txt", "model", [1.0, 0.0], _response("old"))
+
+    # Act
+    await cache.put("duck.txt", "model", [1.0, 0.0, 0.0], _response("new"))
+
+    # Assert
+    assert await cache.get("duck.txt", "model", [1.0, 0.0]) is None
+    response = await cache.get("duck.txt", "model", [1.0, 0.0, 0.0])
+    assert response is not None
+    assert response.message.content == "new"
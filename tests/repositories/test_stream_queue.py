@@ -0,0 +1,225 @@
+import asyncio
+from typing import AsyncIterator
+from unittest.mock import MagicMock, patch
+
+import fakeredis
+import pytest
+import pytest_asyncio
+from redis.asyncio import Redis
+
+from mduck.repositories.queue import EnqueueStatus
+from mduck.repositories.stream_queue import StreamQueueRepository
+from mduck.schemas.queue import (
+    MessagePayload,
+    QueueContext,
+    QueueLane,
+    QueueMessage,
+)
+
+
+@pytest_asyncio.fixture
+async def redis() -> AsyncIterator[fakeredis.FakeAsyncRedis]:
+    """Return an isolated fake redis client."""
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    yield client
+    await client.aclose()
+
+
+@pytest.fixture
+def queue(redis: fakeredis.FakeAsyncRedis) -> StreamQueueRepository:
+    """Return a stream queue repository."""
+    return StreamQueueRepository(redis=redis, visibility_timeout=2.0, dequeue_timeout=1)
+
+
+def _message(
+    chat_id: int, text: str = "hello", lane: QueueLane = QueueLane.GROUP
+) -> QueueMessage:
+    return QueueMessage(
+        message=MessagePayload(
+            chat_id=chat_id, message_id=1, text=text, chat_type="private"
+        ),
+        context=QueueContext(),
+        lane=lane,
+    )
+
+
+@pytest.mark.asyncio
+async def test_enqueue_dequeue_ack(queue: StreamQueueRepository) -> None:
+    """Test that an entry stays pending until acknowledged."""
+    # Arrange
+    assert await queue.enqueue(_message(1), max_size=10) == EnqueueStatus.QUEUED
+    assert await queue.enqueue(_message(1), max_size=10) == EnqueueStatus.COALESCED
+    assert await queue.enqueue(_message(2), max_size=10) == EnqueueStatus.QUEUED
+
+    # Act
+    item = await queue.dequeue("worker-1")
+
+    # Assert
+    assert item is not None
+    assert item.entry_id
+    assert item.message.message.chat_id == 1
+    stats = await queue.stats()
+    assert stats["length"] == 2
+    assert stats["pending"] == 1
+    assert stats["chats"] == 2
+
+    assert [m.text for m in await queue.take_coalesced(1)] == ["hello"]
+    await queue.ack("worker-1", item)
+    assert not await queue.is_queued(1)
+    assert await queue.size() == 1
+    assert (await queue.stats())["length"] == 1
+
+
+@pytest.mark.asyncio
+async def test_enqueue_full(queue: StreamQueueRepository) -> None:
+    """Test that the queue size is respected."""
+    assert await queue.enqueue(_message(1), max_size=1) == EnqueueStatus.QUEUED
+    assert await queue.enqueue(_message(2), max_size=1) == EnqueueStatus.FULL
+
+
+@pytest.mark.asyncio
+async def test_dequeue_timeout(queue: StreamQueueRepository) -> None:
+    """Test that dequeue returns None on an empty stream."""
+    assert await queue.dequeue("worker-1") is None
+
+
+@pytest.mark.asyncio
+async def test_dequeue_claims_abandoned_entry(
+    redis: fakeredis.FakeAsyncRedis,
+) -> None:
+    """Test that an idle pending entry is claimed by another consumer."""
+    # Arrange
+    queue = StreamQueueRepository(
+        redis=redis, visibility_timeout=0.001, dequeue_timeout=0
+    )
+    await queue.enqueue(_message(1), max_size=10)
+    first = await queue.dequeue("dead")
+    assert first is not None
+    await asyncio.sleep(0.01)
+
+    # Act
+    second = await queue.dequeue("alive")
+
+    # Assert
+    assert second is not None
+    assert second.entry_id == first.entry_id
+
+
+@pytest.mark.asyncio
+async def test_requeue(queue: StreamQueueRepository) -> None:
+    """Test that pending entries of a consumer are delivered again."""
+    # Arrange
+    await queue.enqueue(_message(1), max_size=10)
+    assert await queue.dequeue("stopped") is not None
+
+    # Act
+    requeued = await queue.requeue("stopped")
+
+    # Assert
+    assert requeued == 1
+    assert await queue.is_queued(1)
+    item = await queue.dequeue("other")
+    assert item is not None
+    assert item.message.message.chat_id == 1
+
+
+@pytest.mark.asyncio
+async def test_reap_releases_orphaned_chats(
+    queue: StreamQueueRepository, redis: fakeredis.FakeAsyncRedis
+) -> None:
+    """Test that chats without stream entries are released."""
+    # Arrange
+    await queue.enqueue(_message(1), max_size=10)
+    await redis.sadd("mduck:chats_in_queue", "42")
+
+    # Act
+    assert await queue.reap() == 0
+
+    # Assert
+    assert await queue.is_queued(1)
+    assert not await queue.is_queued(42)
+
+
+@pytest.mark.asyncio
+@patch("mduck.repositories.stream_queue.weighted_lane_order")
+async def test_dequeue_lane_order(
+    mock_order: MagicMock, queue: StreamQueueRepository
+) -> None:
+    """Test that lane streams are read in the weighted order."""
+    # Arrange
+    mock_order.return_value = [QueueLane.DIRECT, QueueLane.PRIVATE, QueueLane.GROUP]
+    await queue.enqueue(_message(1), max_size=10)
+    await queue.enqueue(_message(2, lane=QueueLane.DIRECT), max_size=10)
+
+    # Act
+    first = await queue.dequeue("worker-1")
+    second = await queue.dequeue("worker-1")
+
+    # Assert
+    assert first is not None
+    assert first.message.lane == QueueLane.DIRECT
+    assert second is not None
+    assert second.message.lane == QueueLane.GROUP
+    stats = await queue.stats()
+    assert stats["lanes"]["direct"]["pending"] == 1
+    assert stats["lanes"]["group"]["pending"] == 1
+
+    await queue.ack("worker-1", first)
+    assert (await queue.stats())["lanes"]["direct"]["length"] == 0
+
+
+@pytest.mark.asyncio
+async def test_dequeue_wakes_up_on_enqueue(queue: StreamQueueRepository) -> None:
+    """Test that a blocked consumer gets a message queued while waiting."""
+    # Arrange
+    dequeue = asyncio.create_task(queue.dequeue("worker-1"))
+    await asyncio.sleep(0.1)
+
+    # Act
+    await queue.enqueue(_message(1, lane=QueueLane.PRIVATE), max_size=10)
+
+    # Assert
+    item = await dequeue
+    assert item is not None
+    assert item.message.lane == QueueLane.PRIVATE
+
+
+@pytest.mark.asyncio
+async def test_retry_and_dead_letter(
+    queue: StreamQueueRepository, redis: fakeredis.FakeAsyncRedis
+) -> None:
+    """Test that a retried entry is delivered again and dead-lettered after."""
+    # Arrange
+    await queue.enqueue(_message(1, lane=QueueLane.DIRECT), max_size=10)
+    item = await queue.dequeue("worker-1")
+    assert item is not None
+
+    # Act
+    await queue.retry(
+        "worker-1", item, item.message.model_copy(update={"attempts": 1}), delay=0
+    )
+    retried = await queue.dequeue("worker-1")
+    assert retried is not None
+    await queue.dead_letter("worker-1", retried, "error")
+
+    # Assert
+    assert retried.message.attempts == 1
+    assert retried.message.lane == QueueLane.DIRECT
+    assert not await queue.is_queued(1)
+    stats = await queue.stats()
+    assert stats["length"] == 0
+    assert stats["pending"] == 0
+    assert stats["retries"] == 0
+    assert stats["dead_letters"] == 1
+    assert await queue.replay_dead_letters() == 1
+    replayed = await queue.dequeue("worker-1")
+    assert replayed is not None
+    assert replayed.message.attempts == 0
+
+
+def test_invalid_timeouts() -> None:
+    """Test that dequeue timeout must be less than visibility timeout."""
+    with pytest.raises(ValueError, match="Dequeue timeout must be less"):
+        StreamQueueRepository(
+            redis=MagicMock(spec=Redis), visibility_timeout=1, dequeue_timeout=1
+        )
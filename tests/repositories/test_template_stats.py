@@ -0,0 +1,89 @@
+from typing import AsyncIterator
+
+import fakeredis
+import pytest
+import pytest_asyncio
+from ollama import ChatResponse, Message
+
+from mduck.repositories.template_stats import TemplateStatsRepository
+
+
+@pytest_asyncio.fixture
+async def redis() -> AsyncIterator[fakeredis.FakeAsyncRedis]:
+    """Return an isolated fake redis client."""
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    yield client
+    await client.aclose()
+
+
+def _response(prompt_tokens: int, eval_count: int, seconds: float) -> ChatResponse:
+    return ChatResponse(
+        message=Message(role="assistant", content="quack"),
+        prompt_eval_count=prompt_tokens,
+        eval_count=eval_count,
+        total_duration=int(seconds * 1e9),
+    )
+
+
+@pytest.mark.asyncio
+async def test_get_all(redis: fakeredis.FakeAsyncRedis) -> None:
+    """Test that the samples are aggregated per template."""
+    # Arrange
+    stats = TemplateStatsRepository(redis=redis)
+    await stats.record("duck.txt", _response(100, 50, 2.0))
+    await stats.record("duck.txt", _response(120, 70, 4.0))
+    await stats.record("duck.txt", None)
+    await stats.record("goose.txt", _response(300, 200, 10.0))
+
+    # Act
+    result = await stats.get_all()
+
+    # Assert
+    assert list(result) == ["duck.txt", "goose.txt"]
+    assert result["duck.txt"].model_dump() == {
+        "template": "duck.txt",
+        "samples": 3,
+        "failures": 1,
+        "prompt_tokens": 110.0,
+        "eval_count": 60.0,
+        "duration": 3.0,
+        "failure_rate": pytest.approx(1 / 3),
+    }
+    assert result["goose.txt"].failure_rate == 0.0
+
+
+@pytest.mark.asyncio
+async def test_record_keeps_latest_samples(redis: fakeredis.FakeAsyncRedis) -> None:
+    """Test that only the latest samples are kept."""
+    # Arrange
+    stats = TemplateStatsRepository(redis=redis, window=2)
+
+    # Act
+    await stats.record("duck.txt", None)
+    await stats.record("duck.txt", _response(100, 50, 2.0))
+    await stats.record("duck.txt", _response(100, 70, 4.0))
+
+    # Assert
+    result = (await stats.get_all())["duck.txt"]
+    assert result.samples == 2
+    assert result.failures == 0
+    assert result.eval_count == 60.0
+
+
+@pytest.mark.asyncio
+async def test_get_all_skips_malformed_samples(
+    redis: fakeredis.FakeAsyncRedis,
+) -> None:
+    """Test that malformed samples are ignored."""
+    # Arrange
+    stats = TemplateStatsRepository(redis=redis)
+    await stats.record("duck.txt", None)
+    await redis.lpush("mduck:template_stats:duck.txt", "garbage")
+
+    # Act
+    result = (await stats.get_all())["duck.txt"]
+
+    # Assert
+    assert result.samples == 1
+    assert result.failure_rate == 1.0
+    assert result.duration is None
@@ -0,0 +1,83 @@
+from typing import AsyncIterator
+from unittest.mock import AsyncMock, MagicMock
+
+import fakeredis
+import pytest
+import pytest_asyncio
+from redis.asyncio import Redis
+from redis.exceptions import ConnectionError
+
+from mduck.repositories.updates import UpdateDedupRepository
+
+
+@pytest_asyncio.fixture
+async def redis() -> AsyncIterator[fakeredis.FakeAsyncRedis]:
+    """Return an isolated fake redis client."""
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    yield client
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_claim_once(redis: fakeredis.FakeAsyncRedis) -> None:
+    """Test that an update is claimed only by the first delivery."""
+    # Arrange
+    dedup = UpdateDedupRepository(redis=redis, ttl=60)
+    other_replica = UpdateDedupRepository(redis=redis, ttl=60)
+
+    # Act & Assert
+    assert await dedup.claim(1)
+    assert not await dedup.claim(1)
+    assert not await other_replica.claim(1)
+    assert await other_replica.claim(2)
+    assert 0 < await redis.pttl("mduck:update:1") <= 60000
+
+
+@pytest.mark.asyncio
+async def test_claim_cached_skips_redis() -> None:
+    """Test that a redelivery to the same process does not reach Redis."""
+    # Arrange
+    redis = MagicMock(spec=Redis)
+    redis.set = AsyncMock(return_value=True)
+    dedup = UpdateDedupRepository(redis=redis, cache_size=2)
+
+    # Act
+    for update_id in (1, 2, 1, 3, 2):
+        await dedup.claim(update_id)
+
+    # Assert
+    assert [call.args[0] for call in redis.set.call_args_list] == [
+        "mduck:update:1",
+        "mduck:update:2",
+        "mduck:update:3",
+        "mduck:update:2",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_release(redis: fakeredis.FakeAsyncRedis) -> None:
+    """Test that a released update can be claimed again."""
+    # Arrange
+    dedup = UpdateDedupRepository(redis=redis)
+    other_replica = UpdateDedupRepository(redis=redis)
+    await dedup.claim(1)
+
+    # Act
+    await dedup.release(1)
+
+    # Assert
+    assert await dedup.claim(1)
+    await dedup.release(1)
+    assert await other_replica.claim(1)
+
+
+@pytest.mark.asyncio
+async def test_claim_redis_error() -> None:
+    """Test that updates are processed when Redis is unavailable."""
+    # Arrange
+    redis = MagicMock(spec=Redis)
+    redis.set = AsyncMock(side_effect=ConnectionError("down"))
+    dedup = UpdateDedupRepository(redis=redis)
+
+    # Act & Assert
+    assert await dedup.claim(1)
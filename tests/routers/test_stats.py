@@ -0,0 +1,38 @@
+"""Tests for the stats router."""
+
+from fastapi.testclient import TestClient
+
+
+def test_stats(client: TestClient) -> None:
+    """Test the /stats endpoint."""
+    # Act
+    response = client.get("/stats")
+
+    # Assert
+    assert response.status_code == 200
+    response_json = response.json()
+    assert response_json["queue"]["backend"] == "list"
+    assert response_json["admission"]["decision"] == "admit"
+    assert response_json["admission"]["decisions"] == {
+        "admit": 0,
+        "scale": 0,
+        "shed": 0,
+    }
+    assert response_json["response_cache"] == {"hits": 0, "misses": 0, "keys": 0}
+    assert response_json["semantic_cache"] == {"hits": 0, "misses": 0, "size": 0}
+    assert [host["url"] for host in response_json["ollama"]] == ["http://ollama:11434"]
+    assert response_json["circuit_breaker"] == "closed"
+    assert response_json["models"] == {
+        "test_model": {"requests": 0, "tps": None, "eval_count": None}
+    }
+    assert response_json["prefix_cache"] == {}
+
+
+def test_template_stats(client: TestClient) -> None:
+    """Test the /stats/templates endpoint."""
+    # Act
+    response = client.get("/stats/templates")
+
+    # Assert
+    assert response.status_code == 200
+    assert response.json() == []
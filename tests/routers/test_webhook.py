@@ -1,5 +1,6 @@
 """Tests for the webhook router."""
 
+import pytest
 from fastapi.testclient import TestClient
 
 from mduck.containers.application import ApplicationContainer
@@ -47,3 +48,58 @@ def test_webhook_success(client: TestClient, container: ApplicationContainer) ->
     call_args, _ = dispatcher_mock.feed_webhook_update.call_args
     assert call_args[0] is container.gateways.bot()
     assert call_args[1] == update_payload
+
+
+def test_webhook_duplicate_update(
+    client: TestClient, container: ApplicationContainer
+) -> None:
+    """Test that a redelivered update is acknowledged but not handled."""
+    # Arrange
+    key = container.config.tg.webhook.key()
+    secret = container.config.tg.webhook.secret()
+    dispatcher_mock = container.dispatcher()
+    update_payload = {"update_id": 456, "message": {"text": "hello"}}
+
+    # Act
+    responses = [
+        client.post(
+            f"/webhook/{key}",
+            headers={"X-Telegram-Bot-Api-Secret-Token": secret},
+            json=update_payload,
+        )
+        for _ in range(2)
+    ]
+
+    # Assert
+    assert [r.status_code for r in responses] == [200, 200]
+    assert [r.json()["status"] for r in responses] == ["ok", "duplicate"]
+    dispatcher_mock.feed_webhook_update.assert_called_once()
+
+
+def test_webhook_failed_update_released(
+    client: TestClient, container: ApplicationContainer
+) -> None:
+    """Test that an update failing to be handled is handled on redelivery."""
+    # Arrange
+    key = container.config.tg.webhook.key()
+    secret = container.config.tg.webhook.secret()
+    dispatcher_mock = container.dispatcher()
+    dispatcher_mock.feed_webhook_update.side_effect = [RuntimeError("boom"), None]
+    update_payload = {"update_id": 789, "message": {"text": "hello"}}
+
+    # Act
+    with pytest.raises(RuntimeError):
+        client.post(
+            f"/webhook/{key}",
+            headers={"X-Telegram-Bot-Api-Secret-Token": secret},
+            json=update_payload,
+        )
+    response = client.post(
+        f"/webhook/{key}",
+        headers={"X-Telegram-Bot-Api-Secret-Token": secret},
+        json=update_payload,
+    )
+
+    # Assert
+    assert response.json()["status"] == "ok"
+    assert dispatcher_mock.feed_webhook_update.call_count == 2
@@ -0,0 +1,115 @@
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from ollama import ChatResponse, Message
+
+from mduck.repositories.latency import LatencyRepository
+from mduck.repositories.queue import MessageQueueRepository
+from mduck.schemas.admission import AdmissionDecision
+from mduck.schemas.queue import QueueLane
+from mduck.services.admission import AdmissionController
+
+
+def _latency(latencies: list[float]) -> MagicMock:
+    latency = MagicMock(spec=LatencyRepository)
+    latency.get_latest = AsyncMock(return_value=latencies)
+    return latency
+
+
+def _controller(
+    queue_size: int, latencies: list[float], latency: MagicMock | None = None
+) -> AdmissionController:
+    queue = MagicMock(spec=MessageQueueRepository)
+    queue.size = AsyncMock(return_value=queue_size)
+    return AdmissionController(
+        queue=queue,
+        latency=latency or _latency(latencies),
+        target_wait=60.0,
+        shed_ratio=2.0,
+        concurrency=2,
+        refresh_interval=60.0,
+    )
+
+
+@pytest.mark.asyncio
+async def test_admit_below_target() -> None:
+    """Test that probabilities are kept while the expected wait is low."""
+    # Arrange
+    controller = _controller(queue_size=4, latencies=[10.0, 20.0])
+
+    # Act
+    probability = await controller.scale_probability(QueueLane.GROUP, 0.5)
+
+    # Assert
+    assert probability == 0.5
+    state = controller.state
+    assert state.mean_latency == 15.0
+    assert state.expected_wait == 30.0
+    assert state.decision == AdmissionDecision.ADMIT
+    assert state.decisions[AdmissionDecision.ADMIT] == 1
+
+
+@pytest.mark.asyncio
+async def test_scale_above_target() -> None:
+    """Test that probabilities are scaled down above the target wait."""
+    # Arrange
+    controller = _controller(queue_size=6, latencies=[30.0])
+
+    # Act
+    probability = await controller.scale_probability(QueueLane.PRIVATE, 0.5)
+
+    # Assert
+    assert probability == pytest.approx(0.5 * 60 / 90)
+    assert controller.state.decision == AdmissionDecision.SCALE
+
+
+@pytest.mark.asyncio
+async def test_shed_load() -> None:
+    """Test that random picks are shed, direct messages are admitted."""
+    # Arrange
+    controller = _controller(queue_size=10, latencies=[30.0])
+
+    # Act
+    group = await controller.scale_probability(QueueLane.GROUP, 0.5)
+    direct = await controller.scale_probability(QueueLane.DIRECT, 1.0)
+
+    # Assert
+    assert group == 0.0
+    assert direct == 1.0
+    assert controller.state.decision == AdmissionDecision.SHED
+    assert controller.state.decisions[AdmissionDecision.SHED] == 1
+
+
+@pytest.mark.asyncio
+async def test_refresh_is_cached() -> None:
+    """Test that the load is estimated once per refresh interval."""
+    # Arrange
+    latency = _latency([])
+    controller = _controller(queue_size=1, latencies=[], latency=latency)
+
+    # Act
+    for _ in range(3):
+        await controller.scale_probability(QueueLane.GROUP, 0.5)
+
+    # Assert
+    assert controller.state.expected_wait is None
+    assert controller.state.decisions[AdmissionDecision.ADMIT] == 3
+    latency.get_latest.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_record() -> None:
+    """Test that the total duration of a response is recorded in seconds."""
+    # Arrange
+    latency = MagicMock(spec=LatencyRepository)
+    controller = AdmissionController(
+        queue=MagicMock(spec=MessageQueueRepository), latency=latency
+    )
+
+    # Act
+    message = Message(role="assistant", content="quack")
+    await controller.record(ChatResponse(message=message, total_duration=2_500_000_000))
+    await controller.record(ChatResponse(message=message))
+
+    # Assert
+    latency.record.assert_awaited_once_with(2.5)
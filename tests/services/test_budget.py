@@ -0,0 +1,124 @@
+import pytest
+
+from mduck.schemas.ollama import Turn
+from mduck.services.budget import TokenBudget
+
+
+def test_num_predict_without_history() -> None:
+    """Test the max reply budget applies to a template without history."""
+    budget = TokenBudget(max_predict=512, min_predict=64)
+
+    assert budget.get_num_predict("duck.txt") == 512
+    assert budget.get_num_predict("duck.txt", load_factor=0.5) == 288
+    assert budget.get_num_predict("duck.txt", load_factor=0.0) == 64
+
+
+def test_num_predict_from_history() -> None:
+    """Test the reply budget follows the typical reply length of the template."""
+    # Arrange
+    budget = TokenBudget(max_predict=512, min_predict=64, window=10)
+    for eval_count in [100, 80, 120, 90, 110, 95, 105, 85, 115, 600]:
+        budget.record("duck.txt", eval_count)
+    budget.record("duck.txt", None)
+
+    # Act & Assert
+    assert budget.get_typical_length("duck.txt") == 120
+    assert budget.get_num_predict("duck.txt") == 180
+    assert budget.get_num_predict("duck.txt", load_factor=0.1) == 109
+    assert budget.get_num_predict("other.txt") == 512
+
+
+def test_num_predict_never_below_min() -> None:
+    """Test a template with short replies still gets the min budget."""
+    budget = TokenBudget(max_predict=512, min_predict=64)
+    budget.record("duck.txt", 10)
+
+    assert budget.get_num_predict("duck.txt") == 64
+
+
+def test_num_predict_window() -> None:
+    """Test only the recent reply lengths make the typical length."""
+    budget = TokenBudget(window=2)
+    for eval_count in [500, 100, 100]:
+        budget.record("duck.txt", eval_count)
+
+    assert budget.get_typical_length("duck.txt") == 100
+
+
+def test_num_predict_recovers_after_load_spike() -> None:
+    """Test replies cut under load do not shrink the idle reply budget."""
+    budget = TokenBudget(max_predict=512, min_predict=64)
+    for _ in range(10):
+        budget.record("duck.txt", 200)
+    loaded_num_predict = budget.get_num_predict("duck.txt", load_factor=0.0)
+
+    for _ in range(50):
+        budget.record("duck.txt", loaded_num_predict, num_predict=loaded_num_predict)
+
+    assert loaded_num_predict == 64
+    assert budget.get_num_predict("duck.txt") == 300
+
+
+@pytest.mark.parametrize(
+    ("prompt", "load_factor", "expected"),
+    [
+        ("short", 1.0, "short"),
+        ("one two three four five", 1.0, "…three four five"),
+        ("one two three four five", 0.0, "…five"),
+        ("onetwothreefourfivesix", 1.0, "…threefourfivesix"),
+        ("one two\nthree fourfive", 1.0, "…three fourfive"),
+    ],
+)
+def test_truncate_prompt(prompt: str, load_factor: float, expected: str) -> None:
+    """Test the prompt keeps its latest words within the budget."""
+    budget = TokenBudget(max_prompt_tokens=4, min_prompt_tokens=2)
+
+    assert budget.truncate_prompt(prompt, load_factor) == expected
+
+
+@pytest.mark.parametrize(
+    ("load_factor", "expected"),
+    [(1.0, ["one", "two", "six"]), (0.5, ["six"]), (0.0, [])],
+)
+def test_trim_history(load_factor: float, expected: list[str]) -> None:
+    """Test the history keeps its latest whole turns within the budget."""
+    budget = TokenBudget(max_history_tokens=4)
+    turns = [
+        Turn(role="user", content="one"),
+        Turn(role="assistant", content="two"),
+        Turn(role="user", content="six"),
+    ]
+
+    trimmed = budget.trim_history(turns, load_factor)
+
+    assert [turn.content for turn in trimmed] == expected
+
+
+def test_trim_history_keeps_start() -> None:
+    """Test the history start moves by half of the budget, to a user turn."""
+    # Arrange
+    budget = TokenBudget(max_history_tokens=6)
+    turns = [
+        Turn(role="user" if i % 2 == 0 else "assistant", content=f"t{i}")
+        for i in range(10, 30)
+    ]
+
+    # Act
+    starts = [
+        budget.trim_history(turns[:size])[0].content
+        for size in range(1, len(turns) + 1)
+    ]
+
+    # Assert
+    assert starts == ["t10"] * 8 + ["t14"] * 4 + ["t18"] * 4 + ["t22"] * 4
+    assert budget.trim_history(turns[1:6]) == turns[2:6]
+
+
+def test_invalid_budget() -> None:
+    """Test the min budget must not exceed the max one."""
+    with pytest.raises(ValueError, match="Reply budget"):
+        TokenBudget(max_predict=10, min_predict=20)
+    with pytest.raises(ValueError, match="Prompt budget"):
+        TokenBudget(max_prompt_tokens=10, min_prompt_tokens=0)
+    with pytest.raises(ValueError, match="History budget"):
+        TokenBudget(max_history_tokens=10, min_history_tokens=20)
@@ -0,0 +1,975 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, cast
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
+import pytest
+from aiogram import types
+from ollama import ChatResponse, Message
+
+from mduck.repositories.circuit_breaker import CircuitOpenError
+from mduck.repositories.conversation import ConversationRepository
+from mduck.repositories.ollama import OllamaRepository
+from mduck.repositories.queue import EnqueueStatus, MessageQueueRepository
+from mduck.repositories.response_cache import ResponseCacheRepository
+from mduck.repositories.semantic_cache import SemanticCacheRepository
+from mduck.schemas.admission import AdmissionDecision, AdmissionState
+from mduck.schemas.cache import ResponseCachePolicy
+from mduck.schemas.ollama import Turn
+from mduck.schemas.queue import MessagePayload, QueueItem, QueueLane, QueueMessage
+from mduck.services.admission import AdmissionController
+from mduck.services.budget import TokenBudget
+from mduck.services.mduck import MDuckService
+from mduck.services.retry import RetryPolicy
+from mduck.services.templates import TemplateSelector
+
+
+@pytest.fixture
+def queue_mock() -> MagicMock:
+    """Return a mock message queue repository."""
+    queue = MagicMock(spec=MessageQueueRepository)
+    queue.enqueue.return_value = EnqueueStatus.QUEUED
+    queue.is_queued.return_value = False
+    queue.coalesce.return_value = False
+    queue.take_coalesced.return_value = []
+    return queue
+
+
+@pytest.fixture
+def mduck(bot_mock: MagicMock, queue_mock: MagicMock) -> MDuckService:
+    """Return a MDuckService with mocked dependencies."""
+    bot_mock.id = 1
+    bot_mock.me = AsyncMock(return_value=MagicMock(username="mduckbot"))
+    ollama = MagicMock(spec=OllamaRepository)
+    ollama.is_circuit_open.return_value = False
+    return MDuckService(
+        bot=bot_mock,
+        ollama_repository=ollama,
+        queue=queue_mock,
+        response_probability_private=0.5,
+        response_probability_group=0.5,
+        response_probability_supergroup=0.5,
+        max_queue_size=3,
+        lane_max_queue_sizes={"direct": 5, "private": None, "group": None},
+    )
+
+
+def _message(text: str = "hello duck", chat_type: str = "group") -> AsyncMock:
+    message = AsyncMock(spec=types.Message)
+    message.text = text
+    message.message_id = 10
+    message.chat = MagicMock(id=100, type=chat_type)
+    message.reply_to_message = None
+    return message
+
+
+@pytest.mark.asyncio
+@patch("mduck.services.mduck.random.random", return_value=0.1)
+@patch("mduck.services.mduck.random.choice", return_value=True)
+async def test_handle_incoming_message_queued(
+    mock_choice: MagicMock,
+    mock_random: MagicMock,
+    mduck: MDuckService,
+    queue_mock: MagicMock,
+) -> None:
+    """Test that a selected message is queued in a single call."""
+    # Act
+    await mduck.handle_incoming_message(_message())
+
+    # Assert
+    queue_mock.enqueue.assert_awaited_once()
+    queued, max_size = queue_mock.enqueue.call_args.args
+    assert queued.message.chat_id == 100
+    assert queued.message.text == "hello duck"
+    assert queued.lane == QueueLane.GROUP
+    assert max_size == 3
+    queue_mock.coalesce.assert_not_called()
+
+
+@pytest.mark.asyncio
+@patch("mduck.services.mduck.random.random", return_value=0.99)
+@patch("mduck.services.mduck.random.choice", return_value=True)
+async def test_handle_incoming_message_direct_lane(
+    mock_choice: MagicMock,
+    mock_random: MagicMock,
+    mduck: MDuckService,
+    queue_mock: MagicMock,
+) -> None:
+    """Test that a mention of the bot is queued to the direct lane."""
+    # Act
+    await mduck.handle_incoming_message(_message("@mduckbot hello", "private"))
+
+    # Assert
+    queued, max_size = queue_mock.enqueue.call_args.args
+    assert queued.lane == QueueLane.DIRECT
+    assert max_size == 5
+
+
+@pytest.mark.asyncio
+@patch("mduck.services.mduck.random.random", return_value=0.1)
+@patch("mduck.services.mduck.random.choice", return_value=True)
+async def test_handle_incoming_message_private_lane(
+    mock_choice: MagicMock,
+    mock_random: MagicMock,
+    mduck: MDuckService,
+    queue_mock: MagicMock,
+) -> None:
+    """Test that a private chat message is queued to the private lane."""
+    # Act
+    await mduck.handle_incoming_message(_message(chat_type="private"))
+
+    # Assert
+    queued, max_size = queue_mock.enqueue.call_args.args
+    assert queued.lane == QueueLane.PRIVATE
+    assert max_size == 3
+
+
+@pytest.mark.asyncio
+@patch("mduck.services.mduck.random.random", return_value=0.1)
+@patch("mduck.services.mduck.random.choice", return_value=True)
+async def test_handle_incoming_message_queue_full(
+    mock_choice: MagicMock,
+    mock_random: MagicMock,
+    mduck: MDuckService,
+    queue_mock: MagicMock,
+) -> None:
+    """Test that a sticker is sent when the queue is full."""
+    # Arrange
+    queue_mock.enqueue.return_value = EnqueueStatus.FULL
+    message = _message()
+
+    # Act
+    with patch.object(mduck, "send_random_sticker") as send_sticker:
+        await mduck.handle_incoming_message(message)
+
+    # Assert
+    send_sticker.assert_awaited_once_with(message)
+
+
+@pytest.mark.asyncio
+@patch("mduck.services.mduck.random.random", return_value=0.1)
+@patch("mduck.services.mduck.random.choice", return_value=True)
+async def test_handle_incoming_message_circuit_open(
+    mock_choice: MagicMock,
+    mock_random: MagicMock,
+    mduck: MDuckService,
+    queue_mock: MagicMock,
+) -> None:
+    """Test that a sticker is sent instead of queueing while Ollama is down."""
+    # Arrange
+    cast(MagicMock, mduck._ollama_repository).is_circuit_open.return_value = True
+    message = _message()
+
+    # Act
+    with patch.object(mduck, "send_random_sticker") as send_sticker:
+        await mduck.handle_incoming_message(message)
+
+    # Assert
+    send_sticker.assert_awaited_once_with(message)
+    queue_mock.enqueue.assert_not_called()
+
+
+@pytest.mark.asyncio
+@patch("mduck.services.mduck.random.random", return_value=0.1)
+@patch("mduck.services.mduck.random.choice", return_value=True)
+async def test_handle_incoming_message_duplicate(
+    mock_choice: MagicMock,
+    mock_random: MagicMock,
+    mduck: MDuckService,
+    queue_mock: MagicMock,
+) -> None:
+    """Test that nothing is sent when the chat is already queued."""
+    # Arrange
+    queue_mock.enqueue.return_value = EnqueueStatus.DUPLICATE
+    message = _message()
+
+    # Act
+    with patch.object(mduck, "send_random_sticker") as send_sticker:
+        await mduck.handle_incoming_message(message)
+
+    # Assert
+    send_sticker.assert_not_called()
+    message.answer.assert_not_called()
+
+
+@pytest.mark.asyncio
+@patch("mduck.services.mduck.random.random", return_value=0.9)
+async def test_handle_incoming_message_skipped_while_queued(
+    mock_random: MagicMock, mduck: MDuckService, queue_mock: MagicMock
+) -> None:
+    """Test that a skipped message is coalesced while the chat is queued."""
+    # Arrange
+    queue_mock.coalesce.return_value = True
+    message = _message(chat_type="private")
+
+    # Act
+    await mduck.handle_incoming_message(message)
+
+    # Assert
+    queue_mock.enqueue.assert_not_called()
+    assert queue_mock.coalesce.call_args.args[0].text == "hello duck"
+    message.answer.assert_not_called()
+    message.answer_sticker.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_process_queue_item_coalesced(
+    mduck: MDuckService, queue_mock: MagicMock, bot_mock: MagicMock
+) -> None:
+    """Test that coalesced messages are answered with a single generation."""
+    # Arrange
+    queued = QueueMessage(
+        message=MessagePayload(
+            chat_id=100, message_id=1, text="@mduckbot first", chat_type="group"
+        )
+    )
+    item = QueueItem(raw="", message=queued)
+    queue_mock.take_coalesced.return_value = [
+        MessagePayload(chat_id=100, message_id=2, text="second", chat_type="group"),
+        MessagePayload(chat_id=100, message_id=3, text="third", chat_type="group"),
+    ]
+    ollama = cast(MagicMock, mduck._ollama_repository)
+    ollama.generate_response = AsyncMock(
+        return_value=(
+            "template",
+            ChatResponse(message=Message(role="assistant", content="quack")),
+        )
+    )
+
+    # Act
+    await mduck.process_queue_item("worker-1", item)
+
+    # Assert
+    ollama.generate_response.assert_awaited_once_with(
+        "first\nsecond\nthird",
+        on_chunk=None,
+        template=ollama.choose_template.return_value,
+        model=ollama.choose_model.return_value,
+        num_predict=None,
+        history=[],
+    )
+    assert bot_mock.send_message.call_args.kwargs["reply_to_message_id"] == 3
+    queue_mock.ack.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_process_queue_item_drops_stale_message(
+    mduck: MDuckService, queue_mock: MagicMock
+) -> None:
+    """Test that a message older than the max age is dropped unanswered."""
+    # Arrange
+    mduck._max_message_age = 60
+    queued = QueueMessage(
+        message=MessagePayload(chat_id=100, message_id=1, text="hi", chat_type="group"),
+        enqueued_at=time.time() - 61,
+    )
+    item = QueueItem(raw="", message=queued)
+
+    # Act
+    with patch.object(mduck, "_process_message") as process_message:
+        await mduck.process_queue_item("worker-1", item)
+
+    # Assert
+    process_message.assert_not_called()
+    queue_mock.ack.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_process_queue_item_deadline(
+    mduck: MDuckService, queue_mock: MagicMock, bot_mock: MagicMock
+) -> None:
+    """Test that a generation is cancelled with a sticker after the deadline."""
+    # Arrange
+    mduck._reply_deadline = 0.1
+    queued = QueueMessage(
+        message=MessagePayload(chat_id=100, message_id=1, text="hi", chat_type="group")
+    )
+    item = QueueItem(raw="", message=queued)
+    generation_cancelled = asyncio.Event()
+
+    async def _generate_response(
+        prompt: str,
+        on_chunk: None,
+        template: str,
+        model: str,
+        num_predict: None,
+        history: list[Turn],
+    ) -> None:
+        try:
+            await asyncio.sleep(10)
+        finally:
+            generation_cancelled.set()
+
+    ollama = cast(MagicMock, mduck._ollama_repository)
+    ollama.generate_response = AsyncMock(side_effect=_generate_response)
+
+    # Act
+    await mduck.process_queue_item("worker-1", item)
+
+    # Assert
+    assert generation_cancelled.is_set()
+    bot_mock.send_sticker.assert_awaited_once()
+    assert bot_mock.send_sticker.call_args.kwargs["reply_to_message_id"] == 1
+    bot_mock.send_message.assert_not_called()
+    queue_mock.ack.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_process_queue_item_request_timeout_retried(
+    mduck: MDuckService, queue_mock: MagicMock, bot_mock: MagicMock
+) -> None:
+    """Test an Ollama request timeout before the deadline is retried."""
+    # Arrange
+    mduck._reply_deadline = 600
+    mduck._retry_policy = RetryPolicy(max_attempts=3, base_delay=10)
+    queued = QueueMessage(
+        message=MessagePayload(chat_id=100, message_id=1, text="hi", chat_type="group")
+    )
+    item = QueueItem(raw="", message=queued)
+    ollama = cast(MagicMock, mduck._ollama_repository)
+    ollama.generate_response = AsyncMock(side_effect=TimeoutError())
+
+    # Act
+    await mduck.process_queue_item("worker-1", item)
+
+    # Assert
+    queue_mock.retry.assert_awaited_once()
+    bot_mock.send_sticker.assert_not_called()
+    queue_mock.ack.assert_not_called()
+
+
+@pytest.mark.asyncio
+@patch("mduck.services.mduck.random.random", return_value=0.1)
+@patch("mduck.services.mduck.random.choice", return_value=True)
+async def test_handle_incoming_message_shed_by_admission(
+    mock_choice: MagicMock,
+    mock_random: MagicMock,
+    mduck: MDuckService,
+    queue_mock: MagicMock,
+) -> None:
+    """Test that a random pick is not queued while the load is shed."""
+    # Arrange
+    admission = MagicMock(spec=AdmissionController)
+    admission.scale_probability.return_value = 0.0
+    mduck._admission = admission
+
+    # Act
+    await mduck.handle_incoming_message(_message())
+
+    # Assert
+    admission.scale_probability.assert_awaited_once_with(QueueLane.GROUP, 0.5)
+    queue_mock.enqueue.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_process_queue_item_retries_failed_ack(
+    mduck: MDuckService,
+    queue_mock: MagicMock,
+    bot_mock: MagicMock,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test a reply is acked after a Redis blip, so the chat is released."""
+    # Arrange
+    monkeypatch.setattr("mduck.services.mduck.QUEUE_UPDATE_BASE_DELAY", 0)
+    queued = QueueMessage(
+        message=MessagePayload(chat_id=100, message_id=1, text="hi", chat_type="group")
+    )
+    item = QueueItem(raw="", message=queued)
+    queue_mock.ack.side_effect = [ConnectionError("blip"), None]
+    ollama = cast(MagicMock, mduck._ollama_repository)
+    ollama.generate_response = AsyncMock(
+        return_value=(
+            "duck.txt",
+            ChatResponse(message=Message(role="assistant", content="quack")),
+        )
+    )
+
+    # Act
+    await mduck.process_queue_item("worker-1", item)
+
+    # Assert
+    assert queue_mock.ack.await_count == 2
+    bot_mock.send_message.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_process_queue_item_requeues_on_failed_take(
+    mduck: MDuckService, queue_mock: MagicMock, bot_mock: MagicMock
+) -> None:
+    """Test a message whose coalesced messages cannot be taken is requeued."""
+    # Arrange
+    queued = QueueMessage(
+        message=MessagePayload(chat_id=100, message_id=1, text="hi", chat_type="group")
+    )
+    item = QueueItem(raw="", message=queued)
+    queue_mock.take_coalesced.side_effect = ConnectionError("blip")
+
+    # Act
+    await mduck.process_queue_item("worker-1", item)
+
+    # Assert
+    queue_mock.retry.assert_awaited_once_with("worker-1", item, queued, 0.0)
+    queue_mock.ack.assert_not_called()
+    bot_mock.send_message.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_process_queue_item_retries_transient_failure(
+    mduck: MDuckService, queue_mock: MagicMock, bot_mock: MagicMock
+) -> None:
+    """Test that a transient failure is retried with the coalesced messages."""
+    # Arrange
+    mduck._retry_policy = RetryPolicy(max_attempts=3, base_delay=10)
+    queued = QueueMessage(
+        message=MessagePayload(chat_id=100, message_id=1, text="hi", chat_type="group")
+    )
+    item = QueueItem(raw="", message=queued)
+    late = MessagePayload(chat_id=100, message_id=2, text="late", chat_type="group")
+    queue_mock.take_coalesced.return_value = [late]
+    ollama = cast(MagicMock, mduck._ollama_repository)
+    ollama.generate_response = AsyncMock(side_effect=ConnectionError("refused"))
+
+    # Act
+    await mduck.process_queue_item("worker-1", item)
+
+    # Assert
+    queue_mock.retry.assert_awaited_once()
+    consumer, retried_item, message, delay = queue_mock.retry.call_args.args
+    assert retried_item is item
+    assert message.attempts == 1
+    assert message.coalesced == [late]
+    assert 5 <= delay <= 10
+    queue_mock.ack.assert_not_called()
+    queue_mock.dead_letter.assert_not_called()
+    bot_mock.send_message.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_process_queue_item_dead_letters_last_attempt(
+    mduck: MDuckService, queue_mock: MagicMock, bot_mock: MagicMock
+) -> None:
+    """Test that the last failed attempt is dead-lettered with an error reply."""
+    # Arrange
+    mduck._retry_policy = RetryPolicy(max_attempts=2)
+    queued = QueueMessage(
+        message=MessagePayload(chat_id=100, message_id=1, text="hi", chat_type="group"),
+        attempts=1,
+        coalesced=[
+            MessagePayload(chat_id=100, message_id=2, text="late", chat_type="group")
+        ],
+    )
+    item = QueueItem(raw="", message=queued)
+    ollama = cast(MagicMock, mduck._ollama_repository)
+    ollama.generate_response = AsyncMock(side_effect=ConnectionError("refused"))
+
+    # Act
+    await mduck.process_queue_item("worker-1", item)
+
+    # Assert
+    ollama.generate_response.assert_awaited_once_with(
+        "hi\nlate",
+        on_chunk=None,
+        template=ollama.choose_template.return_value,
+        model=ollama.choose_model.return_value,
+        num_predict=None,
+        history=[],
+    )
+    queue_mock.retry.assert_not_called()
+    queue_mock.dead_letter.assert_awaited_once_with(
+        "worker-1", item, "ConnectionError('refused')"
+    )
+    assert "0xQUACK" in bot_mock.send_message.call_args.kwargs["text"]
+    queue_mock.ack.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_process_queue_item_dead_letters_permanent_failure(
+    mduck: MDuckService, queue_mock: MagicMock
+) -> None:
+    """Test that a permanent failure is not retried."""
+    # Arrange
+    mduck._retry_policy = RetryPolicy(max_attempts=3)
+    queued = QueueMessage(
+        message=MessagePayload(chat_id=100, message_id=1, text="hi", chat_type="group")
+    )
+    item = QueueItem(raw="", message=queued)
+    ollama = cast(MagicMock, mduck._ollama_repository)
+    ollama.generate_response = AsyncMock(
+        return_value=("template", ChatResponse(message=Message(role="assistant")))
+    )
+
+    # Act
+    await mduck.process_queue_item("worker-1", item)
+
+    # Assert
+    queue_mock.retry.assert_not_called()
+    queue_mock.dead_letter.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_process_queue_item_streaming(
+    mduck: MDuckService, queue_mock: MagicMock, bot_mock: MagicMock
+) -> None:
+    """Test that a streamed reply is sent early and then edited in place."""
+    # Arrange
+    mduck._stream_edit_interval = 60
+    queued = QueueMessage(
+        message=MessagePayload(chat_id=100, message_id=1, text="hi", chat_type="group")
+    )
+    item = QueueItem(raw="", message=queued)
+    bot_mock.send_message.return_value = MagicMock(message_id=7)
+
+    async def _generate_response(
+        prompt: str,
+        on_chunk: Callable[[str], Awaitable[None]],
+        template: str,
+        model: str,
+        num_predict: None,
+        history: list[Turn],
+    ) -> tuple[str, ChatResponse]:
+        await on_chunk("qu")
+        await on_chunk("quack")
+        return "template", ChatResponse(
+            message=Message(role="assistant", content="quack *duck*")
+        )
+
+    ollama = cast(MagicMock, mduck._ollama_repository)
+    ollama.generate_response = AsyncMock(side_effect=_generate_response)
+
+    # Act
+    with (
+        patch("mduck.services.mduck.random.random", return_value=0.9),
+        patch(
+            "mduck.services.streaming.asyncio.sleep", new_callable=AsyncMock
+        ) as mock_sleep,
+    ):
+        await mduck.process_queue_item("worker-1", item)
+
+    # Assert
+    # The final edit keeps the edit interval after the first text
+    mock_sleep.assert_awaited_once()
+    bot_mock.send_message.assert_awaited_once()
+    assert bot_mock.send_message.call_args.kwargs["text"] == "qu"
+    assert bot_mock.send_message.call_args.kwargs["parse_mode"] is None
+    bot_mock.edit_message_text.assert_awaited_once()
+    assert bot_mock.edit_message_text.call_args.kwargs["text"] == "quack *duck*"
+    assert bot_mock.edit_message_text.call_args.kwargs["message_id"] == 7
+    queue_mock.ack.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_process_queue_item_streaming_failure_keeps_partial_reply(
+    mduck: MDuckService, queue_mock: MagicMock, bot_mock: MagicMock
+) -> None:
+    """Test a stream failing mid-way finishes the partial reply, not a retry."""
+    # Arrange
+    mduck._stream_edit_interval = 60
+    mduck._retry_policy = RetryPolicy(max_attempts=3, base_delay=10)
+    queued = QueueMessage(
+        message=MessagePayload(chat_id=100, message_id=1, text="hi", chat_type="group")
+    )
+    item = QueueItem(raw="", message=queued)
+    bot_mock.send_message.return_value = MagicMock(message_id=7)
+
+    async def _generate_response(
+        prompt: str,
+        on_chunk: Callable[[str], Awaitable[None]],
+        template: str,
+        model: str,
+        num_predict: None,
+        history: list[Turn],
+    ) -> tuple[str, ChatResponse]:
+        await on_chunk("qu")
+        await on_chunk("quack")
+        raise httpx.ReadTimeout("stalled")
+
+    ollama = cast(MagicMock, mduck._ollama_repository)
+    ollama.generate_response = AsyncMock(side_effect=_generate_response)
+
+    # Act
+    with patch("mduck.services.streaming.asyncio.sleep", new_callable=AsyncMock):
+        await mduck.process_queue_item("worker-1", item)
+
+    # Assert
+    bot_mock.send_message.assert_awaited_once()
+    assert bot_mock.edit_message_text.call_args.kwargs["text"] == "quack…"
+    assert bot_mock.edit_message_text.call_args.kwargs["message_id"] == 7
+    queue_mock.ack.assert_awaited_once()
+    queue_mock.retry.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    ("policy", "decision", "is_cached"),
+    [
+        ("always", AdmissionDecision.ADMIT, True),
+        ("load", AdmissionDecision.SCALE, True),
+        ("load", AdmissionDecision.ADMIT, False),
+        ("off", AdmissionDecision.SHED, False),
+    ],
+)
+@pytest.mark.asyncio
+async def test_process_queue_item_response_cache(
+    mduck: MDuckService,
+    bot_mock: MagicMock,
+    policy: str,
+    decision: AdmissionDecision,
+    is_cached: bool,
+) -> None:
+    """Test that cached responses are served according to the cache policy."""
+    # Arrange
+    cache = MagicMock(spec=ResponseCacheRepository)
+    cache.get.return_value = ChatResponse(
+        message=Message(role="assistant", content="cached")
+    )
+    admission = MagicMock(spec=AdmissionController)
+    admission.refresh.return_value = AdmissionState(
+        target_wait=60, concurrency=1, decision=decision
+    )
+    mduck._response_cache = cache
+    mduck._response_cache_policy = ResponseCachePolicy(policy)
+    mduck._admission = admission
+    ollama = cast(MagicMock, mduck._ollama_repository)
+    ollama.choose_template.return_value = "duck.txt"
+    ollama.choose_model.return_value = "model"
+    ollama.generate_response = AsyncMock(
+        return_value=(
+            "duck.txt",
+            ChatResponse(message=Message(role="assistant", content="generated")),
+        )
+    )
+    queued = QueueMessage(
+        message=MessagePayload(chat_id=100, message_id=1, text="lol", chat_type="group")
+    )
+
+    # Act
+    with patch("mduck.services.mduck.random.random", return_value=0.9):
+        await mduck.process_queue_item("worker-1", QueueItem(raw="", message=queued))
+
+    # Assert
+    text = bot_mock.send_message.call_args.kwargs["text"]
+    assert text == ("cached" if is_cached else "generated")
+    if is_cached:
+        cache.get.assert_awaited_once_with("duck.txt", "model", "lol")
+        ollama.generate_response.assert_not_called()
+        cache.put.assert_not_called()
+    elif policy == "off":
+        cache.get.assert_not_called()
+        cache.put.assert_not_called()
+    else:
+        cache.put.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_process_queue_item_semantic_cache(
+    mduck: MDuckService, bot_mock: MagicMock
+) -> None:
+    """Test that a paraphrase is answered from the semantic cache."""
+    # Arrange
+    response_cache = MagicMock(spec=ResponseCacheRepository)
+    response_cache.get.return_value = None
+    semantic_cache = MagicMock(spec=SemanticCacheRepository)
+    semantic_cache.get.return_value = ChatResponse(
+        message=Message(role="assistant", content="cached")
+    )
+    mduck._response_cache = response_cache
+    mduck._semantic_cache = semantic_cache
+    mduck._response_cache_policy = ResponseCachePolicy.ALWAYS
+    ollama = cast(MagicMock, mduck._ollama_repository)
+    ollama.choose_template.return_value = "duck.txt"
+    ollama.choose_model.return_value = "model"
+    ollama.embed = AsyncMock(return_value=[0.1, 0.2])
+    queued = QueueMessage(
+        message=MessagePayload(chat_id=100, message_id=1, text="lol", chat_type="group")
+    )
+
+    # Act
+    with patch("mduck.services.mduck.random.random", return_value=0.9):
+        await mduck.process_queue_item("worker-1", QueueItem(raw="", message=queued))
+
+    # Assert
+    semantic_cache.get.assert_awaited_once_with("duck.txt", "model", [0.1, 0.2])
+    ollama.generate_response.assert_not_called()
+    assert bot_mock.send_message.call_args.kwargs["text"] == "cached"
+
+
+@pytest.mark.asyncio
+async def test_process_queue_item_semantic_cache_put(
+    mduck: MDuckService, bot_mock: MagicMock
+) -> None:
+    """Test that a generated response is cached with the computed embedding."""
+    # Arrange
+    semantic_cache = MagicMock(spec=SemanticCacheRepository)
+    semantic_cache.get.return_value = None
+    mduck._semantic_cache = semantic_cache
+    mduck._response_cache_policy = ResponseCachePolicy.ALWAYS
+    ollama = cast(MagicMock, mduck._ollama_repository)
+    ollama.choose_template.return_value = "duck.txt"
+    ollama.choose_model.return_value = "model"
+    ollama.embed = AsyncMock(return_value=[0.1, 0.2])
+    response = ChatResponse(message=Message(role="assistant", content="generated"))
+    ollama.generate_response = AsyncMock(return_value=("duck.txt", response))
+    queued = QueueMessage(
+        message=MessagePayload(chat_id=100, message_id=1, text="lol", chat_type="group")
+    )
+
+    # Act
+    await mduck.process_queue_item("worker-1", QueueItem(raw="", message=queued))
+
+    # Assert
+    ollama.embed.assert_awaited_once_with("lol")
+    semantic_cache.put.assert_awaited_once_with(
+        "duck.txt", "model", [0.1, 0.2], response
+    )
+
+
+@pytest.mark.asyncio
+async def test_process_queue_item_history_not_cached(
+    mduck: MDuckService, bot_mock: MagicMock
+) -> None:
+    """Test that a reply generated with the chat history is not cached."""
+    # Arrange
+    response_cache = MagicMock(spec=ResponseCacheRepository)
+    response_cache.get.return_value = None
+    semantic_cache = MagicMock(spec=SemanticCacheRepository)
+    semantic_cache.get.return_value = None
+    conversation = MagicMock(spec=ConversationRepository)
+    conversation.get.return_value = [
+        Turn(role="user", content="my goose is sick"),
+        Turn(role="assistant", content="poor goose"),
+    ]
+    mduck._response_cache = response_cache
+    mduck._semantic_cache = semantic_cache
+    mduck._conversation = conversation
+    mduck._response_cache_policy = ResponseCachePolicy.ALWAYS
+    ollama = cast(MagicMock, mduck._ollama_repository)
+    ollama.choose_template.return_value = "duck.txt"
+    ollama.embed = AsyncMock(return_value=[0.1, 0.2])
+    response = ChatResponse(message=Message(role="assistant", content="get well"))
+    ollama.generate_response = AsyncMock(return_value=("duck.txt", response))
+    queued = QueueMessage(
+        message=MessagePayload(chat_id=100, message_id=1, text="lol", chat_type="group")
+    )
+
+    # Act
+    with patch("mduck.services.mduck.random.random", return_value=0.9):
+        await mduck.process_queue_item("worker-1", QueueItem(raw="", message=queued))
+
+    # Assert
+    assert bot_mock.send_message.call_args.kwargs["text"] == "get well"
+    response_cache.put.assert_not_called()
+    semantic_cache.put.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_process_queue_item_chooses_model_by_load(
+    mduck: MDuckService, bot_mock: MagicMock, queue_mock: MagicMock
+) -> None:
+    """Test the reply model is chosen by the queue size and shown in metadata."""
+    # Arrange
+    queue_mock.size.return_value = 7
+    item = QueueItem(
+        raw="",
+        message=QueueMessage(
+            message=MessagePayload(
+                chat_id=100, message_id=1, text="hi", chat_type="private"
+            )
+        ),
+    )
+    ollama = cast(MagicMock, mduck._ollama_repository)
+    ollama.choose_model.return_value = "fast"
+    ollama.generate_response = AsyncMock(
+        return_value=(
+            "template",
+            ChatResponse(
+                model="fast", message=Message(role="assistant", content="quack")
+            ),
+        )
+    )
+
+    # Act
+    await mduck.process_queue_item("worker-1", item)
+
+    # Assert
+    ollama.choose_model.assert_called_once_with(7, None)
+    assert ollama.generate_response.call_args.kwargs["model"] == "fast"
+    assert "Model: fast" in bot_mock.send_message.call_args.kwargs["text"]
+
+
+@pytest.mark.asyncio
+async def test_process_queue_item_token_budget(
+    mduck: MDuckService, bot_mock: MagicMock, queue_mock: MagicMock
+) -> None:
+    """Test the prompt and the reply are bounded by the token budget."""
+    # Arrange
+    mduck._token_budget = TokenBudget(
+        max_predict=100, min_predict=10, max_prompt_tokens=4, min_prompt_tokens=2
+    )
+    mduck._token_budget.record("duck.txt", 20)
+    queue_mock.size.return_value = 0
+    item = QueueItem(
+        raw="",
+        message=QueueMessage(
+            message=MessagePayload(
+                chat_id=100,
+                message_id=1,
+                text="a very long rant about ducks",
+                chat_type="group",
+            )
+        ),
+    )
+    ollama = cast(MagicMock, mduck._ollama_repository)
+    ollama.choose_template.return_value = "duck.txt"
+    ollama.generate_response = AsyncMock(
+        return_value=(
+            "duck.txt",
+            ChatResponse(
+                message=Message(role="assistant", content="quack"), eval_count=40
+            ),
+        )
+    )
+
+    # Act
+    await mduck.process_queue_item("worker-1", item)
+
+    # Assert
+    call = ollama.generate_response.call_args
+    assert call.args == ("…rant about ducks",)
+    assert call.kwargs["num_predict"] == 30
+    # The reply cut at the budget does not shrink the typical length
+    assert mduck._token_budget.get_typical_length("duck.txt") == 20
+
+
+@pytest.mark.asyncio
+async def test_process_queue_item_conversation(
+    mduck: MDuckService, queue_mock: MagicMock
+) -> None:
+    """Test the chat history within the budget is sent and the new turns kept."""
+    # Arrange
+    conversation = MagicMock(spec=ConversationRepository)
+    conversation.get.return_value = [
+        Turn(role="user", content="an old rant about geese"),
+        Turn(role="assistant", content="honk"),
+        Turn(role="user", content="why"),
+    ]
+    mduck._conversation = conversation
+    mduck._token_budget = TokenBudget(max_history_tokens=2)
+    queue_mock.size.return_value = 0
+    item = QueueItem(
+        raw="",
+        message=QueueMessage(
+            message=MessagePayload(
+                chat_id=100, message_id=1, text="quack?", chat_type="group"
+            )
+        ),
+    )
+    ollama = cast(MagicMock, mduck._ollama_repository)
+    ollama.choose_template.return_value = "duck.txt"
+    ollama.generate_response = AsyncMock(
+        return_value=(
+            "duck.txt",
+            ChatResponse(message=Message(role="assistant", content=" quack! ")),
+        )
+    )
+
+    # Act
+    await mduck.process_queue_item("worker-1", item)
+
+    # Assert
+    assert ollama.generate_response.call_args.kwargs["history"] == [
+        Turn(role="user", content="why"),
+    ]
+    conversation.append.assert_awaited_once_with(
+        100,
+        Turn(role="user", content="quack?"),
+        Turn(role="assistant", content=" quack! "),
+    )
+
+
+@pytest.mark.asyncio
+async def test_process_queue_item_template_stats(
+    mduck: MDuckService, queue_mock: MagicMock
+) -> None:
+    """Test the template is chosen by the selector and its outcome recorded."""
+    # Arrange
+    selector = MagicMock(spec=TemplateSelector)
+    selector.choose.return_value = "duck.txt"
+    mduck._template_selector = selector
+    queue_mock.size.return_value = 0
+    item = QueueItem(
+        raw="",
+        message=QueueMessage(
+            message=MessagePayload(
+                chat_id=100, message_id=1, text="hi", chat_type="group"
+            )
+        ),
+    )
+    ollama = cast(MagicMock, mduck._ollama_repository)
+    ollama.templates = ["duck.txt", "goose.txt"]
+    response = ChatResponse(message=Message(role="assistant", content="quack"))
+    ollama.generate_response = AsyncMock(
+        side_effect=[ConnectionError("refused"), ("duck.txt", response)]
+    )
+
+    # Act
+    await mduck.process_queue_item("worker-1", item)
+    await mduck.process_queue_item("worker-1", item)
+
+    # Assert
+    selector.choose.assert_awaited_with(["duck.txt", "goose.txt"], 1.0)
+    assert ollama.generate_response.call_args.kwargs["template"] == "duck.txt"
+    assert selector.record.await_args_list == [
+        (("duck.txt", None),),
+        (("duck.txt", response),),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_choose_template_batches(mduck: MDuckService) -> None:
+    """Test consecutive replies share a template for a batch."""
+    # Arrange
+    mduck._template_batch_size = 2
+    ollama = cast(MagicMock, mduck._ollama_repository)
+    ollama.templates = ["duck.txt@1", "goose.txt@1"]
+    ollama.choose_template.side_effect = ["duck.txt@1", "goose.txt@1", "swan.txt@1"]
+
+    # Act
+    templates = [await mduck._choose_template(1.0) for _ in range(3)]
+    ollama.templates = ["duck.txt@1", "goose.txt@2"]
+    reloaded_template = await mduck._choose_template(1.0)
+
+    # Assert
+    assert templates == ["duck.txt@1", "duck.txt@1", "goose.txt@1"]
+    # A template replaced by a reload ends its batch
+    assert reloaded_template == "swan.txt@1"
+
+
+@pytest.mark.parametrize("is_open", [True, False])
+@pytest.mark.asyncio
+async def test_process_queue_item_circuit_open(
+    mduck: MDuckService, bot_mock: MagicMock, queue_mock: MagicMock, is_open: bool
+) -> None:
+    """Test a queued message is answered with a sticker while Ollama is down."""
+    # Arrange
+    queue_mock.size.return_value = 0
+    item = QueueItem(
+        raw="",
+        message=QueueMessage(
+            message=MessagePayload(
+                chat_id=100, message_id=1, text="hi", chat_type="group"
+            )
+        ),
+    )
+    ollama = cast(MagicMock, mduck._ollama_repository)
+    ollama.is_circuit_open.return_value = is_open
+    ollama.generate_response = AsyncMock(side_effect=CircuitOpenError("open"))
+
+    # Act
+    await mduck.process_queue_item("worker-1", item)
+
+    # Assert
+    assert ollama.generate_response.await_count == (0 if is_open else 1)
+    bot_mock.send_sticker.assert_awaited_once()
+    assert bot_mock.send_sticker.call_args.kwargs["reply_to_message_id"] == 1
+    bot_mock.send_message.assert_not_called()
+    queue_mock.ack.assert_awaited_once()
@@ -0,0 +1,79 @@
+from unittest.mock import MagicMock, patch
+
+import httpx
+import ollama
+import pytest
+from aiogram.exceptions import TelegramRetryAfter
+
+from mduck.services.retry import RetryPolicy
+
+
+@pytest.mark.parametrize(
+    ("error", "expected"),
+    [
+        (httpx.ConnectError("refused"), True),
+        (TimeoutError(), True),
+        (ollama.ResponseError("overloaded", status_code=503), True),
+        (ollama.ResponseError("model not found", status_code=404), False),
+        (RuntimeError("Missed content"), False),
+    ],
+)
+def test_should_retry(error: Exception, expected: bool) -> None:
+    """Test that only transient errors are retried."""
+    assert RetryPolicy().should_retry(error, attempt=1) is expected
+
+
+def test_should_retry_max_attempts() -> None:
+    """Test that the last attempt is not retried."""
+    # Arrange
+    policy = RetryPolicy(max_attempts=3)
+
+    # Act & Assert
+    assert policy.should_retry(TimeoutError(), attempt=2)
+    assert not policy.should_retry(TimeoutError(), attempt=3)
+
+
+@patch("mduck.services.retry.random.uniform", side_effect=lambda a, b: b)
+def test_get_delay(mock_uniform: MagicMock) -> None:
+    """Test that the delay doubles with every attempt up to the max delay."""
+    # Arrange
+    policy = RetryPolicy(base_delay=5, max_delay=30)
+
+    # Act
+    delays = [policy.get_delay(attempt) for attempt in range(1, 6)]
+
+    # Assert
+    assert delays == [5, 10, 20, 30, 30]
+
+
+def test_get_delay_jitter() -> None:
+    """Test that the delay is randomized within its upper half."""
+    # Arrange
+    policy = RetryPolicy(base_delay=10)
+
+    # Act
+    delays = {policy.get_delay(1) for _ in range(100)}
+
+    # Assert
+    assert len(delays) > 1
+    assert all(5 <= delay <= 10 for delay in delays)
+
+
+def test_get_delay_retry_after() -> None:
+    """Test that Telegram flood control delay is respected."""
+    # Arrange
+    error = TelegramRetryAfter(
+        method=MagicMock(), message="Too Many Requests", retry_after=42
+    )
+
+    # Act
+    delay = RetryPolicy(base_delay=1).get_delay(1, error)
+
+    # Assert
+    assert delay == 42
+
+
+def test_invalid_max_attempts() -> None:
+    """Test that max attempts must be positive."""
+    with pytest.raises(ValueError, match="Max attempts must be positive"):
+        RetryPolicy(max_attempts=0)
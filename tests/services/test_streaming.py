@@ -0,0 +1,150 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from aiogram import Bot
+from aiogram.enums import ParseMode
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+)
+
+from mduck.services.streaming import StreamingReply
+
+
+@pytest.fixture
+def bot_mock() -> MagicMock:
+    """Return a mock bot sending messages with a fixed id."""
+    bot = MagicMock(spec=Bot)
+    bot.send_message.return_value = MagicMock(message_id=7)
+    return bot
+
+
+@pytest.mark.asyncio
+@patch("mduck.services.streaming.time.monotonic")
+async def test_update_is_throttled(
+    mock_monotonic: MagicMock, bot_mock: MagicMock
+) -> None:
+    """Test that the first text is sent right away and edits are throttled."""
+    # Arrange
+    reply = StreamingReply(bot_mock, chat_id=1, reply_to_message_id=2, edit_interval=3)
+
+    # Act
+    for now, text in [
+        (100, "a"),
+        (101, "ab"),
+        (102, "abc"),
+        (104, "abcd"),
+        (105, "abcde"),
+    ]:
+        mock_monotonic.return_value = now
+        await reply.update(text)
+
+    # Assert
+    assert reply.is_sent
+    assert reply.text == "abcde"
+    bot_mock.send_message.assert_awaited_once_with(
+        chat_id=1, text="a", parse_mode=None, reply_to_message_id=2
+    )
+    bot_mock.edit_message_text.assert_awaited_once_with(
+        text="abcd", chat_id=1, message_id=7, parse_mode=None
+    )
+
+
+@pytest.mark.asyncio
+async def test_update_skips_empty_text(bot_mock: MagicMock) -> None:
+    """Test that nothing is sent until there is some text."""
+    # Arrange
+    reply = StreamingReply(bot_mock, chat_id=1, reply_to_message_id=2)
+
+    # Act
+    await reply.update("  ")
+
+    # Assert
+    assert not reply.is_sent
+    bot_mock.send_message.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_finish_without_updates(bot_mock: MagicMock) -> None:
+    """Test that the final text is sent as Markdown if nothing was streamed."""
+    # Arrange
+    reply = StreamingReply(bot_mock, chat_id=1, reply_to_message_id=2)
+
+    # Act
+    await reply.finish("*quack*")
+
+    # Assert
+    bot_mock.send_message.assert_awaited_once_with(
+        chat_id=1, text="*quack*", parse_mode=ParseMode.MARKDOWN, reply_to_message_id=2
+    )
+    bot_mock.edit_message_text.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_finish_falls_back_to_plain_text(bot_mock: MagicMock) -> None:
+    """Test that malformed Markdown is edited in as plain text."""
+    # Arrange
+    reply = StreamingReply(bot_mock, chat_id=1, reply_to_message_id=2)
+    await reply.update("quack")
+    bot_mock.edit_message_text.side_effect = [
+        TelegramBadRequest(method=MagicMock(), message="can't parse entities"),
+        None,
+    ]
+
+    # Act
+    await reply.finish("quack *duck")
+
+    # Assert
+    assert [
+        call.kwargs["parse_mode"] for call in bot_mock.edit_message_text.call_args_list
+    ] == [ParseMode.MARKDOWN, None]
+
+
+@pytest.mark.asyncio
+@patch("mduck.services.streaming.asyncio.sleep", new_callable=AsyncMock)
+@patch("mduck.services.streaming.time.monotonic")
+async def test_finish_waits_for_edit_interval(
+    mock_monotonic: MagicMock, mock_sleep: AsyncMock, bot_mock: MagicMock
+) -> None:
+    """Test that the final edit keeps the interval and waits out flood control."""
+    # Arrange
+    reply = StreamingReply(bot_mock, chat_id=1, reply_to_message_id=2, edit_interval=3)
+    mock_monotonic.return_value = 100
+    await reply.update("quack")
+    mock_monotonic.return_value = 101
+    bot_mock.edit_message_text.side_effect = [
+        TelegramRetryAfter(method=MagicMock(), message="flood", retry_after=5),
+        None,
+    ]
+
+    # Act
+    await reply.finish("quack quack")
+
+    # Assert
+    assert [call.args for call in mock_sleep.await_args_list] == [(2,), (5,)]
+    assert bot_mock.edit_message_text.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_finish_failure_after_sent(bot_mock: MagicMock) -> None:
+    """Test that a failed final edit keeps the sent reply, a failed send raises."""
+    # Arrange
+    sent_reply = StreamingReply(
+        bot_mock, chat_id=1, reply_to_message_id=2, edit_interval=0
+    )
+    await sent_reply.update("quack")
+    bot_mock.edit_message_text.side_effect = TelegramNetworkError(
+        method=MagicMock(), message="timeout"
+    )
+    bot_mock.send_message.side_effect = TelegramNetworkError(
+        method=MagicMock(), message="timeout"
+    )
+    new_reply = StreamingReply(bot_mock, chat_id=1, reply_to_message_id=3)
+
+    # Act
+    await sent_reply.finish("quack quack")
+
+    # Assert
+    with pytest.raises(TelegramNetworkError):
+        await new_reply.finish("quack quack")
@@ -0,0 +1,99 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from mduck.repositories.template_stats import TemplateStatsRepository
+from mduck.schemas.templates import TemplateStats
+from mduck.services.templates import TemplateSelector
+
+TEMPLATES = ["cheap.txt", "costly.txt", "new.txt"]
+STATS = {
+    "cheap.txt": TemplateStats(template="cheap.txt", samples=10, duration=2.0),
+    "costly.txt": TemplateStats(template="costly.txt", samples=10, duration=8.0),
+}
+
+
+def test_get_weights_uniform_when_idle() -> None:
+    """Test that an idle system picks the templates uniformly."""
+    selector = TemplateSelector(MagicMock(spec=TemplateStatsRepository), mix=1.0)
+
+    weights = selector.get_weights(TEMPLATES, STATS, load_factor=1.0)
+
+    assert weights == pytest.approx([1 / 3] * 3)
+
+
+def test_get_weights_by_cost_under_load() -> None:
+    """Test that the cheaper templates are likelier under the highest load."""
+    selector = TemplateSelector(MagicMock(spec=TemplateStatsRepository), mix=1.0)
+
+    weights = selector.get_weights(TEMPLATES, STATS, load_factor=0.0)
+
+    # Costs are 1/2 and 1/8, the new template gets their mean
+    assert weights == pytest.approx([0.5 / 0.9375, 0.125 / 0.9375, 0.3125 / 0.9375])
+
+
+def test_get_weights_mix() -> None:
+    """Test that the mix blends the uniform and the weighted choice."""
+    selector = TemplateSelector(MagicMock(spec=TemplateStatsRepository), mix=0.5)
+
+    weights = selector.get_weights(TEMPLATES[:2], STATS, load_factor=0.0)
+
+    assert weights == pytest.approx([0.25 + 0.5 * 0.8, 0.25 + 0.5 * 0.2])
+
+
+def test_get_weights_failures() -> None:
+    """Test that failing templates are down-weighted."""
+    selector = TemplateSelector(MagicMock(spec=TemplateStatsRepository), mix=1.0)
+    stats = {
+        "cheap.txt": TemplateStats(
+            template="cheap.txt", samples=10, failures=10, duration=2.0
+        ),
+        "costly.txt": STATS["costly.txt"],
+    }
+
+    weights = selector.get_weights(TEMPLATES[:2], stats, load_factor=0.0)
+
+    assert weights == pytest.approx([0.0, 1.0])
+
+
+@pytest.mark.asyncio
+async def test_choose_refreshes_stats_under_load() -> None:
+    """Test that the statistics are loaded under load and then cached."""
+    # Arrange
+    mock_stats = MagicMock(spec=TemplateStatsRepository)
+    mock_stats.get_all.return_value = STATS
+    selector = TemplateSelector(mock_stats, mix=1.0, refresh_interval=60)
+
+    # Act
+    idle = await selector.choose(TEMPLATES, load_factor=1.0)
+    with patch(
+        "mduck.services.templates.random.choices", return_value=["costly.txt"]
+    ) as mock_choices:
+        loaded = await selector.choose(TEMPLATES, load_factor=0.0)
+        await selector.choose(TEMPLATES, load_factor=0.0)
+
+    # Assert
+    assert idle in TEMPLATES
+    assert loaded == "costly.txt"
+    mock_stats.get_all.assert_awaited_once()
+    assert mock_choices.call_args.kwargs["weights"] == pytest.approx(
+        [0.5 / 0.9375, 0.125 / 0.9375, 0.3125 / 0.9375]
+    )
+
+
+@pytest.mark.asyncio
+async def test_record_failure_is_logged() -> None:
+    """Test that failing to record a sample does not fail the generation."""
+    mock_stats = MagicMock(spec=TemplateStatsRepository)
+    mock_stats.record.side_effect = ConnectionError("redis is down")
+    selector = TemplateSelector(mock_stats)
+
+    await selector.record("duck.txt", None)
+
+    mock_stats.record.assert_awaited_once_with("duck.txt", None)
+
+
+def test_invalid_mix() -> None:
+    """Test that the mix must be a share."""
+    with pytest.raises(ValueError, match="Selection mix"):
+        TemplateSelector(MagicMock(spec=TemplateStatsRepository), mix=1.5)
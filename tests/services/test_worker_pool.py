@@ -0,0 +1,255 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from mduck.repositories.ollama import OllamaRepository
+from mduck.repositories.prompts import PromptRegistry
+from mduck.repositories.queue import MessageQueueRepository
+from mduck.schemas.queue import MessagePayload, QueueItem, QueueMessage
+from mduck.services.mduck import MDuckService
+from mduck.services.worker_pool import WorkerPool
+
+
+async def _sleep(consumer: str, item: QueueItem) -> None:
+    await asyncio.sleep(1)
+
+
+def _queue_mock() -> MagicMock:
+    queue = MagicMock(spec=MessageQueueRepository)
+    queue.dequeue.return_value = QueueItem(
+        raw="",
+        message=QueueMessage(
+            message=MessagePayload(
+                chat_id=1, message_id=1, text="hello", chat_type="private"
+            )
+        ),
+    )
+    queue.requeue.return_value = 0
+    return queue
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_runs_workers_concurrently() -> None:
+    """Test that every worker consumes the queue at the same time."""
+    # Arrange
+    in_flight = 0
+    max_seen = 0
+    release = asyncio.Event()
+
+    async def process(consumer: str, item: QueueItem) -> None:
+        nonlocal in_flight, max_seen
+        in_flight += 1
+        max_seen = max(max_seen, in_flight)
+        await release.wait()
+        in_flight -= 1
+
+    mock_queue = _queue_mock()
+    mock_mduck = MagicMock(spec=MDuckService)
+    mock_mduck.process_queue_item = AsyncMock(side_effect=process)
+    pool = WorkerPool(mduck=mock_mduck, queue=mock_queue, workers=3)
+
+    # Act
+    pool.start()
+    await asyncio.sleep(0.01)
+
+    # Assert
+    assert pool.is_running
+    assert max_seen == 3
+
+    release.set()
+    await pool.stop()
+    assert not pool.is_running
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_respects_max_in_flight() -> None:
+    """Test that in-flight messages are limited by max_in_flight."""
+    # Arrange
+    in_flight = 0
+    max_seen = 0
+
+    async def process(consumer: str, item: QueueItem) -> None:
+        nonlocal in_flight, max_seen
+        in_flight += 1
+        max_seen = max(max_seen, in_flight)
+        await asyncio.sleep(0.001)
+        in_flight -= 1
+
+    mock_queue = _queue_mock()
+    mock_mduck = MagicMock(spec=MDuckService)
+    mock_mduck.process_queue_item = AsyncMock(side_effect=process)
+    pool = WorkerPool(mduck=mock_mduck, queue=mock_queue, workers=4, max_in_flight=2)
+
+    # Act
+    pool.start()
+    await asyncio.sleep(0.05)
+    await pool.stop()
+
+    # Assert
+    assert max_seen == 2
+    assert mock_mduck.process_queue_item.call_count > 2
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_restarts_crashed_worker() -> None:
+    """Test that a worker keeps consuming after an unexpected error."""
+    # Arrange
+    calls = 0
+
+    async def process(consumer: str, item: QueueItem) -> None:
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise RuntimeError("boom")
+        if calls == 3:
+            await asyncio.Event().wait()
+
+    mock_queue = _queue_mock()
+    mock_mduck = MagicMock(spec=MDuckService)
+    mock_mduck.process_queue_item = AsyncMock(side_effect=process)
+    pool = WorkerPool(mduck=mock_mduck, queue=mock_queue, workers=1, restart_delay=0.0)
+
+    # Act
+    pool.start()
+    await asyncio.sleep(0.01)
+
+    # Assert
+    assert pool.is_running
+    assert mock_mduck.process_queue_item.call_count == 3
+    await pool.stop(grace_period=0)
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_start_twice() -> None:
+    """Test that a running pool can't be started again."""
+    mock_queue = _queue_mock()
+    mock_mduck = MagicMock(spec=MDuckService)
+    mock_mduck.process_queue_item = AsyncMock(side_effect=_sleep)
+    pool = WorkerPool(mduck=mock_mduck, queue=mock_queue)
+    pool.start()
+    with pytest.raises(RuntimeError, match="already running"):
+        pool.start()
+    await pool.stop(grace_period=0)
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_reaps_on_start() -> None:
+    """Test that abandoned messages are requeued as soon as the pool starts."""
+    # Arrange
+    mock_queue = _queue_mock()
+    mock_queue.reap = AsyncMock(side_effect=[RuntimeError("boom"), 0])
+    mock_mduck = MagicMock(spec=MDuckService)
+    mock_mduck.process_queue_item = AsyncMock(side_effect=_sleep)
+    pool = WorkerPool(
+        mduck=mock_mduck, queue=mock_queue, workers=2, reaper_interval=0.0
+    )
+
+    # Act
+    pool.start()
+    await asyncio.sleep(0.01)
+    await pool.stop(grace_period=0)
+
+    # Assert
+    assert mock_queue.reap.await_count >= 2
+    consumers = {call.args[0] for call in mock_mduck.process_queue_item.call_args_list}
+    assert len(consumers) == 2
+    assert all(
+        consumer.endswith(("mduck-worker-1", "mduck-worker-2"))
+        for consumer in consumers
+    )
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_stop_waits_for_in_flight() -> None:
+    """Test that in-flight messages are finished within the grace period."""
+    # Arrange
+    finished = asyncio.Event()
+
+    async def process(consumer: str, item: QueueItem) -> None:
+        await asyncio.sleep(0.05)
+        finished.set()
+
+    mock_queue = _queue_mock()
+    mock_mduck = MagicMock(spec=MDuckService)
+    mock_mduck.process_queue_item = AsyncMock(side_effect=process)
+    pool = WorkerPool(mduck=mock_mduck, queue=mock_queue, workers=1)
+    pool.start()
+    await asyncio.sleep(0.01)
+
+    # Act
+    await pool.stop(grace_period=1.0)
+
+    # Assert
+    assert finished.is_set()
+    assert mock_mduck.process_queue_item.await_count == 1
+    assert not pool.is_running
+    mock_queue.requeue.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_stop_requeues_unfinished() -> None:
+    """Test that messages unfinished within the grace period are requeued."""
+    # Arrange
+    cancelled = asyncio.Event()
+
+    async def process(consumer: str, item: QueueItem) -> None:
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    mock_queue = _queue_mock()
+    mock_mduck = MagicMock(spec=MDuckService)
+    mock_mduck.process_queue_item = AsyncMock(side_effect=process)
+    pool = WorkerPool(mduck=mock_mduck, queue=mock_queue, workers=2)
+    pool.start()
+    await asyncio.sleep(0.01)
+
+    # Act
+    await pool.stop(grace_period=0.01)
+
+    # Assert
+    assert cancelled.is_set()
+    requeued = {call.args[0] for call in mock_queue.requeue.call_args_list}
+    assert len(requeued) == 2
+    assert all(
+        consumer.endswith(("mduck-worker-1", "mduck-worker-2")) for consumer in requeued
+    )
+
+
+def test_worker_pool_invalid_workers() -> None:
+    """Test that the pool requires at least one worker."""
+    with pytest.raises(ValueError, match="Workers count must be positive"):
+        WorkerPool(
+            mduck=MagicMock(spec=MDuckService),
+            queue=_queue_mock(),
+            workers=0,
+        )
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_keeps_model_warm() -> None:
+    """Test the pool runs the model keep-alive and prompt reloads with workers."""
+    # Arrange
+    mock_mduck = MagicMock(spec=MDuckService)
+    mock_mduck.process_queue_item = AsyncMock(side_effect=_sleep)
+    mock_ollama = MagicMock(spec=OllamaRepository)
+    mock_prompts = MagicMock(spec=PromptRegistry)
+    pool = WorkerPool(
+        mduck=mock_mduck,
+        queue=_queue_mock(),
+        ollama=mock_ollama,
+        prompts=mock_prompts,
+    )
+
+    # Act
+    pool.start()
+    await pool.stop(grace_period=0)
+
+    # Assert
+    mock_ollama.start_keep_alive.assert_called_once_with()
+    mock_ollama.stop_keep_alive.assert_awaited_once_with()
+    mock_prompts.start.assert_called_once_with()
+    mock_prompts.stop.assert_awaited_once_with()